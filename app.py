@@ -3,8 +3,14 @@ from config import settings
 from routes.auth import auth_bp
 from routes.dashboard import dashboard_bp
 from routes.chat import chat_bp
+from cli import rollups_cli, imports_cli
+from services import instrumentation
 
-def create_app():
+def create_app(asgi: bool = False):
+    """
+    WSGI Flask app by default. asgi=True wraps it for an ASGI server, with
+    the chat endpoints served by async handlers (see routes/chat_async.py).
+    """
     app = Flask(__name__)
     app.config["SECRET_KEY"] = settings.SECRET_KEY
     app.config["MAX_CONTENT_LENGTH"] = settings.MAX_CONTENT_LENGTH
@@ -12,7 +18,13 @@ def create_app():
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(chat_bp)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(imports_cli)
+    instrumentation.init_app(app)
 
+    if asgi:
+        from routes.chat_async import AsyncChatApp
+        return AsyncChatApp(app)
     return app
 
 app = create_app()
@@ -0,0 +1,8 @@
+"""
+ASGI entry point:
+
+    uvicorn asgi:app --workers 2
+"""
+from app import create_app
+
+app = create_app(asgi=True)
@@ -0,0 +1,89 @@
+"""
+/chat/ask latency for questions the analytics router answers locally
+versus questions that go to the model, with PostgREST and Gemini faked
+at fixed latencies. Also times metrics() + answer() alone over five
+years of rollups.
+
+    python -m benchmarks.bench_analytics [runs] [llm_seconds]
+"""
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://supabase.invalid")
+os.environ.setdefault("SUPABASE_KEY", "bench.anon.key")
+os.environ["CHAT_CACHE_BACKEND"] = "off"
+os.environ["COLUMNAR_CACHE"] = "off"
+
+from app import create_app  # noqa: E402
+from benchmarks import synthetic  # noqa: E402
+from benchmarks.fakes import FakeModel, FakePostgrest  # noqa: E402
+from routes import chat  # noqa: E402
+from services import analytics, gemini_client  # noqa: E402
+
+DB_LATENCY = 0.02
+QUESTIONS = [
+    "What is my savings rate?",
+    "What are my top spending categories?",
+    "Did I go over budget anywhere?",
+    "How did my spending change compared to last month?",
+    "What's my runway?",
+    "How much did I spend this month?",
+    "How much have I spent?",  # no period named: left to the model
+    "Should I switch to a lower-paying job I like more?",
+    "How can I cut my food spending?",
+]
+
+
+def rollup_rows(months: int = 60) -> list:
+    rows = []
+    for i in range(months):
+        month = f"{2020 + i // 12}-{i % 12 + 1:02d}-01"
+        rows.append({"month": month, "type": "income", "total": 90_000.0, "count": 1, "budget": None,
+                     "min_amount": 90_000.0, "max_amount": 90_000.0, "categories": {"name": "Salary"}})
+        for j, cat in enumerate(c for c in synthetic.CATEGORIES if c != "Salary"):
+            total = 2_000.0 * (j + 1) + 37 * i
+            rows.append({"month": month, "type": "expense", "total": total, "count": 10, "budget": 2_000.0 * (j + 1) + 900,
+                         "min_amount": 10.0, "max_amount": total / 2, "categories": {"name": cat}})
+    return rows
+
+
+def time_local(runs: int):
+    monthly = [dict(r, category=r["categories"]["name"]) for r in rollup_rows()]
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for q in QUESTIONS[:5]:
+            analytics.answer(analytics.route(q), analytics.metrics(monthly))
+        samples.append((time.perf_counter() - start) / 5)
+    print(f"metrics + answer over {len(monthly)} rollup rows: median {statistics.median(samples) * 1000:.2f} ms")
+
+
+def time_endpoint(runs: int, llm_seconds: float):
+    tables = {"transactions": synthetic.stored_rows(200), "monthly_rollups": rollup_rows(2)}
+    chat.get_authed_client = lambda: FakePostgrest(DB_LATENCY, tables)
+    gemini_client.get_model = lambda: FakeModel(llm_seconds, 0.0, 1)
+    client = create_app().test_client()
+    with client.session_transaction() as s:
+        s["user"] = {"id": "bench-user", "email": "bench@example.com"}
+
+    print(f"{'question':<52} {'answered by':<26} {'p50 ms':>8}")
+    for q in QUESTIONS:
+        samples, payload = [], None
+        for _ in range(runs):
+            start = time.perf_counter()
+            payload = client.post("/chat/ask", json={"message": q, "days": 30}).get_json()
+            samples.append(time.perf_counter() - start)
+        by = f"router ({payload['routed']})" if payload.get("routed") else "model"
+        print(f"{q:<52} {by:<26} {statistics.median(samples) * 1000:>8.1f}")
+
+
+def main(runs: int = 5, llm_seconds: float = 1.5):
+    time_local(50)
+    print(f"fake PostgREST {DB_LATENCY * 1000:.0f} ms per query, fake model {llm_seconds * 1000:.0f} ms per reply")
+    time_endpoint(runs, llm_seconds)
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]], *[float(a) for a in sys.argv[2:3]])
@@ -0,0 +1,43 @@
+"""
+Throughput and accuracy of the import-time auto-categorizer.
+
+Keyword rules alone can only place well-known merchants; a model trained
+on the user's own categorized history places the rest. The target is
+100k descriptions/second on one core.
+
+    python -m benchmarks.bench_categorize [rows]
+"""
+import sys
+import time
+
+from benchmarks import synthetic
+from services.categorizer import HistoryModel, categorize
+
+
+def score(labels: list, truth: list) -> tuple:
+    filled = [(l, t) for l, t in zip(labels, truth) if l is not None]
+    correct = sum(l == t for l, t in filled)
+    return len(filled) / len(truth), (correct / len(filled) if filled else 0.0)
+
+
+def main(rows: int, history_rows: int = 20_000):
+    # one merchant pool: the first rows are the user's past, the rest the new upload
+    descs, truth = synthetic.narrations(history_rows + rows, seed=1)
+    past, past_truth = descs[:history_rows], truth[:history_rows]
+    descs, truth = descs[history_rows:], truth[history_rows:]
+
+    start = time.perf_counter()
+    model = HistoryModel()
+    model.learn(past, past_truth)
+    print(f"{rows} descriptions; model trained on {history_rows} past rows in {time.perf_counter() - start:.2f}s")
+
+    print(f"{'mode':<18} {'seconds':>8} {'rows/s':>10} {'coverage':>9} {'accuracy':>9}")
+    for name, m in (("rules only", None), ("history + rules", model)):
+        start = time.perf_counter()
+        labels = categorize(descs, m)
+        secs = time.perf_counter() - start
+        coverage, accuracy = score(labels, truth)
+        print(f"{name:<18} {secs:>8.2f} {rows / secs:>10,.0f} {coverage:>9.1%} {accuracy:>9.1%}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,78 @@
+"""
+Time to first byte of a chat reply, blocking vs streamed, against a fake
+model with configurable latency.
+
+    python -m benchmarks.bench_chat_stream [first_token_delay] [chunk_delay] [chunks]
+"""
+import statistics
+import sys
+import time
+
+from flask import Flask
+
+from benchmarks.fakes import FakeModel
+from services import gemini_client
+
+
+def time_blocking(runs: int) -> list:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        gemini_client.ask_gemini("prompt")
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def time_stream(runs: int) -> list:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        stream = gemini_client.ask_gemini_stream("prompt")
+        next(stream)
+        samples.append(time.perf_counter() - start)
+        for _ in stream:
+            pass
+    return samples
+
+
+def time_endpoint(runs: int) -> list:
+    """First SSE frame from /chat/ask/stream, with auth and data fetching stubbed out."""
+    from routes import chat
+
+    chat.get_authed_client = lambda: object()
+    chat.fetch_chat_data = lambda pg, since, user_id=None, question=None: ({"monthly": [], "budgets": []}, {})
+    chat.compose_prompt = lambda msg, days, since, data, timings: ("prompt", type("Ctx", (), {"tokens": 0})(), msg, {})
+
+    app = Flask(__name__, template_folder="../templates")
+    app.secret_key = "bench"
+    app.register_blueprint(chat.chat_bp)
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user"] = {"id": "bench-user"}
+
+    samples = []
+    for i in range(runs):
+        start = time.perf_counter()
+        resp = client.post("/chat/ask/stream", json={"message": f"q{i}"}, buffered=False)
+        it = iter(resp.response)
+        next(it)
+        samples.append(time.perf_counter() - start)
+        for _ in it:
+            pass
+        resp.close()
+    return samples
+
+
+def main(first_token_delay=0.5, chunk_delay=0.03, chunks=30, runs=5):
+    model = FakeModel(first_token_delay, chunk_delay, chunks)
+    gemini_client.get_model = lambda: model
+    print(f"fake model: first token {first_token_delay * 1000:.0f} ms, {chunks} chunks x {chunk_delay * 1000:.0f} ms")
+    for name, fn in [("blocking ask_gemini", time_blocking),
+                     ("ask_gemini_stream", time_stream),
+                     ("/chat/ask/stream", time_endpoint)]:
+        samples = fn(runs)
+        print(f"{name:<22} TTFB median {statistics.median(samples) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*[float(a) for a in sys.argv[1:3]], *[int(a) for a in sys.argv[3:4]])
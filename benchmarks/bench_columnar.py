@@ -0,0 +1,62 @@
+"""
+Loading a user's full history: JSON rows from PostgREST versus the local
+memory-mapped Arrow cache (services/columnar_cache.py). Needs pyarrow.
+
+    python -m benchmarks.bench_columnar [rows ...]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ["COLUMNAR_CACHE_DIR"] = tempfile.mkdtemp(prefix="columnar-bench-")
+os.environ["COLUMNAR_SYNC_INTERVAL"] = "3600"
+
+import pandas as pd  # noqa: E402
+
+from benchmarks.synthetic import stored_rows  # noqa: E402
+from services import columnar_cache  # noqa: E402
+from services.aggregates import summarize_frame  # noqa: E402
+
+
+def best_of(fn, n=5):
+    best = float("inf")
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(sizes):
+    if not columnar_cache.enabled():
+        sys.exit("pyarrow is not installed")
+    print(f"{'rows':>9} {'json -> frame':>14} {'arrow mmap':>11} {'-> frame':>9} {'summary':>9} {'disk MB':>8}")
+    for n in sizes:
+        user = f"bench-{n}"
+        rows = stored_rows(n)
+        payload = json.dumps(rows)
+
+        def from_json():
+            data = json.loads(payload)
+            for r in data:
+                r["category"] = (r.pop("categories", None) or {}).get("name")
+            return pd.DataFrame(data, columns=columnar_cache.COLUMNS)
+
+        flat = from_json().to_dict("records")
+        with columnar_cache.locked(user):
+            columnar_cache._write_segment(user, columnar_cache.to_table(flat))
+        columnar_cache._synced[user] = columnar_cache._reconciled[user] = time.time()  # no PostgREST here
+
+        json_ms = best_of(from_json)
+        mmap_ms = best_of(lambda: columnar_cache.load(user))
+        frame_ms = best_of(lambda: columnar_cache.frame(None, user, ["date", "amount", "type", "category"]))
+        summary_ms = best_of(lambda: summarize_frame(columnar_cache.frame(
+            None, user, ["date", "amount", "type", "category"], categorical=("type", "category"))))
+        size = sum(os.path.getsize(p) for p in columnar_cache.segments(user)) / 1e6
+        print(f"{n:>9} {json_ms:>11.1f} ms {mmap_ms:>8.2f} ms {frame_ms:>6.1f} ms {summary_ms:>6.1f} ms {size:>8.1f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 500_000])
@@ -0,0 +1,51 @@
+"""
+Rows/second through statement_profile + read_statement + normalize +
+to_transactions (the import path) for each supported format, over synthetic statements of the same content.
+
+    python -m benchmarks.bench_formats [rows]
+"""
+import io
+import sys
+import time
+
+from benchmarks import synthetic
+from services.finance_tools import to_transactions
+from services.statements import normalize, read_statement, statement_profile
+
+
+def formats(rows: int) -> dict:
+    files = {
+        "csv": synthetic.statement_csv(rows),
+        "csv (bank profile, debit/credit)": synthetic.bank_csv(rows),
+        "json": synthetic.statement_json(rows),
+        "json lines": synthetic.statement_json(rows, lines=True),
+        "ofx": synthetic.statement_ofx(rows),
+    }
+    try:
+        files["xlsx"] = synthetic.statement_xlsx(rows)
+    except ImportError:
+        print("(openpyxl not installed; skipping xlsx)")
+    return files
+
+
+def run(data: bytes) -> tuple:
+    start = time.perf_counter()
+    n = 0
+    stream = io.BytesIO(data)
+    profile = statement_profile(stream)
+    for chunk in read_statement(stream):
+        n += len(to_transactions(normalize(chunk, profile), "bench-user"))
+    return n, time.perf_counter() - start
+
+
+def main(rows: int):
+    print(f"{rows} rows per file")
+    print(f"{'format':<34} {'MB':>6} {'seconds':>8} {'rows/s':>10}")
+    for name, data in formats(rows).items():
+        n, secs = run(data)
+        assert n == rows, (name, n)
+        print(f"{name:<34} {len(data) / 1e6:>6.1f} {secs:>8.2f} {n / secs:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
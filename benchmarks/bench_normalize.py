@@ -0,0 +1,88 @@
+"""
+Rows/second of normalize_csv + to_transactions against the previous
+row-wise implementation.
+
+    python -m benchmarks.bench_normalize [rows ...]
+"""
+import sys
+import time
+
+import pandas as pd
+from dateutil.parser import parse as parse_date
+
+from benchmarks.synthetic import statement_frame
+from services.finance_tools import normalize_csv, to_transactions
+
+
+# --- previous implementation, kept verbatim for comparison ---
+
+def legacy_normalize_csv(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = [c.strip().lower() for c in df.columns]
+    aliases = {"txn_date": "date", "posted_date": "date", "credit": "amount", "debit": "amount"}
+    df = df.rename(columns={k: v for k, v in aliases.items() if k in df.columns})
+    for col in ["date", "amount", "type"]:
+        if col not in df.columns:
+            df[col] = None
+
+    def safe_date(x):
+        try:
+            return parse_date(str(x)).date().isoformat()
+        except Exception:
+            return None
+
+    df["date"] = df["date"].apply(safe_date)
+
+    def to_amount(row):
+        amt = row.get("amount")
+        try:
+            return float(str(amt).replace(",", "").replace("₹", "").strip())
+        except Exception:
+            return None
+
+    df["amount"] = df.apply(to_amount, axis=1)
+
+    def norm_type(x):
+        s = str(x).lower()
+        if s in ["income", "credit", "cr", "in"]:
+            return "income"
+        return "expense"
+
+    df["type"] = df["type"].apply(norm_type)
+    return df
+
+
+def legacy_to_transactions(df: pd.DataFrame, user_id: str):
+    rows = []
+    for _, r in df.iterrows():
+        if not r["date"] or r["amount"] is None or r["type"] not in ("income", "expense"):
+            continue
+        rows.append({
+            "user_id": user_id,
+            "date": r["date"],
+            "amount": r["amount"],
+            "type": r["type"],
+            "description": (r.get("description") or r.get("narration") or None),
+            "category_name": r.get("category") or None,
+        })
+    return rows
+
+
+def run(normalize, convert, frame: pd.DataFrame) -> float:
+    start = time.perf_counter()
+    rows = convert(normalize(frame.copy()), "bench-user")
+    elapsed = time.perf_counter() - start
+    assert len(rows) == len(frame)
+    return elapsed
+
+
+def main(sizes):
+    print(f"{'rows':>9} {'legacy rows/s':>15} {'vectorized rows/s':>18} {'speedup':>8}")
+    for n in sizes:
+        frame = statement_frame(n)
+        old = run(legacy_normalize_csv, legacy_to_transactions, frame)
+        new = run(normalize_csv, to_transactions, frame)
+        print(f"{n:>9} {n / old:>15,.0f} {n / new:>18,.0f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000])
@@ -0,0 +1,113 @@
+"""
+Keyset vs OFFSET pagination at increasing depth, seeded with one user's
+transactions and budgets. Keyset pages should take the same time at any
+depth; OFFSET pages grow with the rows skipped.
+
+"postgrest" is the query production runs (transactions_page: a date
+bound plus an or=(...) filter) through the real postgrest client against
+benchmarks.fake_supabase, so it includes a local HTTP round trip; its
+SQLite plan is printed at the end. "sqlite" is the stand-in's row-value
+(date, id) < (?, ?) form.
+
+    python -m benchmarks.bench_pagination [rows] [page_size]
+"""
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from benchmarks import synthetic
+from benchmarks.fake_supabase import FakeSupabase, sign_jwt
+
+USER = "bench-user"
+
+
+def seed(conn, rows: int, months: int = 120):
+    conn.executemany("insert into categories (id, user_id, name, type) values (?, ?, ?, 'expense')",
+                     [(i + 1, USER, c) for i, c in enumerate(synthetic.CATEGORIES)])
+    rng = np.random.default_rng(0)
+    dates = (np.datetime64("2015-01-01") + rng.integers(0, 365 * 10, rows)).astype(str)
+    conn.executemany(
+        "insert into transactions (user_id, date, amount, type, description, category_id) values (?, ?, ?, ?, ?, ?)",
+        zip([USER] * rows, dates.tolist(), rng.integers(10, 50_000, rows).tolist(),
+            rng.choice(["income", "expense"], rows).tolist(), rng.choice(synthetic.DESCRIPTIONS, rows).tolist(),
+            rng.integers(1, len(synthetic.CATEGORIES) + 1, rows).tolist()))
+    month_list = [f"{2015 + m // 12}-{m % 12 + 1:02d}-01" for m in range(months)]
+    conn.executemany("insert into budgets (user_id, category_id, month, amount) values (?, ?, ?, ?)",
+                     [(USER, c + 1, m, 1000.0) for m in month_list for c in range(len(synthetic.CATEGORIES))])
+    conn.commit()
+
+
+def offset_page(conn, limit: int, offset: int) -> list:
+    return conn.execute(
+        """select t.id, t.date, t.amount, t.type, t.description, c.name as category
+           from transactions t left join categories c on c.id = t.category_id
+           where t.user_id = ? order by t.date desc, t.id desc limit ? offset ?""",
+        (USER, limit, offset)).fetchall()
+
+
+def timed(fn, runs: int = 5) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main(rows: int = 500_000, limit: int = 50):
+    sb = FakeSupabase().start()
+    os.environ.update(SUPABASE_URL=sb.url, SUPABASE_KEY=sb.anon_key)  # read when supabase_client is imported
+    from services.pagination import (budgets_page, budgets_page_sqlite, encode_cursor, transactions_page,
+                                     transactions_page_sqlite)
+    from services.supabase_client import authed_postgrest
+
+    conn = sb.conn
+    pg = authed_postgrest(sign_jwt({"sub": USER, "role": "authenticated", "exp": int(time.time()) + 3600}, sb.secret))
+    start = time.perf_counter()
+    seed(conn, rows)
+    print(f"seeded {rows} transactions in {time.perf_counter() - start:.1f}s; page size {limit}")
+
+    # the methods must agree: walk the first pages by cursor and compare
+    cursor = None
+    for page_no in range(20):
+        page = transactions_page_sqlite(conn, USER, cursor, limit)
+        expected = [r["id"] for r in offset_page(conn, limit, page_no * limit)]
+        assert [r["id"] for r in page["items"]] == expected
+        assert [r["id"] for r in transactions_page(pg, cursor, limit)["items"]] == expected
+        cursor = page["next"]
+
+    print(f"{'page':>8} {'offset ms':>10} {'sqlite ms':>10} {'postgrest ms':>13}")
+    for page_no in (1, 10, 100, 1000, rows // limit - 1):
+        offset = (page_no - 1) * limit
+        before = offset_page(conn, 1, offset - 1)[0] if offset else None
+        cursor = encode_cursor([before["date"], before["id"]]) if before else None
+        o = timed(lambda: offset_page(conn, limit, offset))
+        k = timed(lambda: transactions_page_sqlite(conn, USER, cursor, limit))
+        p = timed(lambda: transactions_page(pg, cursor, limit))
+        print(f"{page_no:>8} {o:>10.2f} {k:>10.2f} {p:>13.2f}")
+
+    # walking every budget page by cursor
+    for name, fetch in (("sqlite", lambda c: budgets_page_sqlite(conn, USER, c, limit)),
+                        ("postgrest", lambda c: budgets_page(pg, c, limit))):
+        start, pages, cursor = time.perf_counter(), 0, None
+        while True:
+            page = fetch(cursor)
+            pages += 1
+            cursor = page["next"]
+            if not cursor:
+                break
+        print(f"budgets ({name}): {pages} pages walked by cursor in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    # the SQL benchmarks.fake_supabase runs for transactions_page's filters
+    plan = conn.execute("explain query plan select id from transactions where user_id = ? and date <= ? "
+                        "and (date < ? or (date = ? and id < ?)) order by date desc, id desc limit 50",
+                        (USER, "2020-01-01", "2020-01-01", "2020-01-01", 1)).fetchall()
+    print("postgrest keyset plan:", "; ".join(r["detail"] for r in plan))
+    sb.stop()
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,72 @@
+"""
+The chat's search index (services/search_index.py): indexing cost per
+import chunk, query latency on a loaded index (the target is under 10 ms
+at 100k rows), and prompt size with and without the matches, averaged
+over QUESTIONS (one with no match in the window keeps the latest rows).
+
+    python -m benchmarks.bench_search_index [rows ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+os.environ["SEARCH_INDEX_DIR"] = tempfile.mkdtemp(prefix="search-bench-")
+os.environ["COLUMNAR_SYNC_INTERVAL"] = "3600"
+
+import numpy as np  # noqa: E402
+
+from benchmarks.synthetic import narrations, stored_rows  # noqa: E402
+from services import search_index  # noqa: E402
+from services.chat_context import build_context  # noqa: E402
+
+QUESTIONS = ["How much did I spend on Uber last year?", "Swiggy or Zomato, which costs me more?",
+             "Show my Amazon orders", "What did I pay Bescom?", "food", "Any Netflix charges?",
+             "How are my investments with Zerodha doing?", "Where does my salary go?"]
+CHUNK = 5000  # IMPORT_CHUNK_ROWS default: one appended segment per import chunk
+
+
+def rows(n: int) -> list:
+    descs, cats = narrations(n)
+    return [{"id": r["id"], "date": r["date"], "amount": r["amount"], "type": r["type"],
+             "category": c, "description": d} for r, d, c in zip(stored_rows(n), descs, cats)]
+
+
+def main(sizes):
+    print(f"{'rows':>9} {'index/chunk':>12} {'disk MB':>8} {'load':>9} {'query p50':>10} {'p99':>8} "
+          f"{'prompt tokens (latest -> matched)':>34}")
+    for n in sizes:
+        user = f"bench-{n}"
+        data = rows(n)
+        search_index._synced[user] = search_index._reconciled[user] = time.time()  # no PostgREST here
+        with search_index.locked(user):
+            search_index._write_segment(user, search_index.build([]))
+        start = time.perf_counter()
+        for i in range(0, n, CHUNK):
+            search_index.append(user, data[i:i + CHUNK])
+        per_chunk = (time.perf_counter() - start) * 1000 / max(1, -(-n // CHUNK))
+        size = sum(os.path.getsize(p) for p in search_index.segments(user)) / 1e6
+
+        search_index._loaded.clear()
+        start = time.perf_counter()
+        index = search_index.load(user)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        since = data[-1]["date"][:4] + "-01-01"
+        samples = []
+        for _ in range(20):
+            for q in QUESTIONS:
+                start = time.perf_counter()
+                search_index.search(None, user, q, "2020-01-01")
+                samples.append((time.perf_counter() - start) * 1000)
+
+        window = [dict(r, categories={"name": r["category"]}) for r in reversed(data) if r["date"] >= since][:500]
+        latest = build_context(window, [], []).tokens
+        matched = np.mean([build_context(window, [], [], matches=search_index.query(index, q, since)).tokens
+                           for q in QUESTIONS])
+        print(f"{n:>9} {per_chunk:>9.1f} ms {size:>8.1f} {load_ms:>6.1f} ms {np.percentile(samples, 50):>7.2f} ms "
+              f"{np.percentile(samples, 99):>5.2f} ms {latest:>25} -> {matched:.0f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 500_000])
@@ -0,0 +1,113 @@
+"""
+Cold start: `import app` in fresh interpreters under `python -X importtime`.
+Workers are autoscaled, so every new one pays this before its first request.
+
+Fails (exit 1) when a module that is meant to load on first use (DEFERRED)
+is imported at startup again, printing the chain of imports that pulled
+it in, or when the import time or RSS regressed past --threshold against
+the nearest ancestor commit with saved results (benchmarks/results/, as
+for benchmarks.e2e).
+
+    python -m benchmarks.bench_startup [--runs 7] [--threshold 0.2] [--no-save]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from benchmarks.e2e import ROOT, baseline, commit_id, compare, percentile, save
+
+# heavy modules the app imports on first use (see routes/chat.py, routes/dashboard.py)
+DEFERRED = ("pandas", "numpy", "pyarrow", "google.generativeai")
+
+
+def parse(stderr: str) -> list:
+    """-X importtime lines -> [(depth, module, self_us, cumulative_us)] in output order (children first)."""
+    out = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        out.append(((len(name) - len(name.lstrip()) - 1) // 2, name.strip(), int(self_us), int(cumulative)))
+    return out
+
+
+def import_chain(modules: list, target: str) -> list:
+    """Who imported target: its ancestors, outermost first (a parent is listed after its children)."""
+    i = next(i for i, m in enumerate(modules) if m[1] == target)
+    chain, depth = [target], modules[i][0]
+    for d, name, _, _ in modules[i + 1:]:
+        if d < depth:
+            chain.append(name)
+            depth = d
+    return chain[::-1]
+
+
+def run_once(module: str, env: dict) -> tuple:
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         cwd=ROOT, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if out.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{out.stderr[-2000:]}")
+    return parse(out.stderr), wall
+
+
+def heaviest(modules: list, n: int = 8) -> list:
+    """Top-level packages by the most time any one of their imports took."""
+    by_package = {}
+    for depth, name, _, cumulative in modules:
+        if not depth:
+            continue  # the module being measured
+        package = name.split(".")[0]
+        by_package[package] = max(by_package.get(package, 0), cumulative)
+    return sorted(by_package.items(), key=lambda kv: -kv[1])[:n]
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m benchmarks.bench_startup", description=__doc__.splitlines()[1])
+    p.add_argument("--runs", type=int, default=7)
+    p.add_argument("--module", default="app", help="what a worker imports at startup")
+    p.add_argument("--threshold", type=float, default=0.2, help="relative change that fails the run")
+    p.add_argument("--no-save", action="store_true")
+    args = p.parse_args(argv)
+
+    # config only reads these; nothing connects at import time
+    env = {"SUPABASE_URL": "http://127.0.0.1:9", "SUPABASE_KEY": "bench", **os.environ}
+    run_once(args.module, env)  # writes the .pyc files, so every measured run starts equally cold
+    runs = [run_once(args.module, env) for _ in range(args.runs)]
+    import_ms = [next(m[3] for m in modules if m[1] == args.module) / 1000 for modules, _ in runs]
+    modules = runs[-1][0]
+
+    key = f"startup/{args.module}"
+    result = {key: {"p50_ms": percentile(import_ms, 0.5), "p99_ms": percentile(import_ms, 0.99),
+                    "wall_p50_ms": percentile([w for _, w in runs], 0.5) * 1000,
+                    "peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+                    "modules": len(modules)}}
+    r = result[key]
+    print(f"import {args.module}: p50 {r['p50_ms']:.0f} ms, p99 {r['p99_ms']:.0f} ms "
+          f"(process wall p50 {r['wall_p50_ms']:.0f} ms), {r['modules']} modules, peak RSS {r['peak_rss_mb']:.0f} MB")
+    print("heaviest packages: " + ", ".join(f"{pkg} {us / 1000:.0f} ms" for pkg, us in heaviest(modules)))
+
+    failures = []
+    loaded = {name for _, name, _, _ in modules}
+    for name in DEFERRED:
+        if name in loaded:
+            failures.append(f"{name} is imported at startup: {' -> '.join(import_chain(modules, name))}")
+
+    commit = commit_id()
+    if not args.no_save:
+        print(f"saved {os.path.relpath(save(commit, result, vars(args)), ROOT)}")
+    base = baseline(commit, key)
+    if base:
+        failures += [f"{k} {metric} {change:+.0%}" for k, metric, change in compare(base, result, args.threshold)]
+    for f in failures:
+        print(f"FAIL: {f}", file=sys.stderr)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
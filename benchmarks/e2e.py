@@ -0,0 +1,420 @@
+"""
+End-to-end benchmarks: the app on a threaded WSGI server, talking through
+the real supabase/postgrest clients to the Supabase stand-in
+(benchmarks.fake_supabase, in its own process), with a fake Gemini.
+
+    python -m benchmarks.e2e                                  # every scenario
+    python -m benchmarks.e2e upload --rows 1k,10k,100k,1M
+    python -m benchmarks.e2e chat --requests 400 --concurrency 32 --llm-first-token 1.5
+    python -m benchmarks.e2e --fail-on-regression             # exit 1 past --threshold
+
+Scenarios:
+  upload     POST /upload of a generated statement, waiting for the
+             background job when the file is large; rows/s per size
+  dashboard  GET / for a user with --seed-rows of history, then scrolling
+             the transactions table page by page
+  chat       a burst of /chat/ask/stream questions, half of them answered
+             by the analytics router and half by the fake model
+
+Each scenario runs in a fresh process so its peak RSS is its own (import
+parse processes are reported separately). Results go to
+benchmarks/results/<commit>.json, "-dirty" when the tree has uncommitted
+changes, and are compared with the newest results of an ancestor commit.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from queue import Queue
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DATA_DIR = os.path.join(ROOT, "cache", "bench")
+SCENARIOS = ("upload", "dashboard", "chat")
+EMAIL, PASSWORD = "bench@example.com", "bench-password"
+QUESTIONS = ["What is my savings rate?", "How can I cut down my spending?",
+             "What are my top spending categories?", "Should I invest more each month?"]
+# metric -> 1 when a higher value is worse, -1 when a lower one is
+WATCHED = {"throughput": -1, "p50_ms": 1, "p99_ms": 1, "peak_rss_mb": 1}
+
+
+def count(text: str) -> int:
+    """Row counts as typed on the command line: 10k -> 10000, 1M -> 1000000."""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summarize(latencies: list, wall: float, units: int | None = None) -> dict:
+    """units: what throughput counts (rows for uploads); requests by default."""
+    return {
+        "requests": len(latencies),
+        "throughput": (units if units is not None else len(latencies)) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "wall_s": wall,
+    }
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB elsewhere
+
+
+def statement_file(rows: int, seed: int) -> str:
+    """Generated statement CSV, kept under cache/bench/ between runs."""
+    from benchmarks.synthetic import write_statement_csv
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"statement-{rows}-{seed}.csv")
+    if not os.path.exists(path):
+        write_statement_csv(path + ".tmp", rows, seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+# ---- inside a scenario process ----
+
+class Harness:
+    """The app on a local port in front of a fresh Supabase stand-in."""
+
+    def __init__(self, opts: dict, seed_rows: int = 0):
+        from benchmarks import fake_supabase
+
+        self.tmp = tempfile.TemporaryDirectory(prefix="finance-bench-")
+        self.supabase = fake_supabase.spawn(users={EMAIL: PASSWORD}, seed_rows=seed_rows,
+                                            latency=opts["db_latency_ms"] / 1000)
+        # config reads the environment on import, so the app comes in after this
+        os.environ.update({
+            "SUPABASE_URL": self.supabase.url,
+            "SUPABASE_KEY": self.supabase.anon_key,
+            "SUPABASE_SERVICE_KEY": self.supabase.service_key,
+            "FLASK_SECRET_KEY": "bench",
+            "CHAT_CACHE_BACKEND": "off",
+            "IMPORT_JOB_BACKEND": "memory",
+            "IMPORT_SPOOL_FOLDER": os.path.join(self.tmp.name, "spool"),
+            "COLUMNAR_CACHE_DIR": os.path.join(self.tmp.name, "columnar"),
+            "SEARCH_INDEX_DIR": os.path.join(self.tmp.name, "search"),
+            "MAX_CONTENT_LENGTH": str(2 ** 31),
+            "PROFILE_SLOW_MS": "0",
+        })
+        from werkzeug.serving import make_server
+
+        from app import create_app
+        from benchmarks.fakes import FakeModel
+        from services import gemini_client
+
+        model = FakeModel(opts["llm_first_token"], opts["llm_chunk_delay"], opts["llm_chunks"])
+        gemini_client.get_model = lambda: model
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        self.server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, name="bench-app", daemon=True).start()
+
+    def login(self):
+        import httpx
+
+        client = httpx.Client(base_url=self.url, timeout=3600)
+        r = client.post("/auth/login", data={"email": EMAIL, "password": PASSWORD})
+        if r.status_code != 302 or "/auth/login" in r.headers.get("location", ""):
+            raise RuntimeError(f"login failed: {r.status_code} {r.headers.get('location')}")
+        return client
+
+    def burst(self, n: int, concurrency: int, request) -> tuple:
+        """
+        request(client, i) -> ok, n times from `concurrency` logged-in
+        clients (closed loop). Returns (latencies, wall seconds, errors).
+        """
+        clients = Queue()
+        for _ in range(concurrency):
+            clients.put(self.login())
+
+        def one(i):
+            client = clients.get()
+            try:
+                start = time.perf_counter()
+                ok = request(client, i)
+                return time.perf_counter() - start, ok
+            finally:
+                clients.put(client)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, range(n)))
+        wall = time.perf_counter() - start
+        return [r[0] for r in results], wall, sum(1 for r in results if not r[1])
+
+    def close(self):
+        self.server.shutdown()
+        self.supabase.stop()
+        self.tmp.cleanup()
+
+
+def upload(client, path: str) -> dict:
+    """POSTs a statement and waits for the import; the finished job, or {} when it ran inline."""
+    before = {j["id"] for j in client.get("/imports").json()}
+    with open(path, "rb") as fh:
+        r = client.post("/upload", files={"file": (os.path.basename(path), fh, "text/csv")})
+    if r.status_code != 302:
+        return {"status": f"http {r.status_code}"}
+    while True:
+        jobs = [j for j in client.get("/imports").json() if j["id"] not in before]
+        if not jobs:
+            return {}
+        if jobs[0]["status"] not in ("queued", "running"):
+            return jobs[0]
+        time.sleep(0.05)
+
+
+def run_upload(opts: dict) -> dict:
+    harness = Harness(opts)
+    from services.jobs import get_runner
+
+    try:
+        client = harness.login()
+        latencies, errors, inserted = [], 0, 0
+        for path in opts["files"]:
+            start = time.perf_counter()
+            job = upload(client, path)
+            latencies.append(time.perf_counter() - start)
+            errors += job.get("status", "done") != "done"
+            inserted += job.get("inserted", opts["rows"])
+        result = summarize(latencies, sum(latencies), units=opts["rows"] * len(latencies))
+        get_runner().shutdown()  # reaped, so the parse processes count in RUSAGE_CHILDREN
+        result.update(rows=opts["rows"], inserted=inserted, errors=errors,
+                      peak_parse_rss_mb=peak_rss_mb(resource.RUSAGE_CHILDREN),
+                      db_requests=sum(harness.supabase.stats().values()))
+        return {f"upload/{opts['rows']}": result}
+    finally:
+        harness.close()
+
+
+def run_dashboard(opts: dict) -> dict:
+    harness = Harness(opts, seed_rows=opts["seed_rows"])
+    try:
+        client = harness.login()
+        start = time.perf_counter()
+        ok = client.get("/").status_code == 200
+        cold = time.perf_counter() - start  # first view, which builds the local columnar copy
+
+        latencies, wall, errors = harness.burst(opts["requests"], opts["concurrency"],
+                                                lambda c, i: c.get("/").status_code == 200)
+        render = summarize(latencies, wall)
+        render.update(cold_ms=cold * 1000, errors=errors + (not ok))
+
+        pages, cursor, scroll_errors = [], None, 0
+        while len(pages) < opts["pages"]:
+            start = time.perf_counter()
+            r = client.get("/transactions", params={"cursor": cursor} if cursor else None)
+            pages.append(time.perf_counter() - start)
+            if r.status_code != 200:
+                scroll_errors += 1
+                break
+            cursor = r.json()["next"]
+            if not cursor:
+                break
+        scroll = summarize(pages, sum(pages))
+        scroll["errors"] = scroll_errors
+        return {"dashboard": render, "dashboard/scroll": scroll}
+    finally:
+        harness.close()
+
+
+def run_chat(opts: dict) -> dict:
+    harness = Harness(opts, seed_rows=opts["seed_rows"])
+    first_bytes = []
+
+    def ask(client, i):
+        payload = {"message": f"{QUESTIONS[i % len(QUESTIONS)]} ({i})", "days": opts["chat_days"]}
+        start = time.perf_counter()
+        with client.stream("POST", "/chat/ask/stream", json=payload) as r:
+            if r.status_code != 200:
+                return False
+            body = b""
+            for chunk in r.iter_bytes():
+                if not body:
+                    first_bytes.append(time.perf_counter() - start)
+                body += chunk
+        return b"event: error" not in body
+
+    try:
+        client = harness.login()
+        start = time.perf_counter()
+        ok = ask(client, 0)
+        cold = time.perf_counter() - start
+        first_bytes.clear()
+
+        latencies, wall, errors = harness.burst(opts["requests"], opts["concurrency"], ask)
+        result = summarize(latencies, wall)
+        result.update(cold_ms=cold * 1000, errors=errors + (not ok),
+                      ttfb_p50_ms=percentile(first_bytes, 0.5) * 1000,
+                      ttfb_p99_ms=percentile(first_bytes, 0.99) * 1000)
+        return {"chat": result}
+    finally:
+        harness.close()
+
+
+RUNNERS = {"upload": run_upload, "dashboard": run_dashboard, "chat": run_chat}
+
+
+def child(opts: dict):
+    results = RUNNERS[opts["scenario"]](opts)
+    peak = peak_rss_mb()
+    for r in results.values():
+        r["peak_rss_mb"] = peak
+    print(json.dumps(results))
+
+
+# ---- results across commits ----
+
+def git(*args) -> str:
+    out = subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True)
+    return out.stdout.strip() if out.returncode == 0 else ""
+
+
+def commit_id() -> str:
+    sha = git("rev-parse", "--short=12", "HEAD") or "unknown"
+    return sha + ("-dirty" if git("status", "--porcelain", "--untracked-files=no") else "")
+
+
+def save(commit: str, results: dict, opts: dict) -> str:
+    """Merges into the commit's file, so scenarios can be run separately."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{commit}.json")
+    doc = {"results": {}}
+    if os.path.exists(path):
+        with open(path) as fh:
+            doc = json.load(fh)
+    doc.update(commit=commit, subject=git("log", "-1", "--format=%s"),
+               created=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+               python=platform.python_version(), machine=platform.machine(), options=opts)
+    doc["results"].update(results)
+    with open(path, "w") as fh:
+        json.dump(doc, fh, indent=2, sort_keys=True)
+    return path
+
+
+def baseline(commit: str, key: str | None = None) -> dict | None:
+    """
+    Results of the nearest ancestor (HEAD itself when the tree is dirty),
+    skipping commits without a result for key when one is given.
+    """
+    for sha in git("rev-list", "--max-count=500", "HEAD").split():
+        name = sha[:12]
+        path = os.path.join(RESULTS_DIR, f"{name}.json")
+        if name != commit and os.path.exists(path):
+            with open(path) as fh:
+                doc = json.load(fh)
+            if key is None or key in doc["results"]:
+                return doc
+    return None
+
+
+def compare(base: dict, results: dict, threshold: float) -> list:
+    """Prints the watched metrics side by side; returns the regressions past threshold."""
+    regressions = []
+    print(f"\nvs {base['commit']} ({base.get('subject', '')[:50]})")
+    print(f"{'scenario':<18} {'metric':<12} {'before':>12} {'after':>12} {'change':>9}")
+    for key, now in sorted(results.items()):
+        before = base["results"].get(key)
+        if not before:
+            continue
+        for metric, worse in WATCHED.items():
+            if not before.get(metric) or metric not in now:
+                continue
+            change = now[metric] / before[metric] - 1
+            flag = change * worse > threshold
+            if flag:
+                regressions.append((key, metric, change))
+            print(f"{key:<18} {metric:<12} {before[metric]:>12.1f} {now[metric]:>12.1f} {change:>+8.1%}"
+                  f"{'  REGRESSION' if flag else ''}")
+    return regressions
+
+
+def report(results: dict):
+    print(f"{'scenario':<18} {'throughput':>14} {'p50':>10} {'p99':>10} {'peak RSS':>10}  notes")
+    for key, r in sorted(results.items()):
+        unit = "rows/s" if key.startswith("upload/") else "req/s"
+        notes = [f"{k[:-3]} {r[k]:.0f} ms" for k in ("cold_ms", "ttfb_p50_ms", "ttfb_p99_ms") if k in r]
+        if "peak_parse_rss_mb" in r:
+            notes.append(f"parse procs {r['peak_parse_rss_mb']:.0f} MB, {r['db_requests']} db requests")
+        if r.get("errors"):
+            notes.append(f"{r['errors']} errors")
+        print(f"{key:<18} {r['throughput']:>7.1f} {unit:<6} {r['p50_ms']:>7.1f} ms {r['p99_ms']:>7.1f} ms "
+              f"{r['peak_rss_mb']:>7.0f} MB  {', '.join(notes)}")
+
+
+def run_scenario(opts: dict) -> dict:
+    out = subprocess.run([sys.executable, "-m", "benchmarks.e2e", "--child", json.dumps(opts)],
+                         cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    if out.returncode != 0:
+        raise SystemExit(f"{opts['scenario']} scenario failed (exit {out.returncode})")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m benchmarks.e2e", description="End-to-end benchmarks.")
+    p.add_argument("scenarios", nargs="*", metavar="scenario", help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    p.add_argument("--rows", default="1k,10k,100k", help="upload sizes, e.g. 1k,10k,100k,1M")
+    p.add_argument("--repeat", type=int, help="uploads per size (default 3 up to 100k rows, else 1)")
+    p.add_argument("--seed-rows", type=count, default=100_000, help="history for dashboard and chat")
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--pages", type=int, default=50, help="transaction pages scrolled")
+    p.add_argument("--chat-days", type=int, default=3650)
+    p.add_argument("--db-latency-ms", type=float, default=5.0, help="added to every Supabase request")
+    p.add_argument("--llm-first-token", type=float, default=0.8, help="seconds")
+    p.add_argument("--llm-chunk-delay", type=float, default=0.05, help="seconds")
+    p.add_argument("--llm-chunks", type=int, default=20)
+    p.add_argument("--threshold", type=float, default=0.2, help="relative change flagged as a regression")
+    p.add_argument("--fail-on-regression", action="store_true")
+    p.add_argument("--no-save", action="store_true")
+    p.add_argument("--child", help=argparse.SUPPRESS)
+    args = p.parse_args(argv)
+
+    if args.child:
+        return child(json.loads(args.child))
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        p.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    opts = {k: v for k, v in vars(args).items()
+            if k not in ("scenarios", "child", "threshold", "fail_on_regression", "no_save")}
+    results = {}
+    for scenario in dict.fromkeys(args.scenarios or SCENARIOS):
+        if scenario != "upload":
+            print(f"{scenario} ...", file=sys.stderr)
+            results.update(run_scenario({**opts, "scenario": scenario}))
+            continue
+        for rows in map(count, args.rows.split(",")):
+            repeat = args.repeat or (3 if rows <= 100_000 else 1)
+            print(f"upload {rows} rows x{repeat} ...", file=sys.stderr)
+            files = [statement_file(rows, seed) for seed in range(repeat)]
+            results.update(run_scenario({**opts, "scenario": "upload", "rows": rows, "files": files}))
+
+    report(results)
+    commit = commit_id()
+    if not args.no_save:
+        print(f"\nsaved {os.path.relpath(save(commit, results, opts), ROOT)}")
+    base = baseline(commit)
+    regressions = compare(base, results, args.threshold) if base else []
+    if args.fail_on_regression and regressions:
+        raise SystemExit(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,708 @@
+"""
+Local stand-in for Supabase, for benchmarks that must run the real
+supabase/postgrest clients without a network: GoTrue's password and
+refresh-token endpoints plus the part of PostgREST this app uses, served
+over HTTP and backed by the services.db SQLite schema.
+
+    with FakeSupabase(latency=0.01) as sb:      # server thread
+        os.environ["SUPABASE_URL"] = sb.url
+        os.environ["SUPABASE_KEY"] = sb.anon_key
+
+spawn() runs one in its own process instead, so its SQLite work and
+memory aren't charged to the app being measured.
+
+Access tokens are HS256 JWTs whose sub is the user id, and every read
+and write is scoped to that user like the RLS policies in sql/; the
+service_key bypasses that scoping, as Supabase's service role does. Reads
+support to-one embeds found from the schema's foreign keys
+(categories(name), categories!inner(name)), the eq neq gt gte lt lte
+like ilike is in operators, not., or=(...) with nested and()/or(),
+order, limit and offset. Writes are inserts and upserts (on_conflict,
+ignore/merge-duplicates). RPCs are the rpc_* methods. Anything else gets
+a PostgREST-style error.
+"""
+import base64
+import hashlib
+import hmac
+import inspect
+import json
+import logging
+import multiprocessing
+import re
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+from benchmarks.synthetic import CATEGORIES, stored_rows
+from services.aggregates import summarize_sqlite
+from services.budgets import variance_sqlite
+from services.db import connect_sqlite
+
+OPERATORS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "like": "like", "ilike": "like"}
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+EMBED = re.compile(r"(?:(\w+):)?(\w+)(?:!(inner|left))?\((.*)\)")
+LOGIC = re.compile(r"(not\.)?(and|or)\((.*)\)")
+NAME = re.compile(r"[A-Za-z_]\w*")
+INCOME_CATEGORIES = {"Salary", "Investment"}
+SERVICE_ROLE = object()  # the caller's user id when it used the service key: no row scoping
+
+
+class ApiError(Exception):
+    """Answered as a PostgREST error body."""
+
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status, self.code, self.message = status, code, message
+
+    def body(self) -> dict:
+        return {"code": self.code, "message": self.message, "details": None, "hint": None}
+
+
+class AuthError(ApiError):
+    """Answered as a GoTrue error body."""
+
+    def body(self) -> dict:
+        return {"code": self.status, "error_code": self.code, "msg": self.message}
+
+
+def _json(data, status: int = 200) -> Response:
+    return Response(json.dumps(data), status=status, mimetype="application/json")
+
+
+# ---- tokens ----
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def sign_jwt(claims: dict, secret: str) -> str:
+    signing_input = _b64(b'{"alg":"HS256","typ":"JWT"}') + "." + _b64(json.dumps(claims).encode())
+    sig = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{_b64(sig)}"
+
+
+def verify_jwt(token: str, secret: str) -> dict:
+    try:
+        signing_input, sig = token.rsplit(".", 1)
+        expected = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(_unb64(sig), expected):
+            raise ValueError("bad signature")
+        claims = json.loads(_unb64(signing_input.split(".")[1]))
+    except (ValueError, IndexError):
+        raise ApiError(401, "PGRST301", "JWT invalid")
+    if claims.get("exp", 0) < time.time():
+        raise ApiError(401, "PGRST303", "JWT expired")
+    return claims
+
+
+# ---- PostgREST syntax ----
+
+def split_top(text: str) -> list:
+    """Splits on commas outside parentheses and double quotes."""
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(text):
+        if ch == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def unwrap(value: str) -> str:
+    """Drops the outer parentheses of a list; nested groups keep theirs."""
+    if not (value.startswith("(") and value.endswith(")")):
+        raise ApiError(400, "PGRST100", f"expected a parenthesized list, got {value!r}")
+    return value[1:-1]
+
+
+def unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1].replace('\\"', '"')
+    return value
+
+
+def quote(name: str) -> str:
+    if not NAME.fullmatch(name):
+        raise ApiError(400, "PGRST100", f"invalid identifier {name!r}")
+    return f'"{name}"'
+
+
+class Read:
+    """One GET on a table, as SQL: the table is aliased t, embeds e0, e1..."""
+
+    def __init__(self, db, table: str, user_id: str | None):
+        self.db, self.table = db, table
+        self.fields: list = []
+        self.embeds: dict = {}  # key in the output -> embed spec
+        self.where, self.args = [], []
+        if "user_id" in db.columns(table) and user_id is not SERVICE_ROLE:
+            self.where.append('t."user_id" = ?')
+            self.args.append(user_id)
+        self.order, self.limit, self.offset = [], None, None
+
+    def select(self, text: str):
+        for item in split_top(text or "*"):
+            m = EMBED.fullmatch(item)
+            if m:
+                self.embed(m[1] or m[2], m[2], m[3] == "inner", m[4])
+            elif item == "*":
+                self.fields.extend(c for c in self.db.columns(self.table) if c not in self.fields)
+            else:
+                name = item.split(":")[-1].split("::")[0]
+                self.column(name)  # validates
+                self.fields.append(name)
+
+    def embed(self, key: str, table: str, inner: bool, text: str):
+        fk = self.db.foreign_key(self.table, table)
+        if fk is None:
+            raise ApiError(400, "PGRST200", f"Could not find a relationship between '{self.table}' and '{table}'")
+        columns = self.db.columns(table)
+        wanted = split_top(text or "*")
+        if wanted == ["*"]:
+            wanted = list(columns)
+        for c in wanted:
+            if c not in columns:
+                raise ApiError(400, "42703", f"column {table}.{c} does not exist")
+        self.embeds[key] = {"table": table, "alias": f"e{len(self.embeds)}", "from": fk[0], "to": fk[1],
+                            "inner": inner, "columns": wanted, "on": [], "args": []}
+
+    def column(self, name: str) -> str:
+        owner, _, col = name.rpartition(".")
+        if owner:
+            embed = self.embeds.get(owner)
+            if embed is None or col not in self.db.columns(embed["table"]):
+                raise ApiError(400, "42703", f"column {name} does not exist")
+            return f'{embed["alias"]}.{quote(col)}'
+        if col not in self.db.columns(self.table):
+            raise ApiError(400, "42703", f"column {self.table}.{col} does not exist")
+        return f"t.{quote(col)}"
+
+    def condition(self, column: str, expr: str) -> tuple:
+        negate = expr.startswith("not.")
+        if negate:
+            expr = expr[4:]
+        op, _, value = expr.partition(".")
+        col = self.column(column)
+        if op == "is":
+            literal = {"null": "null", "true": "1", "false": "0"}.get(value.lower())
+            if literal is None:
+                raise ApiError(400, "PGRST100", f"is.{value} is not null, true or false")
+            sql, args = f"{col} is {literal}", []
+        elif op == "in":
+            values = [unquote(v) for v in split_top(unwrap(value))]
+            sql, args = f"{col} in ({', '.join('?' * len(values))})", values
+        elif op in OPERATORS:
+            value = unquote(value)
+            if op in ("like", "ilike"):
+                value = value.replace("*", "%")
+            sql, args = f"{col} {OPERATORS[op]} ?", [value]
+        else:
+            raise ApiError(400, "PGRST100", f"unknown operator {op!r}")
+        return (f"not ({sql})" if negate else sql), args
+
+    def logic(self, op: str, body: str) -> tuple:
+        parts, args = [], []
+        for item in split_top(body):
+            m = LOGIC.fullmatch(item)
+            if m:
+                sql, more = self.logic(m[2], m[3])
+                sql = f"not {sql}" if m[1] else sql
+            else:
+                column, _, expr = item.partition(".")
+                sql, more = self.condition(column, expr)
+            parts.append(sql)
+            args.extend(more)
+        return "(" + f" {op} ".join(parts) + ")", args
+
+    def filter(self, key: str, value: str):
+        negate = value.startswith("not.") and key in ("or", "and")
+        if key in ("or", "and"):
+            sql, args = self.logic(key, unwrap(value[4:] if negate else value))
+            self.where.append(f"not {sql}" if negate else sql)
+            self.args.extend(args)
+            return
+        owner = key.rpartition(".")[0]
+        sql, args = self.condition(key, value)
+        if owner in self.embeds:
+            # filters on an embedded resource filter the embed, not the parent row
+            self.embeds[owner]["on"].append(sql)
+            self.embeds[owner]["args"].extend(args)
+        else:
+            self.where.append(sql)
+            self.args.extend(args)
+
+    def order_by(self, text: str):
+        for item in split_top(text):
+            col, *mods = item.split(".")
+            desc = "desc" in mods
+            nulls = "first" if "nullsfirst" in mods else "last" if "nullslast" in mods else ("first" if desc else "last")
+            self.order.append(f"{self.column(col)} {'desc' if desc else 'asc'} nulls {nulls}")
+
+    def sql(self) -> tuple:
+        cols = [f"t.{quote(c)}" for c in self.fields]
+        joins, join_args = [], []
+        for e in self.embeds.values():
+            a = e["alias"]
+            cols += [f"{a}.{quote(c)}" for c in e["columns"]] + [f"{a}.{quote(e['to'])}"]
+            on = " and ".join([f"{a}.{quote(e['to'])} = t.{quote(e['from'])}"] + e["on"])
+            joins.append(f"{'join' if e['inner'] else 'left join'} {quote(e['table'])} {a} on {on}")
+            join_args.extend(e["args"])
+        sql = f"select {', '.join(cols) or '1'} from {quote(self.table)} t {' '.join(joins)}"
+        if self.where:
+            sql += " where " + " and ".join(self.where)
+        if self.order:
+            sql += " order by " + ", ".join(self.order)
+        if self.limit is not None or self.offset is not None:
+            sql += f" limit {-1 if self.limit is None else self.limit} offset {self.offset or 0}"
+        return sql, join_args + self.args
+
+    def rows(self, cursor) -> list:
+        out = []
+        n = len(self.fields)
+        for rec in cursor:
+            row = dict(zip(self.fields, rec[:n]))
+            i = n
+            for key, e in self.embeds.items():
+                width = len(e["columns"])
+                values = rec[i:i + width + 1]
+                row[key] = dict(zip(e["columns"], values[:width])) if values[width] is not None else None
+                i += width + 1
+            out.append(row)
+        return out
+
+
+# ---- server ----
+
+class FakeSupabase:
+    def __init__(self, latency: float = 0.0, token_ttl: int = 3600, host: str = "127.0.0.1", port: int = 0,
+                 path: str = ":memory:"):
+        self.latency = latency  # seconds added to every request, as network round trip
+        self.token_ttl = token_ttl
+        self.host, self.port = host, port
+        self.secret = secrets.token_hex(16)
+        self.anon_key = sign_jwt({"role": "anon", "iss": "fake-supabase", "exp": int(time.time()) + 10 * 365 * 86400},
+                                 self.secret)
+        self.service_key = sign_jwt({"role": "service_role", "iss": "fake-supabase",
+                                     "exp": int(time.time()) + 10 * 365 * 86400}, self.secret)
+        self.conn = connect_sqlite(path)
+        self.lock = threading.Lock()
+        self.users: dict = {}  # email -> user
+        self.refresh_tokens: dict = {}  # refresh token -> user id
+        self.requests = Counter()  # "GET transactions", "rpc apply_rollup_deltas", ...
+        self._requests_lock = threading.Lock()
+        self._columns: dict = {}
+        self._foreign_keys: dict = {}
+        self._server = self._thread = None
+        self.url = None
+
+    # -- schema --
+
+    def columns(self, table: str) -> list:
+        if table not in self._columns:
+            cols = [r[1] for r in self.conn.execute(f"pragma table_info({quote(table)})")]
+            if not cols:
+                raise ApiError(404, "PGRST205", f"Could not find the table 'public.{table}' in the schema cache")
+            self._columns[table] = cols
+        return self._columns[table]
+
+    def foreign_key(self, table: str, target: str):
+        """(column, referenced column) of table's foreign key to target, or None."""
+        key = (table, target)
+        if key not in self._foreign_keys:
+            self._foreign_keys[key] = next(
+                ((r[3], r[4] or "id") for r in self.conn.execute(f"pragma foreign_key_list({quote(table)})")
+                 if r[2] == target), None)
+        return self._foreign_keys[key]
+
+    # -- users --
+
+    def add_user(self, email: str, password: str) -> str:
+        with self.lock:
+            if email in self.users:
+                raise AuthError(422, "user_already_exists", "User already registered")
+            self.users[email] = {"id": str(uuid.uuid4()), "email": email, "password": password,
+                                 "created_at": datetime.now(timezone.utc).isoformat()}
+            return self.users[email]["id"]
+
+    def _user_json(self, user: dict) -> dict:
+        return {"id": user["id"], "aud": "authenticated", "role": "authenticated", "email": user["email"],
+                "app_metadata": {"provider": "email", "providers": ["email"]}, "user_metadata": {},
+                "created_at": user["created_at"], "email_confirmed_at": user["created_at"], "identities": []}
+
+    def session_for(self, user: dict) -> dict:
+        now = int(time.time())
+        claims = {"sub": user["id"], "email": user["email"], "role": "authenticated", "aud": "authenticated",
+                  "session_id": str(uuid.uuid4()), "iat": now, "exp": now + self.token_ttl}
+        refresh = secrets.token_urlsafe(16)
+        with self.lock:
+            self.refresh_tokens[refresh] = user["id"]
+        return {"access_token": sign_jwt(claims, self.secret), "token_type": "bearer",
+                "expires_in": self.token_ttl, "expires_at": now + self.token_ttl,
+                "refresh_token": refresh, "user": self._user_json(user)}
+
+    def auth(self, request: Request, route: str) -> Response:
+        body = request.get_json(silent=True) or {}
+        if route == "token" and request.args.get("grant_type") == "password":
+            user = self.users.get(body.get("email"))
+            if user is None or not hmac.compare_digest(user["password"], body.get("password") or ""):
+                raise AuthError(400, "invalid_credentials", "Invalid login credentials")
+            return _json(self.session_for(user))
+        if route == "token" and request.args.get("grant_type") == "refresh_token":
+            with self.lock:
+                # single use, as GoTrue rotates them
+                user_id = self.refresh_tokens.pop(body.get("refresh_token"), None)
+            user = next((u for u in self.users.values() if u["id"] == user_id), None)
+            if user is None:
+                raise AuthError(400, "refresh_token_not_found", "Invalid Refresh Token: Refresh Token Not Found")
+            return _json(self.session_for(user))
+        if route == "signup":
+            self.add_user(body.get("email"), body.get("password") or "")
+            return _json(self.session_for(self.users[body["email"]]))
+        if route == "user":
+            claims = self.claims(request)
+            user = next((u for u in self.users.values() if u["id"] == claims.get("sub")), None)
+            if user is None:
+                raise AuthError(404, "user_not_found", "User not found")
+            return _json(self._user_json(user))
+        if route == "logout":
+            return Response(status=204)
+        raise AuthError(404, "not_found", f"unsupported auth endpoint {route}")
+
+    def claims(self, request: Request) -> dict:
+        scheme, _, token = (request.headers.get("Authorization") or "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            raise ApiError(401, "PGRST301", "No JWT in request")
+        return verify_jwt(token, self.secret)
+
+    # -- PostgREST --
+
+    def read(self, table: str, args, user_id: str | None) -> list:
+        q = Read(self, table, user_id)
+        q.select(args.get("select"))
+        for key, value in args.items(multi=True):
+            if key in RESERVED_PARAMS:
+                continue
+            if key.endswith((".limit", ".offset", ".order")):
+                raise ApiError(400, "PGRST100", f"{key} on embedded resources is not supported")
+            q.filter(key, value)
+        if "order" in args:
+            q.order_by(",".join(args.getlist("order")))
+        try:
+            q.limit = int(args["limit"]) if "limit" in args else None
+            q.offset = int(args["offset"]) if "offset" in args else None
+        except ValueError:
+            raise ApiError(400, "PGRST100", "limit and offset must be integers")
+        sql, params = q.sql()
+        with self.lock:
+            return q.rows(self.conn.execute(sql, params))
+
+    def write(self, table: str, rows, args, prefer: dict, user_id: str | None) -> list:
+        rows = [rows] if isinstance(rows, dict) else rows
+        if not rows:
+            return []
+        columns = self.columns(table)
+        keys = list(dict.fromkeys(k for r in rows for k in r))
+        for k in keys:
+            if k not in columns:
+                raise ApiError(400, "PGRST204", f"Could not find the '{k}' column of '{table}' in the schema cache")
+        if "user_id" in columns and user_id is not SERVICE_ROLE and any(r.get("user_id") != user_id for r in rows):
+            raise ApiError(403, "42501", f'new row violates row-level security policy for table "{table}"')
+        sql = f"insert into {quote(table)} ({', '.join(map(quote, keys))}) values ({', '.join('?' * len(keys))})"
+        resolution = prefer.get("resolution")
+        if resolution:
+            target = [c.strip() for c in (args.get("on_conflict") or "id").split(",")]
+            updates = [k for k in keys if k not in target]
+            sql += f" on conflict ({', '.join(map(quote, target))}) "
+            if resolution == "ignore-duplicates" or not updates:
+                sql += "do nothing"
+            else:
+                sql += "do update set " + ", ".join(f"{quote(k)} = excluded.{quote(k)}" for k in updates)
+        sql += " returning *"
+        out = []
+        with self.lock:
+            try:
+                with self.conn:  # one transaction per request, like PostgREST
+                    for r in rows:
+                        rec = self.conn.execute(sql, [r.get(k) for k in keys]).fetchone()
+                        if rec is not None:  # ignored duplicates return nothing
+                            out.append(dict(rec))
+            except sqlite3.IntegrityError as e:
+                raise ApiError(409, "23505", str(e))
+        return out
+
+    def rpc(self, name: str, params: dict, user_id: str | None):
+        fn = getattr(self, f"rpc_{name}", None)
+        if fn is None or not user_id:
+            raise ApiError(404, "PGRST202", f"Could not find the function public.{name} in the schema cache")
+        try:
+            inspect.signature(fn).bind(user_id, **params)
+        except TypeError:
+            raise ApiError(404, "PGRST202", f"Could not find the function public.{name}({', '.join(params)})")
+        with self.lock, self.conn:
+            return fn(user_id, **params)
+
+    def count(self, key: str):
+        with self._requests_lock:
+            self.requests[key] += 1
+
+    def dispatch(self, request: Request) -> Response:
+        path = request.path
+        if path == "/_bench/stats":
+            with self._requests_lock:
+                return _json(dict(self.requests))
+        if not request.headers.get("apikey"):
+            raise ApiError(401, "PGRST000", "No API key found in request")
+        if self.latency:
+            time.sleep(self.latency)
+        if path.startswith("/auth/v1/"):
+            route = path[len("/auth/v1/"):]
+            self.count(f"auth {route}")
+            return self.auth(request, route)
+        if not path.startswith("/rest/v1/"):
+            raise ApiError(404, "PGRST125", f"Invalid path {path}")
+        name = path[len("/rest/v1/"):]
+        claims = self.claims(request)
+        user_id = SERVICE_ROLE if claims.get("role") == "service_role" else claims.get("sub")
+        if name.startswith("rpc/"):
+            name = name[4:]
+            self.count(f"rpc {name}")
+            return _json(self.rpc(name, request.get_json(silent=True) or {}, user_id))
+        self.columns(name)  # 404 for unknown tables
+        self.count(f"{request.method} {name}")
+        if request.method == "GET":
+            return _json(self.read(name, request.args, user_id))
+        if request.method == "POST":
+            prefer = dict(p.strip().split("=", 1) for p in (request.headers.get("Prefer") or "").split(",") if "=" in p)
+            rows = self.write(name, request.get_json(), request.args, prefer, user_id)
+            return _json(rows, 201) if prefer.get("return") == "representation" else Response(status=201)
+        raise ApiError(405, "PGRST117", f"{request.method} is not supported by the stand-in")
+
+    def wsgi(self, environ, start_response):
+        request = Request(environ)
+        try:
+            response = self.dispatch(request)
+        except ApiError as e:
+            response = _json(e.body(), e.status)
+        return response(environ, start_response)
+
+    def start(self):
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        self._server = make_server(self.host, self.port, self.wsgi, threaded=True)
+        self.url = f"http://{self.host}:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-supabase", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # -- RPCs (sql/002, sql/003, sql/004, sql/006), called with the lock held inside a transaction --
+
+    def _own(self, user_id, p_user_id: str | None) -> str:
+        """Whose rows a call touches: the caller's, or p_user_id's under the service role."""
+        if user_id is SERVICE_ROLE:
+            if p_user_id is None:
+                raise ApiError(400, "22004", "the service role has to name the user")
+            return p_user_id
+        if p_user_id not in (None, user_id):
+            raise ApiError(403, "42501", "permission denied for another user's rows")
+        return user_id
+
+    def rpc_transaction_summary(self, user_id, p_from=None, p_to=None):
+        return summarize_sqlite(self.conn, user_id, p_from, p_to)
+
+    def rpc_budget_variance(self, user_id, p_from=None, p_to=None):
+        return variance_sqlite(self.conn, user_id, p_from, p_to)
+
+    def rpc_backfill_fingerprints(self, user_id, p_rows):
+        # security invoker in sql/004: RLS limits a user to their own rows
+        scope = "" if user_id is SERVICE_ROLE else " and user_id = ?"
+        updated = 0
+        for r in p_rows:
+            args = (r["fingerprint"], r["id"]) + (() if user_id is SERVICE_ROLE else (user_id,))
+            updated += self.conn.execute(
+                "update transactions set fingerprint = ? where id = ? and fingerprint is null" + scope, args).rowcount
+        return updated
+
+    def _rollup_cell(self, user_id, month, category_id, type_):
+        return self.conn.execute(
+            "select rowid from monthly_rollups where user_id = ? and month = ? and category_id is ? and type = ?",
+            (user_id, month, category_id, type_)).fetchone()
+
+    def rpc_apply_rollup_deltas(self, user_id, p_rows):
+        for d in p_rows:
+            owner = self._own(user_id, d["user_id"])
+            cell = self._rollup_cell(owner, d["month"], d["category_id"], d["type"])
+            if cell:
+                self.conn.execute(
+                    """update monthly_rollups set total = total + ?, count = count + ?,
+                           min_amount = min(coalesce(min_amount, ?), ?), max_amount = max(coalesce(max_amount, ?), ?)
+                       where rowid = ?""",
+                    (d["total"], d["count"], d["min_amount"], d["min_amount"], d["max_amount"], d["max_amount"], cell[0]))
+            else:
+                self.conn.execute(
+                    """insert into monthly_rollups (user_id, month, category_id, type, total, count, min_amount, max_amount)
+                       values (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (owner, d["month"], d["category_id"], d["type"], d["total"], d["count"],
+                     d["min_amount"], d["max_amount"]))
+
+    def _set_budget(self, user_id, month, category_id, budget):
+        cell = self._rollup_cell(user_id, month, category_id, "expense")
+        if cell:
+            self.conn.execute("update monthly_rollups set budget = ? where rowid = ?", (budget, cell[0]))
+        else:
+            self.conn.execute("insert into monthly_rollups (user_id, month, category_id, type, budget) "
+                              "values (?, ?, ?, 'expense', ?)", (user_id, month, category_id, budget))
+
+    def rpc_apply_rollup_budgets(self, user_id, p_rows):
+        for b in p_rows:
+            self._set_budget(self._own(user_id, b["user_id"]), b["month"], b["category_id"], b["budget"])
+
+    def _actual_rollups(self, user_id):
+        return self.conn.execute(
+            """select substr(date, 1, 7) || '-01' as month, category_id, type,
+                      sum(amount) as total, count(*) as count, min(amount) as min_amount, max(amount) as max_amount
+               from transactions where user_id = ? group by 1, 2, 3""", (user_id,)).fetchall()
+
+    def rpc_rebuild_monthly_rollups(self, user_id, p_user_id=None):
+        user_id = self._own(user_id, p_user_id)
+        self.conn.execute("delete from monthly_rollups where user_id = ?", (user_id,))
+        self.conn.executemany(
+            """insert into monthly_rollups (user_id, month, category_id, type, total, count, min_amount, max_amount)
+               values (?, ?, ?, ?, ?, ?, ?, ?)""", [(user_id, *r) for r in self._actual_rollups(user_id)])
+        latest = self.conn.execute(
+            """select month, category_id, amount from budgets b
+               where user_id = ? and id = (select max(id) from budgets where user_id = b.user_id
+                                            and month = b.month and category_id is b.category_id)""", (user_id,))
+        for month, category_id, amount in latest.fetchall():
+            self._set_budget(user_id, month, category_id, amount)
+        return self.conn.execute("select count(*) from monthly_rollups where user_id = ?", (user_id,)).fetchone()[0]
+
+    def rpc_check_monthly_rollups(self, user_id, p_user_id=None):
+        user_id = self._own(user_id, p_user_id)
+        actual = {(r["month"], r["category_id"], r["type"]): r for r in self._actual_rollups(user_id)}
+        stored = {(r["month"], r["category_id"], r["type"]): r for r in self.conn.execute(
+            "select month, category_id, type, total, count from monthly_rollups where user_id = ? and count > 0",
+            (user_id,))}
+        out = []
+        for key in sorted(actual.keys() | stored.keys(), key=str):
+            a, r = actual.get(key), stored.get(key)
+            if a is None or r is None or a["count"] != r["count"] or abs(a["total"] - r["total"]) > 1e-6:
+                out.append({"month": key[0], "category_id": key[1], "type": key[2],
+                            "rollup_total": r and r["total"], "actual_total": a and a["total"],
+                            "rollup_count": r and r["count"], "actual_count": a and a["count"]})
+        return out
+
+    # -- data --
+
+    def seed(self, user_id: str, rows: int, seed: int = 0) -> int:
+        """
+        rows synthetic transactions (benchmarks.synthetic.stored_rows), a
+        budget per expense category and month, and their rollups.
+        """
+        data = stored_rows(rows, seed)
+        rng = np.random.default_rng(seed)
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "insert or ignore into categories (user_id, name, type) values (?, ?, ?)",
+                [(user_id, c, "income" if c in INCOME_CATEGORIES else "expense") for c in CATEGORIES])
+            ids = dict(self.conn.execute("select name, id from categories where user_id = ?", (user_id,)).fetchall())
+            self.conn.executemany(
+                "insert into transactions (user_id, date, amount, type, description, category_id) values (?, ?, ?, ?, ?, ?)",
+                [(user_id, r["date"], r["amount"], r["type"], r["description"], ids[r["categories"]["name"]])
+                 for r in data])
+            months = sorted({r["date"][:7] + "-01" for r in data})
+            self.conn.executemany(
+                "insert into budgets (user_id, category_id, month, amount) values (?, ?, ?, ?)",
+                [(user_id, ids[c], m, float(rng.integers(5, 50) * 1000))
+                 for m in months for c in CATEGORIES if c not in INCOME_CATEGORIES])
+            self.rpc_rebuild_monthly_rollups(user_id)
+        return len(data)
+
+
+# ---- in a separate process ----
+
+def _serve(conn, options: dict, users: dict, seed_rows: int):
+    sb = FakeSupabase(**options).start()
+    ids = {email: sb.add_user(email, password) for email, password in users.items()}
+    for user_id in ids.values():
+        if seed_rows:
+            sb.seed(user_id, seed_rows)
+    conn.send({"url": sb.url, "anon_key": sb.anon_key, "service_key": sb.service_key, "users": ids})
+    try:
+        conn.recv()  # any message, or the parent going away, stops the server
+    except EOFError:
+        pass
+    sb.stop()
+
+
+class Spawned:
+    """Handle on a FakeSupabase running in a child process."""
+
+    def __init__(self, process, conn, info: dict):
+        self.process, self.conn = process, conn
+        self.url, self.anon_key, self.users = info["url"], info["anon_key"], info["users"]
+        self.service_key = info["service_key"]
+
+    def stats(self) -> dict:
+        """Requests served so far, by method/rpc and table."""
+        return httpx.get(f"{self.url}/_bench/stats").json()
+
+    def stop(self):
+        try:
+            self.conn.send("stop")
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(10)
+        if self.process.is_alive():
+            self.process.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def spawn(users: dict | None = None, seed_rows: int = 0, **options) -> Spawned:
+    """
+    Starts a FakeSupabase in its own process. users is {email: password};
+    each gets seed_rows transactions. options go to FakeSupabase().
+    """
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe()
+    process = ctx.Process(target=_serve, args=(child, options, users or {}, seed_rows),
+                          name="fake-supabase", daemon=True)
+    process.start()
+    child.close()
+    return Spawned(process, parent, parent.recv())
@@ -0,0 +1,118 @@
+"""
+Stand-ins for external services, for benchmarks that must not touch the
+network.
+"""
+import asyncio
+import time
+
+
+class FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """
+    Mimics genai.GenerativeModel.generate_content: first_token_delay
+    before anything is produced, then chunk_delay per streamed chunk.
+    With fail_after set, the stream raises after that many chunks.
+    """
+
+    def __init__(self, first_token_delay: float = 0.8, chunk_delay: float = 0.05, chunks: int = 30,
+                 text: str = "You saved 18% of income this month. ", fail_after: int | None = None):
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        self.text = text
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def _check(self, i: int):
+        if i == self.fail_after:
+            raise RuntimeError("model stream interrupted")
+
+    def _stream(self):
+        time.sleep(self.first_token_delay)
+        for i in range(self.chunks):
+            self._check(i)
+            if i:
+                time.sleep(self.chunk_delay)
+            yield FakeChunk(self.text)
+
+    def generate_content(self, contents, generation_config=None, stream=False):
+        self.calls += 1
+        if stream:
+            return self._stream()
+        return FakeResponse("".join(c.text for c in self._stream()))
+
+    async def _astream(self):
+        await asyncio.sleep(self.first_token_delay)
+        for i in range(self.chunks):
+            self._check(i)
+            if i:
+                await asyncio.sleep(self.chunk_delay)
+            yield FakeChunk(self.text)
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False):
+        self.calls += 1
+        if stream:
+            return self._astream()
+        return FakeResponse("".join([c.text async for c in self._astream()]))
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+        self.count = len(data) if isinstance(data, list) else None
+
+
+class FakeQuery:
+    """Chainable like a postgrest request builder; every filter is accepted and ignored."""
+
+    def __init__(self, owner, table: str):
+        self.owner = owner
+        self.table = table
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def _result(self):
+        # copies, since callers flatten rows in place
+        return FakeResult([dict(r) for r in self.owner.tables.get(self.table, [])])
+
+    def execute(self):
+        time.sleep(self.owner.latency)
+        return self._result()
+
+
+class AsyncFakeQuery(FakeQuery):
+    async def execute(self):
+        await asyncio.sleep(self.owner.latency)
+        return self._result()
+
+
+class FakePostgrest:
+    """PostgREST client stand-in answering every query on a table with canned rows after latency seconds."""
+
+    query_class = FakeQuery
+
+    def __init__(self, latency: float = 0.02, tables: dict | None = None):
+        self.latency = latency
+        self.tables = tables or {}
+
+    def table(self, name: str):
+        return self.query_class(self, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params=None):
+        return self.query_class(self, name)
+
+
+class AsyncFakePostgrest(FakePostgrest):
+    query_class = AsyncFakeQuery
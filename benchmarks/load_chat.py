@@ -0,0 +1,107 @@
+"""
+Concurrent /chat/ask load against stubbed backends: the threaded WSGI
+app (a fixed pool of worker threads, like gunicorn gthread) versus the
+ASGI app from create_app(asgi=True) on one event loop.
+
+    python -m benchmarks.load_chat [requests] [wsgi_threads] [llm_seconds]
+"""
+import asyncio
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("SUPABASE_URL", "http://supabase.invalid")
+os.environ.setdefault("SUPABASE_KEY", "bench.anon.key")
+os.environ["CHAT_CACHE_BACKEND"] = "off"
+os.environ["COLUMNAR_CACHE"] = "off"
+
+from app import create_app  # noqa: E402
+from benchmarks.fakes import AsyncFakePostgrest, FakeModel, FakePostgrest  # noqa: E402
+from config import settings  # noqa: E402
+from routes import chat, chat_async  # noqa: E402
+from services import gemini_client  # noqa: E402
+
+DB_LATENCY = 0.02
+TABLES = {"transactions": [
+    {"id": i, "date": f"2025-11-{i % 28 + 1:02d}", "amount": 100.0 + i, "type": "expense",
+     "description": "Lunch", "categories": {"name": "Food"}} for i in range(50)
+]}
+USER = {"id": "bench-user", "email": "bench@example.com"}
+
+
+def fake_token() -> str:
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": time.time() + 3600}).encode()).decode().rstrip("=")
+    return f"bench.{payload}.sig"
+
+
+def report(name: str, latencies: list, wall: float):
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<28} {len(latencies) / wall:8.1f} req/s   p50 {statistics.median(latencies) * 1000:8.0f} ms"
+          f"   p99 {p99 * 1000:8.0f} ms   wall {wall:6.2f} s")
+
+
+def run_wsgi(n: int, threads: int):
+    chat.get_authed_client = lambda: FakePostgrest(DB_LATENCY, TABLES)
+    app = create_app()
+
+    # every request arrives at t=0, so latency includes time spent queued for a thread
+    start = time.perf_counter()
+
+    def one(i):
+        client = app.test_client()
+        with client.session_transaction() as s:
+            s["user"] = USER
+        resp = client.post("/chat/ask", json={"message": f"question {i}"})
+        assert resp.status_code == 200, resp.data
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(one, range(n)))
+    report(f"WSGI, {threads} threads", latencies, time.perf_counter() - start)
+
+
+async def run_asgi(n: int):
+    chat_async.async_authed_postgrest = lambda token: AsyncFakePostgrest(DB_LATENCY, TABLES)
+    app = create_app(asgi=True)
+    serializer = app.flask_app.session_interface.get_signing_serializer(app.flask_app)
+    cookie = serializer.dumps({"user": USER, "access_token": fake_token()})
+    cookie_header = f"{app.flask_app.config['SESSION_COOKIE_NAME']}={cookie}".encode()
+
+    start = time.perf_counter()
+
+    async def one(i):
+        body = json.dumps({"message": f"question {i}"}).encode()
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": "/chat/ask",
+                 "headers": [(b"cookie", cookie_header), (b"content-type", b"application/json")]}
+        await app(scope, receive, send)
+        assert sent[0]["status"] == 200, sent
+        return time.perf_counter() - start
+
+    latencies = await asyncio.gather(*(one(i) for i in range(n)))
+    report("ASGI, 1 event loop", list(latencies), time.perf_counter() - start)
+
+
+def main(n=200, threads=8, llm_seconds=1.0):
+    settings.CHAT_CACHE_BACKEND = "off"
+    gemini_client.get_model = lambda: FakeModel(first_token_delay=llm_seconds, chunk_delay=0, chunks=1)
+    print(f"{n} chats, fake LLM {llm_seconds:.1f} s, fake PostgREST {DB_LATENCY * 1000:.0f} ms/query")
+    run_wsgi(n, threads)
+    asyncio.run(run_asgi(n))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(*(int(a) for a in args[:2]), *(float(a) for a in args[2:3]))
@@ -0,0 +1,122 @@
+"""
+Synthetic statement data for benchmarks.
+"""
+import io
+import json
+
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ["Food", "Transport", "Shopping", "Rent", "Utilities", "Entertainment", "Health", "Salary", "Investment"]
+DESCRIPTIONS = ["Lunch at Cafe", "Uber Ride", "Metro Recharge", "Amazon Order", "Electricity Bill",
+                "Netflix", "Pharmacy", "Monthly Salary", "Mutual Fund Dividend", "Grocery Store"]
+
+
+def statement_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Bank-export shaped frame: string dates, ₹/comma formatted amounts,
+    mixed-case type labels, like the files users upload.
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 365 * 5, rows), unit="D")
+    amounts = rng.integers(10, 200_000, rows)
+    types = rng.choice(["Income", "Expense", "expense", "CR", "debit"], rows)
+    return pd.DataFrame({
+        "Date": days.strftime("%Y-%m-%d"),
+        "Category": rng.choice(CATEGORIES, rows),
+        "Description": rng.choice(DESCRIPTIONS, rows),
+        "Amount": [f"₹{a:,}" for a in amounts],
+        "Type": types,
+    })
+
+
+def statement_csv(rows: int, seed: int = 0) -> bytes:
+    return statement_frame(rows, seed).to_csv(index=False).encode("utf-8")
+
+
+def write_statement_csv(path: str, rows: int, seed: int = 0, chunk_rows: int = 100_000) -> str:
+    """statement_csv() straight to a file, a chunk at a time, for sizes up to millions of rows."""
+    with open(path, "wb") as fh:
+        for i, start in enumerate(range(0, rows, chunk_rows)):
+            frame = statement_frame(min(chunk_rows, rows - start), seed if i == 0 else [seed, i])
+            fh.write(frame.to_csv(index=False, header=i == 0).encode("utf-8"))
+    return path
+
+
+def stored_rows(rows: int, seed: int = 0) -> list:
+    """Transactions as PostgREST returns them (ids ascending, nested category)."""
+    rng = np.random.default_rng(seed)
+    days = pd.Timestamp("2020-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 365 * 5, rows)), unit="D")
+    dates = days.strftime("%Y-%m-%d")
+    amounts = rng.integers(10, 200_000, rows).astype(float)
+    types = rng.choice(["income", "expense"], rows, p=[0.2, 0.8])
+    cats = rng.choice(CATEGORIES, rows)
+    descs = rng.choice(DESCRIPTIONS, rows)
+    return [{"id": i + 1, "date": dates[i], "amount": amounts[i], "type": types[i],
+             "description": descs[i], "categories": {"name": cats[i]}} for i in range(rows)]
+
+
+def bank_csv(rows: int, seed: int = 0) -> bytes:
+    """HDFC-style export: dd/mm/yy dates, separate withdrawal and deposit columns."""
+    df = statement_frame(rows, seed)
+    amount = df["Amount"].str.replace("₹", "").str.replace(",", "")
+    deposit = df["Type"].isin(["Income", "CR"])
+    return pd.DataFrame({
+        "Date": pd.to_datetime(df["Date"]).dt.strftime("%d/%m/%y"),
+        "Narration": df["Description"],
+        "Chq./Ref.No.": "0000",
+        "Withdrawal Amt.": amount.where(~deposit, ""),
+        "Deposit Amt.": amount.where(deposit, ""),
+    }).to_csv(index=False).encode("utf-8")
+
+
+def statement_json(rows: int, seed: int = 0, lines: bool = False) -> bytes:
+    df = statement_frame(rows, seed)
+    if lines:
+        return df.to_json(orient="records", lines=True, force_ascii=False).encode("utf-8")
+    return json.dumps({"transactions": df.to_dict("records")}, ensure_ascii=False).encode("utf-8")
+
+
+def statement_ofx(rows: int, seed: int = 0) -> bytes:
+    """OFX 1.x (SGML, unclosed elements) as banks' QFX/OFX downloads are."""
+    df = statement_frame(rows, seed)
+    amount = df["Amount"].str.replace("₹", "").str.replace(",", "").astype(float)
+    signed = amount.where(df["Type"].isin(["Income", "CR"]), -amount)
+    dates = df["Date"].str.replace("-", "")
+    body = "".join(
+        f"<STMTTRN>\n<TRNTYPE>{'CREDIT' if a > 0 else 'DEBIT'}\n<DTPOSTED>{d}120000\n<TRNAMT>{a:.2f}\n"
+        f"<FITID>{i}\n<NAME>{n}\n</STMTTRN>\n"
+        for i, (d, a, n) in enumerate(zip(dates, signed, df["Description"])))
+    return ("OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\n\n<OFX>\n<BANKMSGSRSV1>\n<STMTTRNRS>\n<STMTRS>\n"
+            f"<BANKTRANLIST>\n{body}</BANKTRANLIST>\n</STMTRS>\n</STMTTRNRS>\n</BANKMSGSRSV1>\n</OFX>\n").encode("latin-1")
+
+
+def statement_xlsx(rows: int, seed: int = 0) -> bytes:
+    """Excel export with a few account-detail lines above the table. Needs openpyxl."""
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        pd.DataFrame([["Account statement"], ["Account: XXXX1234"]]).to_excel(writer, header=False, index=False)
+        statement_frame(rows, seed).to_excel(writer, startrow=3, index=False)
+    return buf.getvalue()
+
+
+def narrations(rows: int, merchants: int = 2000, seed: int = 0) -> tuple:
+    """
+    UPI/card style narrations with a unique reference number per row, and
+    the category each merchant really belongs to. A few merchants are
+    well-known brands; the rest are made-up names only a user's own
+    history can place.
+    """
+    rng = np.random.default_rng(seed)
+    known = [("SWIGGY", "Food"), ("ZOMATO", "Food"), ("UBER INDIA", "Transport"), ("AMAZON PAY", "Shopping"),
+             ("BIGBASKET", "Groceries"), ("NETFLIX COM", "Entertainment"), ("APOLLO PHARMACY", "Health"),
+             ("BESCOM", "Utilities"), ("ZERODHA BROKING", "Investment"), ("ACME CORP SALARY", "Salary")]
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    names = ["".join(rng.choice(letters, rng.integers(5, 10))) + " " + rng.choice(["STORES", "TRADERS", "ENTERPRISES", "MART"])
+             for _ in range(merchants - len(known))]
+    pool = known + [(n, c) for n, c in zip(names, rng.choice(CATEGORIES, len(names)))]
+    picks = rng.integers(0, len(pool), rows)
+    refs = rng.integers(10**11, 10**12, rows)
+    channel = rng.choice(["UPI/DR", "POS", "NEFT DR"], rows)
+    descs = [f"{channel[i]}/{refs[i]}/{pool[p][0]}/{pool[p][0].split()[0].lower()}@ybl" for i, p in enumerate(picks)]
+    return descs, [pool[p][1] for p in picks]
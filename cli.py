@@ -0,0 +1,57 @@
+"""
+Maintenance commands, e.g.
+
+    flask rollups rebuild <user_id>
+    flask rollups check <user_id>
+    flask imports backfill-fingerprints <user_id>
+
+They run with SUPABASE_SERVICE_KEY (the service role key, as background
+imports do), so they see any user's rows while SUPABASE_KEY stays the
+anon key the web app uses. Every query they make is scoped by user_id.
+"""
+import click
+from flask.cli import AppGroup
+
+from config import settings
+from services.supabase_client import service_postgrest
+
+rollups_cli = AppGroup("rollups", help="Maintain the monthly rollup table.")
+imports_cli = AppGroup("imports", help="Maintain imported transactions.")
+
+
+def service_client():
+    if not settings.SUPABASE_SERVICE_KEY:
+        raise click.ClickException("SUPABASE_SERVICE_KEY is not set; these commands need the service role key")
+    return service_postgrest()
+
+
+@rollups_cli.command("rebuild")
+@click.argument("user_id")
+def rebuild_rollups(user_id):
+    """Recompute a user's rollups from raw transactions and budgets."""
+    from services import rollups  # commands import their modules when run, not when the app loads
+    n = rollups.rebuild(service_client(), user_id)
+    click.echo(f"rebuilt {n} rollup rows for {user_id}")
+
+
+@rollups_cli.command("check")
+@click.argument("user_id")
+def check_rollups(user_id):
+    """List rollup cells that disagree with the raw transactions."""
+    from services import rollups
+    diffs = rollups.check(service_client(), user_id)
+    for d in diffs:
+        click.echo(f"{d['month']} category={d['category_id']} {d['type']}: "
+                   f"rollup {d['rollup_total']}/{d['rollup_count']} vs actual {d['actual_total']}/{d['actual_count']}")
+    click.echo("consistent" if not diffs else f"{len(diffs)} inconsistent cell(s)")
+    if diffs:
+        raise SystemExit(1)
+
+
+@imports_cli.command("backfill-fingerprints")
+@click.argument("user_id")
+def backfill(user_id):
+    """Fingerprint transactions imported before dedup, so re-uploads are detected."""
+    from services.importer import backfill_fingerprints
+    n = backfill_fingerprints(service_client(), user_id)
+    click.echo(f"fingerprinted {n} transactions for {user_id}")
@@ -7,9 +7,53 @@ class Settings:
     SECRET_KEY = os.getenv("FLASK_SECRET_KEY", "dev")
     SUPABASE_URL = os.getenv("SUPABASE_URL")
     SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+    SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")  # service role, for background imports; unset runs them in the request
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
     GEMINI_MODEL_ID = os.getenv("GEMINI_MODEL_ID", "gemini-2.5-flash")
     UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "uploads")
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", 16 * 1024 * 1024))  # 16MB
+    IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", 5000))  # rows parsed per chunk
+    IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))  # rows per insert call
+    IMPORT_BACKGROUND_BYTES = int(os.getenv("IMPORT_BACKGROUND_BYTES", 256 * 1024))  # larger uploads become background jobs
+    IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", 2))  # import jobs run at once per process
+    IMPORT_PARSE_PROCESSES = int(os.getenv("IMPORT_PARSE_PROCESSES", 2))  # CSV parsing processes; 0 parses in the worker thread
+    IMPORT_JOB_RETRIES = int(os.getenv("IMPORT_JOB_RETRIES", 2))  # automatic passes over failed batches
+    IMPORT_JOB_BACKEND = os.getenv("IMPORT_JOB_BACKEND", "sqlite")  # sqlite | memory
+    IMPORT_JOB_DB = os.getenv("IMPORT_JOB_DB", os.path.join(os.path.dirname(__file__), "cache", "import_jobs.sqlite3"))
+    IMPORT_SPOOL_FOLDER = os.getenv("IMPORT_SPOOL_FOLDER", os.path.join(UPLOAD_FOLDER, "spool"))
+    SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", 20))  # max open connections to PostgREST
+    SUPABASE_POOL_KEEPALIVE = int(os.getenv("SUPABASE_POOL_KEEPALIVE", 10))  # idle connections kept
+    SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", 10))  # seconds
+    SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", 5))  # seconds
+    AUTH_REFRESH_SKEW = int(os.getenv("AUTH_REFRESH_SKEW", 60))  # refresh this many seconds before exp
+    AUTHED_CLIENT_CACHE_SIZE = int(os.getenv("AUTHED_CLIENT_CACHE_SIZE", 256))  # tokens with a cached client
+    DASHBOARD_PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", 50))  # rows per dashboard table page
+    CATEGORY_CACHE_TTL = int(os.getenv("CATEGORY_CACHE_TTL", 300))  # seconds
+    AUTO_CATEGORIZE = os.getenv("AUTO_CATEGORIZE", "on") != "off"  # fill missing categories on import
+    CATEGORIZER_HISTORY_ROWS = int(os.getenv("CATEGORIZER_HISTORY_ROWS", 20000))  # categorized rows the per-user model learns from
+    FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", 16))  # threads for concurrent PostgREST queries
+    CHAT_CACHE_BACKEND = os.getenv("CHAT_CACHE_BACKEND", "memory")  # memory | disk | off
+    CHAT_CACHE_TTL = int(os.getenv("CHAT_CACHE_TTL", 15 * 60))  # seconds
+    CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", 1000))  # entries
+    CHAT_CACHE_PATH = os.getenv("CHAT_CACHE_PATH", os.path.join(os.path.dirname(__file__), "cache", "chat_responses.sqlite3"))
+    COLUMNAR_CACHE = os.getenv("COLUMNAR_CACHE", "on") != "off"  # local Arrow copy of transactions; needs pyarrow
+    COLUMNAR_CACHE_DIR = os.getenv("COLUMNAR_CACHE_DIR", os.path.join(os.path.dirname(__file__), "cache", "columnar"))
+    COLUMNAR_CACHE_MAX_MB = int(os.getenv("COLUMNAR_CACHE_MAX_MB", 512))  # across all users, LRU evicted
+    COLUMNAR_SYNC_INTERVAL = int(os.getenv("COLUMNAR_SYNC_INTERVAL", 60))  # seconds between checks for rows written elsewhere
+    COLUMNAR_MAX_SEGMENTS = int(os.getenv("COLUMNAR_MAX_SEGMENTS", 8))  # appended files per user before merging
+    COLUMNAR_RECONCILE_INTERVAL = int(os.getenv("COLUMNAR_RECONCILE_INTERVAL", 600))  # seconds between checks against the rollups
+    COLUMNAR_BUILD_WORKERS = int(os.getenv("COLUMNAR_BUILD_WORKERS", 2))  # background threads loading and repairing caches
+    INSTRUMENTATION = os.getenv("INSTRUMENTATION", "on") != "off"  # spans, Server-Timing and /metrics
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # /metrics needs "Authorization: Bearer <token>"; unset = not served
+    PROFILE_SLOW_MS = int(os.getenv("PROFILE_SLOW_MS", 0))  # dump sampled stacks of slower requests; 0 = off
+    PROFILE_INTERVAL_MS = int(os.getenv("PROFILE_INTERVAL_MS", 5))  # sampling period
+    PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(__file__), "cache", "profiles"))
+    CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", 3000))  # data section of the prompt
+    SEARCH_INDEX = os.getenv("SEARCH_INDEX", "on") != "off"  # per-user BM25 index the chat picks transactions with
+    SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", os.path.join(os.path.dirname(__file__), "cache", "search"))
+    SEARCH_INDEX_MAX_SEGMENTS = int(os.getenv("SEARCH_INDEX_MAX_SEGMENTS", 8))  # appended files per user before merging
+    SEARCH_INDEX_MEMORY_USERS = int(os.getenv("SEARCH_INDEX_MEMORY_USERS", 64))  # users whose index stays loaded
+    CHAT_MATCHES_K = int(os.getenv("CHAT_MATCHES_K", 40))  # best-matching transactions in the prompt
+    CHAT_RECENT_WITH_MATCHES = int(os.getenv("CHAT_RECENT_WITH_MATCHES", 30))  # latest transactions kept next to them
 
 settings = Settings()
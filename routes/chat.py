@@ -1,32 +1,20 @@
 # chat.py
-from flask import Blueprint, request, jsonify, session, render_template, redirect, url_for
+from flask import Blueprint, request, jsonify, session, render_template, redirect, url_for, Response, stream_with_context
+import json
+import time
 from datetime import date, timedelta
-from services.supabase_client import authed_postgrest, get_supabase
-from services.gemini_client import ask_gemini
-from postgrest.exceptions import APIError
+from services.auth_session import get_authed_client
+from services.gemini_client import ask_gemini_cached, ask_gemini_stream_cached
+from services.response_cache import data_fingerprint
+from services import budgets
+from services.concurrent_fetch import fetch_all
+from services.instrumentation import traced
+# the pandas/numpy-backed modules (rollups, analytics, chat_context and the
+# local caches) are imported by the functions that use them, so starting a
+# worker doesn't load them (benchmarks/bench_startup.py)
 
 chat_bp = Blueprint("chat", __name__, url_prefix="/chat")
 
-def get_pg_client_or_redirect():
-    token = session.get("access_token")
-    refresh_token = session.get("refresh_token")
-    pg = authed_postgrest(token)
-    try:
-        pg.table("transactions").select("id").limit(1).execute()
-        return pg
-    except APIError as e:
-        if "JWT expired" in str(e):
-            if not refresh_token:
-                return None
-            supabase = get_supabase()
-            new_session = supabase.auth.refresh_session(refresh_token)
-            session["access_token"] = new_session.access_token
-            session["refresh_token"] = new_session.refresh_token
-            pg = authed_postgrest(new_session.access_token)
-            return pg
-        else:
-            raise e
-
 @chat_bp.get("/")
 def chat_page():
     # Require login to access chat UI
@@ -34,67 +22,98 @@ def chat_page():
         return redirect(url_for("auth.login_page"))
     return render_template("chat.html")
 
-@chat_bp.post("/ask")
-def ask():
-    if "user" not in session:
-        return jsonify({"error": "Unauthorized"}), 401
+def window_start(days: int) -> str:
+    return (date.today() - timedelta(days=days)).isoformat()
 
-    payload = request.get_json(force=True) or {}
-    user_msg = payload.get("message", "").strip()
-    days = int(payload.get("days", 30))
+def probe_query(pg):
+    return pg.table("transactions").select("id").limit(1)
 
-    since = (date.today() - timedelta(days=days)).isoformat()
-    pg = get_pg_client_or_redirect()
-    if pg is None:
-        return jsonify({"error": "Session expired"}), 401
-
-    # Check if user has any transactions first
-    tx_count = (pg.table("transactions")
-                .select("id", count="exact")
-                .execute())
-    
-    has_transactions = tx_count.count > 0 if hasattr(tx_count, 'count') else False
-    
+def tx_query(pg, since: str):
     # Get transactions for the specified time period
-    tx = (pg.table("transactions")
-            .select("date,amount,type,description,categories(name)")
-            .gte("date", since)
-            .order("date.desc")
-            .limit(500)
-            .execute()).data or []
-
-    # Get budgets
-    budgets = (pg.table("budgets")
-                 .select("month,amount,category_id,categories(name)")
-                 .order("month.desc")
-                 .limit(100)
-                 .execute()).data or []
+    return (pg.table("transactions")
+              .select("id,date,amount,type,description,categories(name)")
+              .gte("date", since)
+              .order("date.desc")
+              .limit(500))
+
+def local_tx(pg, user_id: str | None, since: str):
+    """The whole window, newest first, from the local columnar cache (None when unavailable)."""
+    if not user_id:
+        return None
+    from services import columnar_cache
+    return columnar_cache.frame(pg, user_id, columnar_cache.COLUMNS, since, newest_first=True)
+
+def tx_marker(tx) -> tuple:
+    """(row count, newest id) of the window's transactions, list or frame."""
+    if isinstance(tx, list):
+        return len(tx), max((t["id"] for t in tx), default=None)
+    return len(tx), (int(tx["id"].max()) if len(tx) else None)
+
+def fetch_chat_data(pg, since: str, user_id: str | None = None, question: str | None = None):
+    """
+    The queries are independent, so they run concurrently. A one-row
+    probe replaces the exact count over the whole table; it only matters
+    when the window itself is empty.
+    """
+    from services import rollups, search_index
+
+    def tx():
+        local = local_tx(pg, user_id, since)
+        return local if local is not None else tx_query(pg, since).execute().data or []
+
+    return fetch_all(
+        has_any=lambda: bool(probe_query(pg).execute().data),
+        tx=tx,
+        monthly=lambda: rollups.fetch_rollups(pg, since[:7] + "-01"),
+        # budget vs actual for the window's months, computed by the database
+        budgets=lambda: budgets.variance(pg, since),
+        # the window's transactions the question is about, from the local index
+        matches=lambda: search_index.search(pg, user_id, question, since),
+    )
+
+def routed_reply(user_msg: str, since: str, data: dict, timings: dict) -> dict | None:
+    """Reply for questions the analytics module answers without the model, else None."""
+    from services import analytics
+    intent = analytics.route(user_msg)
+    months = intent and analytics.scope(user_msg, intent, since)
+    if not months:
+        return None
+    start = time.perf_counter()
+    reply = analytics.answer(intent, analytics.metrics(analytics.within(data["monthly"], months),
+                                                       analytics.within(data["budgets"], months)))
+    timings["analytics"] = (time.perf_counter() - start) * 1000
+    return {"reply": reply, "cached": False, "routed": intent, "timings": timings}
+
+@traced("prompt")
+def compose_prompt(user_msg: str, days: int, since: str, data: dict, timings: dict):
+    """Prompt from already-fetched data (shared by the sync and async handlers)."""
+    from services import analytics
+    from services.chat_context import build_context
+    tx, monthly, variance = data["tx"], data["monthly"], data["budgets"]
 
     # Prepare context information
     timeframe_text = f"the last {days} days" if days <= 90 else f"the last {days//30} months"
     
-    # Check if we have data in the selected timeframe
-    has_data_in_timeframe = len(tx) > 0
-    total_transaction_count = tx_count.count if hasattr(tx_count, 'count') else 0
+    # Compact tables + summaries instead of raw dict reprs
+    start = time.perf_counter()
+    facts = analytics.fact_lines(analytics.metrics(monthly, variance))
+    context = build_context(tx, monthly, variance, facts=facts, matches=data["matches"])
+    timings["context"] = (time.perf_counter() - start) * 1000
     
     prompt = f"""
-You are a helpful and strict personal finance coach. Using the provided JSON data, answer the user's question and provide practical advice.
+You are a helpful and strict personal finance coach. Using the provided data, answer the user's question and provide practical advice.
 Return a clear and concise response. Use Indian Rupee (INR) as default money.
 
 CONTEXT:
 - User is asking about their financial data for {timeframe_text}
-- Total transactions in database: {total_transaction_count}
+- Has any transactions in database: {"yes" if data["has_any"] or len(tx) else "no"}
 - Transactions in selected timeframe: {len(tx)}
-- Budgets available: {len(budgets)}
+- Budgets available: {len(variance)}
 
 USER QUESTION:
 {user_msg}
 
-TRANSACTIONS DATA:
-{tx}
-
-BUDGETS DATA:
-{budgets}
+{context.text}
 
 IMPORTANT RESPONSE GUIDELINES:
 1. If there are no transactions at all, inform the user they need to upload transaction data first and explain how to do that from the dashboard page.
@@ -103,9 +122,82 @@ IMPORTANT RESPONSE GUIDELINES:
 4. Use specific numbers and dates from the data when giving advice.
 5. Be professional in tone.
 6. Keep the answer straight forward.
+7. Quote the METRICS figures as given instead of recalculating them.
 """
+    # same question over unchanged data -> cached reply
+    fingerprint = data_fingerprint(
+        since, tx_marker(tx),
+        [(m["month"], m["category"], m["type"], m["count"], m["total"], m["budget"]) for m in monthly],
+    )
+    return prompt, context, fingerprint, timings
+
+def read_question():
+    payload = request.get_json(force=True) or {}
+    return payload.get("message", "").strip(), int(payload.get("days", 30))
+
+@chat_bp.post("/ask")
+def ask():
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    user_msg, days = read_question()
+    pg = get_authed_client()
+    if pg is None:
+        return jsonify({"error": "Session expired"}), 401
+
+    since = window_start(days)
+    data, timings = fetch_chat_data(pg, since, session["user"]["id"], user_msg)
+    routed = routed_reply(user_msg, since, data, timings)
+    if routed:
+        return jsonify(routed)
+
+    prompt, context, fingerprint, timings = compose_prompt(user_msg, days, since, data, timings)
+    from services.chat_context import estimate_tokens
     try:
-        reply = ask_gemini(prompt, json_mode=False)
-        return jsonify({"reply": reply})
+        start = time.perf_counter()
+        reply, cached = ask_gemini_cached(prompt, user_id=session["user"]["id"],
+                                          question=user_msg, fingerprint=fingerprint)
+        timings["llm"] = (time.perf_counter() - start) * 1000
+        return jsonify({"reply": reply, "cached": cached, "timings": timings,
+                        "context_tokens": context.tokens, "prompt_tokens": estimate_tokens(prompt)})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+def sse(data: dict, event: str | None = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+@chat_bp.post("/ask/stream")
+def ask_stream():
+    """Same as /ask, but the reply is sent as server-sent events while it is generated."""
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    user_msg, days = read_question()
+    pg = get_authed_client()
+    if pg is None:
+        return jsonify({"error": "Session expired"}), 401
+
+    user_id = session["user"]["id"]
+    since = window_start(days)
+    data, timings = fetch_chat_data(pg, since, user_id, user_msg)
+    routed = routed_reply(user_msg, since, data, timings)
+    if routed:
+        return Response(sse({"text": routed["reply"]}) + sse({"routed": routed["routed"], "timings": timings}, event="done"),
+                        mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    prompt, context, fingerprint, timings = compose_prompt(user_msg, days, since, data, timings)
+    from services.chat_context import estimate_tokens
+
+    def events():
+        try:
+            for text in ask_gemini_stream_cached(prompt, user_id=user_id,
+                                                 question=user_msg, fingerprint=fingerprint):
+                yield sse({"text": text})
+            yield sse({"context_tokens": context.tokens, "prompt_tokens": estimate_tokens(prompt),
+                       "timings": timings}, event="done")
+        except Exception as e:
+            yield sse({"error": str(e)}, event="error")
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,277 @@
+"""
+Async serving mode: /chat/ask and /chat/ask/stream as native ASGI
+handlers, everything else delegated to the Flask app.
+
+A chat spends almost all of its time waiting on PostgREST and Gemini.
+Here that wait is an await on the event loop instead of a blocked worker
+thread, so one process can hold hundreds of chats in flight.
+
+    uvicorn asgi:app --workers 2
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from http.cookies import SimpleCookie
+
+from asgiref.wsgi import WsgiToAsgi
+
+from routes.chat import compose_prompt, local_tx, probe_query, routed_reply, tx_query, window_start, sse
+from services import instrumentation, budgets
+from config import settings
+from services.auth_session import needs_refresh
+from services.gemini_client import ask_gemini_async, ask_gemini_stream_async, get_model
+from services.response_cache import get_cache
+from services.supabase_client import async_authed_postgrest, authed_postgrest
+
+log = logging.getLogger(__name__)
+
+
+def warm_up():
+    """
+    Loads what a chat needs (pandas, numpy, google.generativeai) that
+    startup leaves out, so the first chat doesn't import them on the loop.
+    """
+    try:
+        from services import analytics, chat_context, columnar_cache, rollups, search_index  # noqa: F401
+        get_model()
+    except Exception as e:
+        log.warning("chat warm-up failed: %s", e)
+
+
+async def _timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, (time.perf_counter() - start) * 1000
+
+
+async def fetch_chat_data_async(apg, since: str, pg=None, user_id: str | None = None,
+                                question: str | None = None):
+    """
+    Async twin of routes.chat.fetch_chat_data: same queries, gathered on the
+    loop. pg (a sync client) is only used to sync the local columnar cache
+    and search index.
+    """
+    from services import rollups, columnar_cache, search_index
+
+    async def has_any():
+        return bool((await probe_query(apg).execute()).data)
+
+    async def tx():
+        if pg is not None and columnar_cache.enabled():
+            local = await asyncio.to_thread(local_tx, pg, user_id, since)
+            if local is not None:
+                return local
+        return (await tx_query(apg, since).execute()).data or []
+
+    async def monthly():
+        return rollups.flatten_rollups((await rollups.rollups_query(apg, since[:7] + "-01").execute()).data or [])
+
+    async def variance():
+        return budgets.shape((await budgets.variance_query(apg, since).execute()).data or [])
+
+    async def matches():
+        if pg is None or not search_index.enabled():
+            return None
+        return await asyncio.to_thread(search_index.search, pg, user_id, question, since)
+
+    start = time.perf_counter()
+    names = ["has_any", "tx", "monthly", "budgets", "matches"]
+    done = await asyncio.gather(_timed(has_any()), _timed(tx()), _timed(monthly()), _timed(variance()),
+                                _timed(matches()))
+    data = {name: result for name, (result, _) in zip(names, done)}
+    timings = {name: ms for name, (_, ms) in zip(names, done)}
+    timings["fetch"] = (time.perf_counter() - start) * 1000
+    return data, timings
+
+
+async def cached_reply(user_id: str, question: str, fingerprint: str, prompt: str):
+    cache = get_cache()
+    cached = cache.lookup(user_id, question, fingerprint) if cache else None
+    if cached is not None:
+        return cached, True
+    reply = await ask_gemini_async(prompt)
+    if cache:
+        cache.store(user_id, question, fingerprint, reply)
+    return reply, False
+
+
+async def cached_stream(user_id: str, question: str, fingerprint: str, prompt: str):
+    cache = get_cache()
+    cached = cache.lookup(user_id, question, fingerprint) if cache else None
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    async for text in ask_gemini_stream_async(prompt):
+        parts.append(text)
+        yield text
+    if cache:
+        cache.store(user_id, question, fingerprint, "".join(parts))
+
+
+async def read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def send_json(send, status: int, payload: dict):
+    body = json.dumps(payload).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class AsyncChatApp:
+    """ASGI app: async chat endpoints in front of the WSGI Flask app."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.routes = {
+            ("POST", "/chat/ask"): self.ask,
+            ("POST", "/chat/ask/stream"): self.ask_stream,
+        }
+        # off the startup path: the worker serves requests while this runs
+        threading.Thread(target=warm_up, name="chat-warm-up", daemon=True).start()
+
+    def load_session(self, scope) -> dict:
+        """Reads Flask's signed session cookie (read-only)."""
+        cookies = SimpleCookie()
+        for name, value in scope.get("headers", []):
+            if name == b"cookie":
+                cookies.load(value.decode("latin-1"))
+        morsel = cookies.get(self.flask_app.config["SESSION_COOKIE_NAME"])
+        if morsel is None:
+            return {}
+        serializer = self.flask_app.session_interface.get_signing_serializer(self.flask_app)
+        try:
+            return serializer.loads(morsel.value, max_age=int(self.flask_app.permanent_session_lifetime.total_seconds()))
+        except Exception:
+            return {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        handler = self.routes.get((scope.get("method"), scope.get("path")))
+        if scope["type"] != "http" or handler is None:
+            return await self.wsgi(scope, receive, send)
+
+        body = await read_body(receive)
+        sess = self.load_session(scope)
+        if "user" in sess and sess.get("access_token") and needs_refresh(sess["access_token"]):
+            # refreshing rewrites the session cookie; let the Flask view do it
+            return await self.wsgi(scope, self._replay(body), send)
+        if not settings.INSTRUMENTATION:
+            return await handler(scope, body, sess, send)
+
+        trace, token = instrumentation.begin(f"chat.{handler.__name__}", "POST", profile=False)
+        status = 500
+        expose = instrumentation.exposes_timing(scope["path"], "user" in sess, self.flask_app.debug)
+
+        async def traced_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if expose:
+                    timing = (b"server-timing", trace.server_timing().encode())
+                    message = dict(message, headers=list(message.get("headers", [])) + [timing])
+            await send(message)
+
+        try:
+            await handler(scope, body, sess, traced_send)
+        finally:
+            instrumentation.finish(trace, status)
+            instrumentation.end(token)
+
+    @staticmethod
+    def _replay(body: bytes):
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Event().wait()  # body already sent; block until cancelled
+        return receive
+
+    async def _prepare(self, body: bytes, sess: dict):
+        payload = json.loads(body or b"{}") or {}
+        user_msg = payload.get("message", "").strip()
+        days = int(payload.get("days", 30))
+        since = window_start(days)
+        apg = async_authed_postgrest(sess["access_token"])
+        data, timings = await fetch_chat_data_async(apg, since, authed_postgrest(sess["access_token"]),
+                                                    sess["user"]["id"], user_msg)
+        routed = routed_reply(user_msg, since, data, timings)
+        if routed:
+            return user_msg, routed, None
+        # context building is pandas work; keep it off the event loop
+        prompt = await asyncio.to_thread(compose_prompt, user_msg, days, since, data, timings)
+        return user_msg, None, prompt
+
+    async def ask(self, scope, body: bytes, sess: dict, send):
+        if "user" not in sess:
+            return await send_json(send, 401, {"error": "Unauthorized"})
+        if not sess.get("access_token"):
+            return await send_json(send, 401, {"error": "Session expired"})
+        try:
+            user_msg, routed, prepared = await self._prepare(body, sess)
+            if routed:
+                return await send_json(send, 200, routed)
+            prompt, context, fingerprint, timings = prepared
+            from services.chat_context import estimate_tokens
+            start = time.perf_counter()
+            reply, cached = await cached_reply(sess["user"]["id"], user_msg, fingerprint, prompt)
+            timings["llm"] = (time.perf_counter() - start) * 1000
+        except Exception as e:
+            return await send_json(send, 500, {"error": str(e)})
+        await send_json(send, 200, {"reply": reply, "cached": cached, "timings": timings,
+                                    "context_tokens": context.tokens, "prompt_tokens": estimate_tokens(prompt)})
+
+    async def ask_stream(self, scope, body: bytes, sess: dict, send):
+        if "user" not in sess:
+            return await send_json(send, 401, {"error": "Unauthorized"})
+        if not sess.get("access_token"):
+            return await send_json(send, 401, {"error": "Session expired"})
+        try:
+            user_msg, routed, prepared = await self._prepare(body, sess)
+        except Exception as e:
+            # nothing is sent yet, so this can still be a plain JSON error
+            return await send_json(send, 500, {"error": str(e)})
+
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                                (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]})
+
+        async def emit(chunk: str):
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+
+        if routed:
+            await emit(sse({"text": routed["reply"]}))
+            await emit(sse({"routed": routed["routed"], "timings": routed["timings"]}, event="done"))
+            return await send({"type": "http.response.body", "body": b""})
+
+        prompt, context, fingerprint, timings = prepared
+        from services.chat_context import estimate_tokens
+        try:
+            async for text in cached_stream(sess["user"]["id"], user_msg, fingerprint, prompt):
+                await emit(sse({"text": text}))
+            await emit(sse({"context_tokens": context.tokens, "prompt_tokens": estimate_tokens(prompt),
+                            "timings": timings}, event="done"))
+        except Exception as e:
+            await emit(sse({"error": str(e)}, event="error"))
+        await send({"type": "http.response.body", "body": b""})
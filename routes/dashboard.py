@@ -1,11 +1,14 @@
 # dashboard.py
-from flask import Blueprint, render_template, request, session, redirect, url_for, flash
-import os
-import pandas as pd
-from services.supabase_client import authed_postgrest, get_supabase
-from services.finance_tools import normalize_csv, to_transactions,normalize_budget_csv,to_budgets
+from flask import Blueprint, render_template, request, session, redirect, url_for, flash, jsonify
+from werkzeug.wrappers import Response
+from services.auth_session import get_authed_client
+from services import budgets
+from services.pagination import transactions_page, budgets_page, page_size, CursorError
+from services.response_cache import invalidate_user as invalidate_responses
 from config import settings
-from postgrest.exceptions import APIError
+# the pandas-backed modules (importer, jobs, aggregates, rollups, the
+# columnar cache) are imported by the handlers that use them, so starting
+# a worker doesn't load them (benchmarks/bench_startup.py)
 
 dashboard_bp = Blueprint("dashboard", __name__, url_prefix="/")
 
@@ -15,30 +18,13 @@ def require_login():
 def get_pg_client_or_redirect():
     """
     Returns PostgREST client with valid JWT.
-    Refreshes token if expired. Redirects to login if refresh fails.
+    Redirects to login if the session can't be refreshed.
     """
-    token = session.get("access_token")
-    refresh_token = session.get("refresh_token")
-    pg = authed_postgrest(token)
-
-    try:
-        # test if token valid
-        pg.table("transactions").select("id").limit(1).execute()
-        return pg
-    except APIError as e:
-        if "JWT expired" in str(e):
-            if not refresh_token:
-                flash("Session expired, please log in again", "error")
-                return redirect(url_for("auth.login_page"))
-            # refresh
-            supabase = get_supabase()
-            new_session = supabase.auth.refresh_session(refresh_token)
-            session["access_token"] = new_session.access_token
-            session["refresh_token"] = new_session.refresh_token
-            pg = authed_postgrest(new_session.access_token)
-            return pg
-        else:
-            raise e
+    pg = get_authed_client()
+    if pg is None:
+        flash("Session expired, please log in again", "error")
+        return redirect(url_for("auth.login_page"))
+    return pg
 
 @dashboard_bp.get("/")
 def dashboard_page():
@@ -46,38 +32,93 @@ def dashboard_page():
         return redirect(url_for("auth.login_page"))
 
     pg = get_pg_client_or_redirect()
-    if not isinstance(pg, type(authed_postgrest(None))):
+    if isinstance(pg, Response):
         # redirect happened due to expired session
         return pg
 
-    # recent transactions
-    tx = (
-        pg.table("transactions")
-        .select("id,date,amount,type,description,categories(name)")
-        .order("date.desc")
-        .limit(20)
-        .execute()
-    )
-    txs = tx.data or []
-
-    income = sum(float(t["amount"]) for t in txs if t["type"] == "income")
-    expense = sum(float(t["amount"]) for t in txs if t["type"] == "expense")
+    from services import rollups, columnar_cache
+    from services.aggregates import summarize, summarize_frame
+
+    # first page of each table; the rest is fetched as the user scrolls
+    txs = transactions_page(pg, limit=settings.DASHBOARD_PAGE_SIZE)
+
+    # totals over the window: from the local columnar copy when there is
+    # one, else computed by the database (all history reads the rollups)
+    start, end = request.args.get("from"), request.args.get("to")
+    local = columnar_cache.frame(pg, session["user"]["id"], ["date", "amount", "type", "category"], start, end,
+                                 categorical=("type", "category"))
+    if local is not None:
+        summary = summarize_frame(local)
+    elif start or end:
+        summary = summarize(pg, start, end)
+    else:
+        summary = rollups.summary_from_rollups(rollups.fetch_rollups(pg))
+
+    bjs = budgets_page(pg, limit=settings.DASHBOARD_PAGE_SIZE)
+
+    # budget vs actual over the window, else for the latest budgeted month
+    if start or end:
+        variance = budgets.variance(pg, start, end)
+    elif bjs["items"]:
+        latest = bjs["items"][0]["month"]
+        variance = budgets.variance(pg, latest, latest)
+    else:
+        variance = []
 
-    # the budget
-    bj = (
-        pg.table("budgets")
-        .select("id,month,amount,categories(name)")
-        .order("categories(name).asc")
-        .limit(20)
-        .execute()
+    return render_template("dashboard.html",
+                           user=session["user"],
+                           txs=txs, bjs=bjs, summary=summary, variance=variance,
+                           income=summary["income"], expense=summary["expense"])
 
-    )
+# ---- paginated tables (JSON) ----
 
-    bjs = bj.data or []
+def page_filters() -> dict:
+    args = request.args
+    return {"cursor": args.get("cursor"), "start": args.get("from") or None,
+            "end": args.get("to") or None, "category": args.get("category") or None}
 
-    return render_template("dashboard.html",
-                           user=session["user"],
-                           txs=txs, bjs=bjs, income=income, expense=expense)
+@dashboard_bp.get("/transactions")
+def list_transactions():
+    """?cursor=&limit=&from=&to=&type=&category= -> {"items": [...], "next": cursor or null}"""
+    if not require_login():
+        return jsonify({"error": "Unauthorized"}), 401
+    pg = get_authed_client()
+    if pg is None:
+        return jsonify({"error": "Session expired"}), 401
+    try:
+        page = transactions_page(pg, limit=page_size(request.args.get("limit"), settings.DASHBOARD_PAGE_SIZE),
+                                 type_=request.args.get("type") or None, **page_filters())
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+@dashboard_bp.get("/budgets")
+def list_budgets():
+    """?cursor=&limit=&from=&to=&category= -> {"items": [...], "next": cursor or null}"""
+    if not require_login():
+        return jsonify({"error": "Unauthorized"}), 401
+    pg = get_authed_client()
+    if pg is None:
+        return jsonify({"error": "Session expired"}), 401
+    try:
+        page = budgets_page(pg, limit=page_size(request.args.get("limit"), settings.DASHBOARD_PAGE_SIZE),
+                            **page_filters())
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+def wants_background() -> bool:
+    # background jobs run on the service role; without it large files import in the request
+    return bool(settings.SUPABASE_SERVICE_KEY) and (request.content_length or 0) > settings.IMPORT_BACKGROUND_BYTES
+
+def job_runner():
+    from services.jobs import get_runner
+    return get_runner()
+
+def enqueue_upload(file, kind: str):
+    job = job_runner().enqueue(session["user"]["id"], kind, file)
+    flash(f"Large file: importing in the background (job {job.id[:8]})", "info")
+    return redirect(url_for("dashboard.dashboard_page"))
 
 @dashboard_bp.post("/upload")
 def upload_csv():
@@ -89,47 +130,20 @@ def upload_csv():
         flash("No file uploaded", "error")
         return redirect(url_for("dashboard.dashboard_page"))
 
-    os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
-    path = os.path.join(settings.UPLOAD_FOLDER, file.filename)
-    file.save(path)
-
-    df = pd.read_csv(path)
-    df = normalize_csv(df)
-    rows = to_transactions(df, session["user"]["id"])
+    pg = get_pg_client_or_redirect()
+    if isinstance(pg, Response):
+        return pg
 
-    if not rows:
-        flash("No valid rows found", "error")
-        return redirect(url_for("dashboard.dashboard_page"))
+    if wants_background():
+        return enqueue_upload(file, "transactions")
 
-    pg = get_pg_client_or_redirect()
-    if not isinstance(pg, type(authed_postgrest(None))):
-        return pg  
-
-    for r in rows:
-        cat = r.pop("category_name", None)
-        cat_id = None
-        if cat:
-            existing = (
-                pg.table("categories")
-                .select("id")
-                .eq("name", cat)
-                .limit(1)
-                .execute()
-            ).data
-            if existing:
-                cat_id = existing[0]["id"]
-            else:
-                created = (
-                    pg.table("categories")
-                    .insert({"user_id": session["user"]["id"], "name": cat, "type": r["type"]},returning="representation")
-                    .execute()
-                ).data
-                cat_id = created[0]["id"] if created else None
-        r["category_id"] = cat_id
-
-    # insert transactions
-    _ = pg.table("transactions").insert(rows).execute()
-    flash(f"Imported {len(rows)} transactions", "success")
+    # stream the upload in chunks instead of saving and loading it whole
+    from services.importer import import_transactions
+    report = import_transactions(file.stream, session["user"]["id"], pg)
+    if report.inserted:
+        invalidate_responses(session["user"]["id"])
+    for category, message in report.messages():
+        flash(message, category)
     return redirect(url_for("dashboard.dashboard_page"))
 
 @dashboard_bp.post("/upload_budget")
@@ -142,62 +156,65 @@ def upload_budget_csv():
         flash("No file uploaded", "error")
         return redirect(url_for("dashboard.dashboard_page"))
 
-    # Save file
-    os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
-    path = os.path.join(settings.UPLOAD_FOLDER, file.filename)
-    file.save(path)
+    pg = get_pg_client_or_redirect()
+    if isinstance(pg, Response):
+        return pg  # session expired
+
+    if wants_background():
+        return enqueue_upload(file, "budgets")
+
+    import pandas as pd
+    from services.importer import import_budgets
 
     # Load CSV
     try:
-        df = pd.read_csv(path)
+        df = pd.read_csv(file.stream)
     except:
         flash("Invalid CSV", "error")
         return redirect(url_for("dashboard.dashboard_page"))
 
-    # ---- Normalization (matching your style) ----
-    df = normalize_budget_csv(df)
-    rows = to_budgets(df, session["user"]["id"])
-
-    if not rows:
+    result = import_budgets(df, session["user"]["id"], pg)
+    if not result.rows_valid:
         flash("No valid budget rows", "error")
         return redirect(url_for("dashboard.dashboard_page"))
+    if result.failed:
+        flash(f"Budget import failed: {'; '.join(result.errors)}", "error")
+        return redirect(url_for("dashboard.dashboard_page"))
 
-    # ---- DB Insert (same flow as transactions) ----
-    pg = get_pg_client_or_redirect()
-    if not isinstance(pg, type(authed_postgrest(None))):
-        return pg  # session expired
-
-    # Resolve categories
-    for r in rows:
-        cat = r.pop("category_name")
-
-        existing = (
-            pg.table("categories")
-            .select("id")
-            .eq("name", cat)
-            .eq("user_id", session["user"]["id"])
-            .limit(1)
-            .execute()
-        ).data
-
-        if existing:
-            cat_id = existing[0]["id"]
-        else:
-            created = (
-                pg.table("categories")
-                .insert({
-                    "user_id": session["user"]["id"],
-                    "name": cat,
-                    "type": "expense",   # all budgets = expenses
-                }, returning="representation")
-                .execute()
-            ).data
-            cat_id = created[0]["id"]
-
-        r["category_id"] = cat_id
-
-    # Insert budgets
-    pg.table("budgets").insert(rows).execute()
-
-    flash(f"Imported {len(rows)} budget entries", "success")
+    invalidate_responses(session["user"]["id"])
+    flash(f"Saved {result.inserted} budget entries", "success")
+    if result.duplicates:
+        flash(f"{result.duplicates} row(s) repeated a month and category; the last one was kept", "info")
     return redirect(url_for("dashboard.dashboard_page"))
+
+# ---- background import jobs ----
+
+@dashboard_bp.get("/imports")
+def list_imports():
+    if not require_login():
+        return jsonify({"error": "Unauthorized"}), 401
+    jobs = job_runner().store.for_user(session["user"]["id"])
+    return jsonify([j.public() for j in jobs])
+
+@dashboard_bp.get("/imports/<job_id>")
+def import_status(job_id):
+    if not require_login():
+        return jsonify({"error": "Unauthorized"}), 401
+    job = job_runner().store.get(job_id)
+    if job is None or job.user_id != session["user"]["id"]:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(job.public())
+
+@dashboard_bp.post("/imports/<job_id>/retry")
+def retry_import(job_id):
+    if not require_login():
+        return jsonify({"error": "Unauthorized"}), 401
+    runner = job_runner()
+    job = runner.store.get(job_id)
+    if job is None or job.user_id != session["user"]["id"]:
+        return jsonify({"error": "Not found"}), 404
+    if get_authed_client() is None:
+        return jsonify({"error": "Session expired"}), 401
+    if not runner.retry(job_id):
+        return jsonify({"error": f"Job is {job.status}, nothing to retry"}), 409
+    return jsonify(runner.store.get(job_id).public()), 202
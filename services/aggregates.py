@@ -0,0 +1,81 @@
+"""
+Income/expense totals computed by the database instead of summing rows
+in Python. Transfer size stays the same however much history a user has.
+"""
+import pandas as pd
+
+
+def _shape(data: dict) -> dict:
+    income = float(data.get("income") or 0)
+    expense = float(data.get("expense") or 0)
+    return {
+        "income": income,
+        "expense": expense,
+        "net": income - expense,
+        "by_category": [
+            {"category": r["category"], "type": r["type"], "total": float(r["total"]), "count": int(r["count"])}
+            for r in data.get("by_category") or []
+        ],
+        "by_month": [
+            {"month": r["month"], "income": float(r["income"]), "expense": float(r["expense"])}
+            for r in data.get("by_month") or []
+        ],
+    }
+
+
+def summarize(pg, start: str | None = None, end: str | None = None) -> dict:
+    """
+    Income, expense, net and per-category/per-month totals over [start, end]
+    (ISO dates, either may be None) via the transaction_summary RPC.
+    """
+    data = pg.rpc("transaction_summary", {"p_from": start, "p_to": end}).execute().data
+    return _shape(data or {})
+
+
+def summarize_sqlite(conn, user_id: str, start: str | None = None, end: str | None = None) -> dict:
+    """Same result as summarize(), against the services.db SQLite stand-in."""
+    where = "t.user_id = ? and (? is null or t.date >= ?) and (? is null or t.date <= ?)"
+    args = (user_id, start, start, end, end)
+    totals = conn.execute(
+        f"""select coalesce(sum(case when type = 'income' then amount end), 0) as income,
+                   coalesce(sum(case when type = 'expense' then amount end), 0) as expense
+            from transactions t where {where}""", args).fetchone()
+    by_category = conn.execute(
+        f"""select c.name as category, t.type, sum(t.amount) as total, count(*) as count
+            from transactions t left join categories c on c.id = t.category_id
+            where {where} group by c.name, t.type order by total desc""", args).fetchall()
+    by_month = conn.execute(
+        f"""select substr(t.date, 1, 7) || '-01' as month,
+                   coalesce(sum(case when type = 'income' then amount end), 0) as income,
+                   coalesce(sum(case when type = 'expense' then amount end), 0) as expense
+            from transactions t where {where} group by 1 order by 1""", args).fetchall()
+    return _shape({
+        "income": totals["income"],
+        "expense": totals["expense"],
+        "by_category": [dict(r) for r in by_category],
+        "by_month": [dict(r) for r in by_month],
+    })
+
+
+def summarize_frame(df) -> dict:
+    """Same result as summarize(), from a transactions frame (date, amount, type, category)."""
+    amount = df["amount"]
+    is_income = df["type"] == "income"
+    by_category = (df.groupby([df["category"], df["type"]], dropna=False, observed=True)["amount"]
+                     .agg(total="sum", count="count")
+                     .reset_index()
+                     .sort_values("total", ascending=False))
+    # group on periods; only the handful of group keys get formatted
+    month = pd.to_datetime(df["date"]).dt.to_period("M")
+    by_month = (pd.DataFrame({"month": month,
+                              "income": amount.where(is_income, 0.0),
+                              "expense": amount.where(~is_income, 0.0)})
+                  .groupby("month").sum().reset_index())
+    by_month["month"] = by_month["month"].dt.strftime("%Y-%m-01")
+    by_category = by_category.astype(object).where(by_category.notna(), None)
+    return _shape({
+        "income": amount[is_income].sum(),
+        "expense": amount[~is_income].sum(),
+        "by_category": by_category.to_dict("records"),
+        "by_month": by_month.to_dict("records"),
+    })
@@ -0,0 +1,248 @@
+"""
+Deterministic answers to the arithmetic questions people ask the chat.
+
+metrics() turns the monthly rollup rows the chat already fetches into
+savings rate, top categories, month-over-month change, budget overruns
+and runway. route() recognises questions that ask for exactly one of
+those about all of the user's money (not one category or merchant) and
+scope() the months the answer may cover; answer() phrases the
+number without a model call. Everything else still goes to Gemini, with
+fact_lines() in the prompt so the model quotes these numbers instead of
+doing the sums itself.
+"""
+import re
+from datetime import date
+
+import pandas as pd
+
+from services.rollups import budget_variance
+
+
+def _money(x: float) -> str:
+    return f"₹{x:,.0f}"
+
+
+def metrics(monthly: list, variance: list | None = None) -> dict:
+    """
+    monthly: rollup rows (month, category, type, total, count, budget);
+    variance: services.budgets.variance() rows, else derived from monthly.
+    """
+    df = pd.DataFrame(monthly, columns=["month", "category", "type", "total", "count", "budget"])
+    df = df[df["count"].fillna(0) > 0]
+    df["total"] = pd.to_numeric(df["total"], errors="coerce").fillna(0.0)
+    df["month"] = df["month"].str[:7]
+    df["category"] = df["category"].fillna("Uncategorized")
+
+    by_month = (df.groupby(["month", "type"])["total"].sum()
+                  .unstack(fill_value=0.0)
+                  .reindex(columns=["income", "expense"], fill_value=0.0)
+                  .sort_index())
+    income = float(by_month["income"].sum())
+    expense = float(by_month["expense"].sum())
+    net = income - expense
+
+    spend = df[df["type"] == "expense"].groupby("category")["total"].sum().sort_values(ascending=False)
+    top = [{"category": c, "total": float(v), "share": float(v / expense) if expense else 0.0}
+           for c, v in spend.head(5).items()]
+
+    mom = None
+    if len(by_month) >= 2:
+        (prev_month, prev), (month, cur) = by_month["expense"].iloc[-2:].items()
+        mom = {"month": month, "previous": prev_month, "expense": float(cur), "previous_expense": float(prev),
+               "change": float((cur - prev) / prev) if prev else None}
+
+    overruns = sorted(
+        ({"month": b["month"][:7], "category": b["category"] or "Uncategorized", "budget": b["budget"],
+          "spent": b["spent"], "over": -b["variance"]}
+         for b in (budget_variance(monthly) if variance is None else variance) if b["variance"] < 0),
+        key=lambda b: b["over"], reverse=True)
+
+    avg_expense = float(by_month["expense"].mean()) if len(by_month) else 0.0
+    return {
+        "months": list(by_month.index),
+        "income": income,
+        "expense": expense,
+        "net": net,
+        "savings_rate": net / income if income else None,
+        "top_categories": top,
+        "month_over_month": mom,
+        "overruns": overruns,
+        "avg_monthly_expense": avg_expense,
+        # how many months of average spending the window's surplus would cover
+        "runway_months": max(net, 0.0) / avg_expense if avg_expense else None,
+    }
+
+
+def _period(m: dict) -> str:
+    months = m["months"]
+    return months[0] if len(months) == 1 else f"{months[0]} to {months[-1]}"
+
+
+def fact_lines(m: dict) -> list:
+    if not m["months"]:
+        return ["no transactions in this period"]
+    lines = [f"period {_period(m)}: income {_money(m['income'])}, expense {_money(m['expense'])}, net {_money(m['net'])}"]
+    if m["savings_rate"] is not None:
+        lines.append(f"savings rate {m['savings_rate']:.1%}")
+    if m["top_categories"]:
+        lines.append("top spending: " + ", ".join(
+            f"{c['category']} {_money(c['total'])} ({c['share']:.0%})" for c in m["top_categories"]))
+    mom = m["month_over_month"]
+    if mom and mom["change"] is not None:
+        lines.append(f"spending {mom['month']} vs {mom['previous']}: {mom['change']:+.1%} "
+                     f"({_money(mom['expense'])} vs {_money(mom['previous_expense'])})")
+    if m["overruns"]:
+        lines.append("over budget: " + ", ".join(
+            f"{o['month']} {o['category']} by {_money(o['over'])}" for o in m["overruns"][:5]))
+    if m["runway_months"] is not None:
+        lines.append(f"average monthly expense {_money(m['avg_monthly_expense'])}; "
+                     f"surplus covers {m['runway_months']:.1f} month(s) of it")
+    return lines
+
+
+# ---- intent routing ----
+
+INTENTS = {
+    "savings_rate": r"savings? rate|how much (do|did|have) i (save|saved)|what (percent|%) .*sav",
+    "top_categories": r"(top|biggest|largest|highest|main) (spending|expense|categor)|where (does|did|is) my money go"
+                      r"|spend(ing)? (the )?most|most (money|spending)",
+    "budget_overruns": r"over ?(my |the )?budgets?|overspen[dt]|budget overrun|exceed(ed)? (my |the )?budget",
+    "month_over_month": r"month[- ]over[- ]month|(than|to|vs\.?|versus) (the )?(last|previous|prior) month",
+    "runway": r"runway|how (long|many months) .*(last|survive|cover)|emergency fund",
+    "totals": r"how much (did|have) i (spend|spent|earn|earned)|total (spending|spend|expenses?|income)",
+}
+_INTENT_PATTERNS = {name: re.compile(p, re.IGNORECASE) for name, p in INTENTS.items()}
+
+# questions asking for judgement rather than a number go to the model
+_OPEN_ENDED = re.compile(r"\b(should|why|how (can|do|could) i|advice|advise|suggest|improve|plan|reduce|"
+                         r"afford|recommend|tips?|help me)\b", re.IGNORECASE)
+
+
+_NAMED_PERIOD = re.compile(r"\b(this|last|previous) (month|year)\b", re.IGNORECASE)
+
+# words that don't narrow a question; anything else left after the intent
+# and period ("food", "swiggy", "september") is a qualifier the rollup
+# totals can't answer for
+_FILLER = frozenset("""
+    a an the i me my we our you your is are was were be been am m s t do does did have has had will would can
+    what whats which how much many so far yet in on at to for of from by with than vs versus and or this that it
+    its all any anywhere overall altogether total totals current currently now right tell show give please
+    go went compare compared change changed spend spent spending expense expenses earn earned income money
+    category categories rate month months year period timeframe last previous prior
+""".split())
+
+
+def _qualifiers(question: str, intent: str) -> list:
+    """Words of the question that neither name the intent or period nor are filler."""
+    rest = _NAMED_PERIOD.sub(" ", _INTENT_PATTERNS[intent].sub(" ", question))
+    return [w for w in re.findall(r"[a-z]+", rest.lower()) if w not in _FILLER]
+
+
+def route(question: str) -> str | None:
+    """The one intent a question asks for, or None to send it to the model."""
+    if _OPEN_ENDED.search(question):
+        return None
+    hits = [name for name, p in _INTENT_PATTERNS.items() if p.search(question)]
+    if len(hits) != 1 or _qualifiers(question, hits[0]):
+        return None
+    return hits[0]
+
+
+def _month(d: date, back: int = 0) -> str:
+    y, m = divmod(d.year * 12 + d.month - 1 - back, 12)
+    return f"{y}-{m + 1:02d}"
+
+
+def named_period(question: str, today: date | None = None) -> tuple | None:
+    """(first, last) month, as YYYY-MM, of a period the question names ("this month", "last year")."""
+    hit = _NAMED_PERIOD.search(question)
+    if not hit:
+        return None
+    today = today or date.today()
+    back = hit.group(1).lower() != "this"
+    if hit.group(2).lower() == "month":
+        month = _month(today, back)
+        return month, month
+    year = today.year - back
+    return f"{year}-01", min(f"{year}-12", _month(today))
+
+
+def scope(question: str, intent: str, since: str, today: date | None = None) -> tuple | None:
+    """
+    (first, last) month, as YYYY-MM, a routed answer covers; None leaves
+    the question to the model. Rollups are whole months fetched from the
+    month of since, so a named period is answered when all of it was
+    fetched; month_over_month compares last month with this one; anything
+    else covers the window's whole months, except totals, which only make
+    sense for a named period.
+    """
+    today = today or date.today()
+    fetched = since[:7]
+    if intent == "month_over_month":
+        first, last = _month(today, 1), _month(today)
+    elif named := named_period(question, today):
+        first, last = named
+    elif intent == "totals":
+        return None
+    else:
+        # a window starting mid-month only has part of its first month
+        first = fetched if since[8:10] == "01" else _month(date.fromisoformat(since[:10]), -1)
+        last = _month(today)
+    if first < fetched or first > last:
+        return None
+    return first, last
+
+
+def within(rows: list, months: tuple) -> list:
+    """Rollup or budget-variance rows whose month is in [first, last]."""
+    first, last = months
+    return [r for r in rows if first <= r["month"][:7] <= last]
+
+
+def answer(intent: str, m: dict) -> str:
+    """Plain-text reply for a routed question."""
+    if not m["months"]:
+        return ("There are no transactions in this period. Upload a statement from the dashboard, "
+                "or pick a longer timeframe.")
+    period = _period(m)
+
+    if intent == "savings_rate":
+        if m["savings_rate"] is None:
+            return f"No income recorded for {period}, so there is no savings rate. You spent {_money(m['expense'])}."
+        return (f"Savings rate for {period}: {m['savings_rate']:.1%}.\n"
+                f"Income {_money(m['income'])}, expenses {_money(m['expense'])}, saved {_money(m['net'])}.")
+
+    if intent == "top_categories":
+        if not m["top_categories"]:
+            return f"No expenses recorded for {period}."
+        lines = [f"{i}. {c['category']}: {_money(c['total'])} ({c['share']:.0%})"
+                 for i, c in enumerate(m["top_categories"], 1)]
+        return f"Top spending categories for {period}:\n" + "\n".join(lines)
+
+    if intent == "budget_overruns":
+        if not m["overruns"]:
+            return f"No category went over its budget in {period}."
+        lines = [f"{o['month']} {o['category']}: spent {_money(o['spent'])} of {_money(o['budget'])}, "
+                 f"over by {_money(o['over'])}" for o in m["overruns"]]
+        return f"Over budget in {period}:\n" + "\n".join(lines)
+
+    if intent == "month_over_month":
+        mom = m["month_over_month"]
+        if mom is None:
+            return f"Only {period} has data; pick a longer timeframe to compare months."
+        if mom["change"] is None:
+            return f"Spending in {mom['month']} was {_money(mom['expense'])}; nothing was spent in {mom['previous']}."
+        direction = "up" if mom["change"] > 0 else "down"
+        return (f"Spending in {mom['month']} was {_money(mom['expense'])}, {direction} "
+                f"{abs(mom['change']):.1%} from {_money(mom['previous_expense'])} in {mom['previous']}.")
+
+    if intent == "runway":
+        if m["runway_months"] is None:
+            return f"No expenses recorded for {period}, so there is nothing to measure runway against."
+        return (f"You saved {_money(max(m['net'], 0.0))} over {period}. At your average spending of "
+                f"{_money(m['avg_monthly_expense'])} a month, that covers {m['runway_months']:.1f} month(s).\n"
+                f"This counts only the surplus in this period, not balances held elsewhere.")
+
+    # totals
+    return (f"For {period}: income {_money(m['income'])}, expenses {_money(m['expense'])}, "
+            f"net {_money(m['net'])}.")
@@ -0,0 +1,115 @@
+"""
+Session/auth layer shared by the blueprints.
+
+Token expiry is read from the JWT's exp claim locally, so a request
+never spends a round trip finding out the token is stale. Tokens are
+refreshed AUTH_REFRESH_SKEW seconds ahead of expiry, one refresh per
+session at a time, and the authed PostgREST client is cached per token.
+"""
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import session
+
+from config import settings
+from services.instrumentation import traced
+from services.supabase_client import authed_postgrest, get_supabase
+
+# how long a finished refresh is remembered for requests that raced it
+_REFRESH_GRACE = 60
+
+_guard = threading.Lock()
+_refresh_locks: dict[str, threading.Lock] = {}
+_refreshed: dict[str, tuple[float, str, str]] = {}  # old refresh token -> (at, access, refresh)
+
+_clients: OrderedDict = OrderedDict()  # access token -> client
+_clients_lock = threading.Lock()
+
+
+def token_expiry(token: str) -> float | None:
+    """exp claim of a JWT, without verifying it (the server does that)."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except Exception:
+        return None
+
+
+def needs_refresh(token: str, now: float | None = None) -> bool:
+    exp = token_expiry(token)
+    if exp is None:
+        return True
+    return exp - (now or time.time()) <= settings.AUTH_REFRESH_SKEW
+
+
+def supabase_issuer(refresh_token: str) -> tuple[str, str]:
+    res = get_supabase().auth.refresh_session(refresh_token)
+    return res.session.access_token, res.session.refresh_token
+
+
+def refresh_tokens(refresh_token: str, issuer=supabase_issuer) -> tuple[str, str]:
+    """
+    Exchanges a refresh token for a new (access, refresh) pair.
+    Refresh tokens are single use, so concurrent requests from the same
+    session wait for the first refresh and reuse its result.
+    """
+    with _guard:
+        lock = _refresh_locks.setdefault(refresh_token, threading.Lock())
+    with lock:
+        done = _refreshed.get(refresh_token)
+        if done is None:
+            access, new_refresh = issuer(refresh_token)
+            done = (time.time(), access, new_refresh)
+            with _guard:
+                _prune(done[0])
+                _refreshed[refresh_token] = done
+        return done[1], done[2]
+
+
+def _prune(now: float):
+    for key, (at, _, _) in list(_refreshed.items()):
+        if now - at > _REFRESH_GRACE:
+            _refreshed.pop(key, None)
+            _refresh_locks.pop(key, None)
+
+
+def client_for_token(token: str):
+    with _clients_lock:
+        pg = _clients.get(token)
+        if pg is not None:
+            _clients.move_to_end(token)
+            return pg
+    pg = authed_postgrest(token)
+    with _clients_lock:
+        # keep whichever client won a concurrent miss
+        pg = _clients.setdefault(token, pg)
+        while len(_clients) > settings.AUTHED_CLIENT_CACHE_SIZE:
+            _clients.popitem(last=False)
+    return pg
+
+
+@traced("auth")
+def get_authed_client(issuer=supabase_issuer):
+    """
+    PostgREST client for the logged-in user, refreshing the session's
+    tokens first when they are about to expire. None when the session
+    can't be refreshed and the user has to log in again.
+    """
+    token = session.get("access_token")
+    refresh_token = session.get("refresh_token")
+    if not token:
+        return None
+    if needs_refresh(token):
+        if not refresh_token:
+            return None
+        try:
+            token, refresh_token = refresh_tokens(refresh_token, issuer)
+        except Exception:
+            return None
+        session["access_token"] = token
+        session["refresh_token"] = refresh_token
+    return client_for_token(token)
@@ -0,0 +1,69 @@
+"""
+Budgets: one row per (user, month, category), written by a single upsert
+per import, and the budget-vs-actual report computed by the database.
+
+sql/006_budget_upsert.sql adds the unique (user_id, month, category_id)
+index the upsert conflicts on. Its (user_id, month) prefix makes "budgets
+for month M" an index range; the budget_variance RPC joins those rows to
+the month's expense totals in monthly_rollups, so callers get one row per
+budget instead of raw budgets plus transactions.
+"""
+CONFLICT_KEY = "user_id,month,category_id"
+
+
+def latest_per_key(rows: list) -> tuple[list, int]:
+    """
+    Last row wins for each (month, category) in one file; a single upsert
+    can't touch the same row twice. Returns (rows, how many were dropped).
+    """
+    latest = {(r["month"], r["category_name"]): r for r in rows}
+    return list(latest.values()), len(rows) - len(latest)
+
+
+def upsert(pg, rows: list) -> list:
+    """rows carry user_id, month, category_id and amount; re-imported months are replaced."""
+    return (pg.table("budgets")
+              .upsert(rows, on_conflict=CONFLICT_KEY)
+              .execute()).data or []
+
+
+def _month(value: str | None) -> str | None:
+    return value[:7] + "-01" if value else None
+
+
+def variance_query(pg, start: str | None = None, end: str | None = None):
+    """Unexecuted RPC over the months of [start, end] (ISO dates, either may be None); sync or async client."""
+    return pg.rpc("budget_variance", {"p_from": _month(start), "p_to": _month(end)})
+
+
+def shape(rows: list) -> list:
+    return [
+        {"month": r["month"], "category_id": r["category_id"], "category": r["category"],
+         "budget": float(r["budget"]), "spent": float(r["spent"] or 0), "variance": float(r["variance"])}
+        for r in rows
+    ]
+
+
+def variance(pg, start: str | None = None, end: str | None = None) -> list:
+    """
+    Budget vs actual per month and category, latest month first:
+    [{month, category_id, category, budget, spent, variance}], variance
+    being budget - spent (negative when over budget).
+    """
+    return shape(variance_query(pg, start, end).execute().data or [])
+
+
+def variance_sqlite(conn, user_id: str, start: str | None = None, end: str | None = None) -> list:
+    """Same result as variance(), against the services.db SQLite stand-in."""
+    start, end = _month(start), _month(end)
+    rows = conn.execute(
+        """select b.month, b.category_id, c.name as category, b.amount as budget,
+                  coalesce(r.total, 0) as spent, b.amount - coalesce(r.total, 0) as variance
+           from budgets b
+           left join categories c on c.id = b.category_id
+           left join monthly_rollups r
+             on r.user_id = b.user_id and r.month = b.month and r.type = 'expense'
+            and r.category_id is b.category_id
+           where b.user_id = ? and (? is null or b.month >= ?) and (? is null or b.month <= ?)
+           order by b.month desc, c.name""", (user_id, start, start, end, end)).fetchall()
+    return shape([dict(r) for r in rows])
@@ -0,0 +1,217 @@
+"""
+Local auto-categorization for rows imported without a category.
+
+Descriptions are reduced to letter-only keys ("UPI/DR/4123/SWIGGY/ybl" ->
+"upi dr swiggy ybl") and each distinct key is classified once:
+
+1. the user's history: a key they have categorized before, then a vote
+   of the key's tokens weighted by how consistently the user categorized
+   them;
+2. built-in keyword rules, compiled into a single regex.
+
+Statements repeat the same merchants, so a file with 100k rows usually
+has a few thousand distinct keys.
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from config import settings
+from services import columnar_cache
+from services.instrumentation import traced
+
+RULES = {
+    "Food": ("swiggy", "zomato", "restaurant", "cafe", "lunch", "dinner", "breakfast", "dominos", "pizza",
+             "mcdonald", "kfc", "starbucks", "burger", "eatsure", "chaayos", "haldiram"),
+    "Groceries": ("bigbasket", "blinkit", "zepto", "dmart", "grocery", "grofers", "jiomart", "supermarket",
+                  "more retail", "reliance fresh", "nature basket"),
+    "Transport": ("uber", "ola", "rapido", "metro", "irctc", "railway", "redbus", "petrol", "fuel", "hpcl",
+                  "bpcl", "indian oil", "fastag", "parking", "indigo", "air india", "vistara"),
+    "Shopping": ("amazon", "flipkart", "myntra", "ajio", "nykaa", "meesho", "tata cliq", "decathlon", "ikea"),
+    "Utilities": ("electricity", "bescom", "tneb", "msedcl", "broadband", "airtel", "jio", "vodafone", "bsnl",
+                  "water bill", "gas bill", "indane", "bharat gas", "recharge", "dth", "tata play"),
+    "Entertainment": ("netflix", "spotify", "hotstar", "prime video", "bookmyshow", "pvr", "inox",
+                      "youtube premium", "sonyliv", "zee"),
+    "Health": ("pharmacy", "apollo", "hospital", "clinic", "medplus", "netmeds", "pharmeasy", "tata mg", "diagnostic",
+               "dental", "practo"),
+    "Rent": ("rent", "nobroker", "landlord"),
+    "Education": ("school", "college", "tuition", "udemy", "coursera", "byju", "unacademy"),
+    "Insurance": ("insurance", "lic", "policybazaar", "premium"),
+    "Investment": ("mutual fund", "zerodha", "groww", "upstox", "sip", "dividend", "nps", "ppf"),
+    "Salary": ("salary", "payroll", "sal cr"),
+}
+
+# tokens every bank puts in descriptions; they say nothing about the category
+STOP_TOKENS = {"upi", "neft", "imps", "rtgs", "pos", "ach", "nach", "dr", "cr", "to", "from", "by", "for",
+               "ref", "txn", "payment", "transfer", "bank", "ltd", "pvt", "india", "the", "and", "paytm",
+               "ybl", "okaxis", "oksbi", "okhdfcbank", "okicici", "axl", "ibl", "debit", "credit", "card"}
+
+MIN_TOKEN_SUPPORT = 2  # times a token must have been categorized before it votes
+MIN_TOKEN_PURITY = 0.8  # share of its uses going to one category
+MIN_VOTE_SHARE = 0.6
+
+
+def compile_rules(rules: dict):
+    """
+    One regex with a capture group per category; longest keywords first
+    within a group. Keywords match whole words (plural allowed), so "ola"
+    doesn't catch every merchant whose name starts with it.
+    """
+    groups = "|".join(
+        "(" + "|".join(re.escape(k) for k in sorted(words, key=len, reverse=True)) + ")"
+        for words in rules.values())
+    return re.compile(rf"\b(?:{groups})s?\b"), list(rules)
+
+
+RULE_PATTERN, RULE_CATEGORIES = compile_rules(RULES)
+
+
+def description_keys(s: pd.Series) -> pd.Series:
+    """Lowercase letters only, single spaces; None/empty -> ""."""
+    return (s.fillna("").astype(str).str.lower()
+             .str.replace(r"[^a-z]+", " ", regex=True)
+             .str.strip())
+
+
+def tokens(key: str) -> list:
+    return [t for t in key.split() if len(t) > 2 and t not in STOP_TOKENS]
+
+
+def rule_category(key: str):
+    m = RULE_PATTERN.search(key)
+    return RULE_CATEGORIES[m.lastindex - 1] if m else None
+
+
+class HistoryModel:
+    """What one user's categorized transactions say about their descriptions."""
+
+    def __init__(self):
+        self.exact: dict[str, Counter] = defaultdict(Counter)  # key -> category counts
+        self.token_counts: dict[str, Counter] = defaultdict(Counter)
+        self.categories: set = set()
+        self._lock = threading.Lock()
+
+    def learn(self, descriptions, categories):
+        keys = description_keys(pd.Series(list(descriptions), dtype=object))
+        with self._lock:
+            for key, category in zip(keys, categories):
+                if not key or not category:
+                    continue
+                self.categories.add(category)
+                self.exact[key][category] += 1
+                for t in set(tokens(key)):
+                    self.token_counts[t][category] += 1
+
+    def canonical(self) -> dict:
+        """Lowercased category -> the user's spelling of it."""
+        with self._lock:
+            return {c.lower(): c for c in self.categories}
+
+    def predict(self, key: str):
+        with self._lock:
+            return self._predict(key)
+
+    def _predict(self, key: str):
+        seen = self.exact.get(key)
+        if seen:
+            return seen.most_common(1)[0][0]
+        votes = Counter()
+        for t in tokens(key):
+            counts = self.token_counts.get(t)
+            if not counts:
+                continue
+            total = sum(counts.values())
+            category, n = counts.most_common(1)[0]
+            if total >= MIN_TOKEN_SUPPORT and n / total >= MIN_TOKEN_PURITY:
+                votes[category] += (n / total) * math.log1p(total)
+        if votes:
+            category, score = votes.most_common(1)[0]
+            if score / sum(votes.values()) >= MIN_VOTE_SHARE:
+                return category
+        return None
+
+
+def categorize(descriptions, model: HistoryModel | None = None) -> list:
+    """Category (or None) per description; each distinct key is classified once."""
+    keys = description_keys(pd.Series(list(descriptions), dtype=object))
+    codes, uniques = pd.factorize(keys)
+    canonical = model.canonical() if model else {}
+
+    labels = []
+    for key in uniques:
+        category = model.predict(key) if model else None
+        if category is None and key:
+            category = rule_category(key)
+            # prefer the spelling the user already has ("food" over "Food")
+            category = canonical.get(category.lower(), category) if category else None
+        labels.append(category)
+    return np.array(labels + [None], dtype=object)[codes].tolist()  # code -1 -> None
+
+
+# ---- per-user models ----
+
+_models: dict[str, tuple[float, HistoryModel]] = {}
+_models_lock = threading.Lock()
+
+
+def history(pg, user_id: str) -> tuple:
+    """(descriptions, categories) of the user's categorized transactions."""
+    local = columnar_cache.frame(pg, user_id, ["description", "category"])
+    if local is not None:
+        local = local[local["category"].notna()].tail(settings.CATEGORIZER_HISTORY_ROWS)
+        return local["description"].tolist(), local["category"].tolist()
+    rows = (pg.table("transactions")
+              .select("description,categories(name)")
+              .eq("user_id", user_id)
+              .not_.is_("category_id", "null")
+              .order("id.desc")
+              .limit(settings.CATEGORIZER_HISTORY_ROWS)
+              .execute()).data or []
+    return [r["description"] for r in rows], [(r.get("categories") or {}).get("name") for r in rows]
+
+
+def model_for(pg, user_id: str) -> HistoryModel:
+    with _models_lock:
+        entry = _models.get(user_id)
+    if entry and time.time() - entry[0] < settings.CATEGORY_CACHE_TTL:
+        return entry[1]
+    model = HistoryModel()
+    model.learn(*history(pg, user_id))
+    with _models_lock:
+        _models[user_id] = (time.time(), model)
+    return model
+
+
+@traced("categorize")
+def fill_categories(pg, rows: list, user_id: str) -> int:
+    """
+    Sets category_name on rows that have none; returns how many were filled.
+    The model is only read here; learn() feeds it the rows that went in.
+    """
+    todo = [r for r in rows if r["category_name"] is None]
+    if not todo:
+        return 0
+    model = model_for(pg, user_id)
+    filled = 0
+    for r, category in zip(todo, categorize((r["description"] for r in todo), model)):
+        if category:
+            r["category_name"] = category
+            filled += 1
+    return filled
+
+
+def learn(user_id: str, rows: list):
+    """
+    Adds inserted rows that came with a category to the user's cached model,
+    if there is one (an uncached model reads them from history when built).
+    rows carry "description" and "category".
+    """
+    with _models_lock:
+        entry = _models.get(user_id)
+    if entry and rows:
+        entry[1].learn((r["description"] for r in rows), (r["category"] for r in rows))
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from config import settings
+from services.instrumentation import traced
+
+# user_id -> (fetched_at, {name: id})
+_cache: dict[str, tuple[float, dict]] = {}
+_lock = threading.Lock()
+
+
+def _cached(user_id: str):
+    with _lock:
+        entry = _cache.get(user_id)
+    if entry and time.time() - entry[0] < settings.CATEGORY_CACHE_TTL:
+        return entry[1]
+    return None
+
+
+def _store(user_id: str, mapping: dict):
+    with _lock:
+        _cache[user_id] = (time.time(), mapping)
+
+
+def invalidate(user_id: str | None = None):
+    """Drops the cached name->id map for one user, or for everyone."""
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(user_id, None)
+
+
+def prefetch(pg, user_id: str) -> dict:
+    """All of the user's categories in one query."""
+    rows = (
+        pg.table("categories")
+        .select("id,name")
+        .eq("user_id", user_id)
+        .execute()
+    ).data or []
+    return {r["name"]: r["id"] for r in rows}
+
+
+@traced("categories")
+def resolve_categories(pg, user_id: str, wanted: dict) -> dict:
+    """
+    Maps category names to ids, creating the missing ones.
+    wanted is {name: type} for every distinct name in the batch; the type
+    is only used for categories that have to be created.
+    Costs at most two round trips (prefetch + upsert) however many names
+    are asked for, and none when the cache already knows them all.
+    """
+    known = _cached(user_id)
+    if known is None or any(name not in known for name in wanted):
+        known = prefetch(pg, user_id)
+
+    missing = [name for name in wanted if name not in known]
+    if missing:
+        created = (
+            pg.table("categories")
+            .upsert([{"user_id": user_id, "name": name, "type": wanted[name]} for name in missing],
+                    on_conflict="user_id,name", ignore_duplicates=True, returning="representation")
+            .execute()
+        ).data or []
+        known = {**known, **{r["name"]: r["id"] for r in created}}
+        if len(created) < len(missing):
+            # another request created some of them first
+            known = {**known, **prefetch(pg, user_id)}
+
+    _store(user_id, known)
+    return {name: known.get(name) for name in wanted}
@@ -0,0 +1,200 @@
+"""
+Compact prompt context for /chat/ask.
+
+Raw rows are rendered as CSV-style tables (keys once, not per row) next
+to pre-computed summaries, and the transaction table is trimmed to fit a
+token budget; older periods are then covered by the monthly totals only.
+When the question names something the search index (services/search_index.py)
+finds, the best-matching rows and per-word totals over every match take
+the place of most of the latest rows.
+"""
+import logging
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from config import settings
+
+log = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # rough average for English/number-heavy text
+TX_COLUMNS = ["date", "amount", "type", "category", "description"]
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+@dataclass
+class ChatContext:
+    text: str
+    tokens: int
+    tx_included: int
+    tx_total: int
+    sections: dict = field(default_factory=dict)  # section name -> tokens
+    matched: int = 0  # best-matching transactions included
+
+
+def tx_frame(tx) -> pd.DataFrame:
+    """
+    Transactions as returned by PostgREST (with nested categories) -> flat frame.
+    A frame from the columnar cache is already flat.
+    """
+    if isinstance(tx, pd.DataFrame):
+        return tx[TX_COLUMNS]
+    df = pd.DataFrame(tx, columns=["date", "amount", "type", "description", "categories"])
+    df["category"] = df["categories"].map(lambda c: c.get("name") if isinstance(c, dict) else None)
+    df["amount"] = pd.to_numeric(df["amount"], errors="coerce")
+    return df[TX_COLUMNS]
+
+
+def _fmt(x) -> str:
+    if x is None or (isinstance(x, float) and pd.isna(x)):
+        return ""
+    if isinstance(x, float):
+        return f"{x:.0f}" if x == int(x) else f"{x:.2f}"
+    return str(x).replace(",", " ").replace("\n", " ")
+
+
+def csv_table(rows, columns: list) -> str:
+    lines = [",".join(columns)]
+    lines += [",".join(_fmt(v) for v in row) for row in rows]
+    return "\n".join(lines)
+
+
+def summary_lines(df: pd.DataFrame) -> list:
+    if df.empty:
+        return ["no transactions in this period"]
+    income = df.loc[df["type"] == "income", "amount"].sum()
+    expense = df.loc[df["type"] == "expense", "amount"].sum()
+    lines = [f"income {_fmt(float(income))}, expense {_fmt(float(expense))}, net {_fmt(float(income - expense))}"]
+    if income > 0:
+        lines.append(f"savings rate {(income - expense) / income:.1%}")
+
+    spend = df[df["type"] == "expense"]
+    if not spend.empty and expense > 0:
+        shares = spend.groupby(spend["category"].fillna("Uncategorized"))["amount"].sum().sort_values(ascending=False)
+        lines.append("expense share: " + ", ".join(f"{c} {v / expense:.0%}" for c, v in shares.head(8).items()))
+
+        # unusually large expenses relative to their category
+        stats = spend.groupby(spend["category"].fillna("Uncategorized"))["amount"].transform
+        z = (spend["amount"] - stats("mean")) / stats("std").replace(0, float("nan"))
+        outliers = spend[z.fillna(0) > 2].nlargest(5, "amount")
+        if not outliers.empty:
+            lines.append("outliers: " + "; ".join(
+                f"{r.date} {r.category or 'Uncategorized'} {_fmt(float(r.amount))}" for r in outliers.itertuples()))
+    return lines
+
+
+def budget_lines(budgets: list) -> list:
+    return [f"{b['month'][:7]} {b['category']}: budget {_fmt(b['budget'])}, spent {_fmt(b['spent'])}, "
+            f"{'over' if b['variance'] < 0 else 'left'} {_fmt(abs(b['variance']))}"
+            for b in budgets]
+
+
+def match_lines(terms: list) -> list:
+    return [f"{t['term']}: {t['count']} transactions {t['first']}..{t['last']}, "
+            f"expense {_fmt(t['expense'])}, income {_fmt(t['income'])}"
+            for t in terms]
+
+
+def rows_within(rows, max_tokens: int) -> tuple:
+    """CSV lines for row tuples, in order, until max_tokens runs out -> (lines, tokens used)."""
+    kept, used = [], 0
+    for row in rows:
+        line = ",".join(_fmt(v) for v in row)
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return kept, used
+
+
+def monthly_table(monthly: list, max_tokens: int) -> str:
+    """
+    Month x category totals, newest month first. Months that don't fit in
+    max_tokens are collapsed to one income/expense line each.
+    """
+    columns = ["month", "category", "type", "total", "count"]
+    by_month, totals = {}, {}
+    for m in monthly:
+        if not m["count"]:
+            continue
+        row = (m["month"][:7], m["category"], m["type"], float(m["total"]), m["count"])
+        by_month.setdefault(row[0], []).append(",".join(_fmt(v) for v in row))
+        totals.setdefault(row[0], {"income": 0.0, "expense": 0.0})[row[2]] += row[3]
+
+    lines = [line for month_lines in by_month.values() for line in month_lines]
+    if estimate_tokens("\n".join(lines)) <= max_tokens:
+        return "\n".join([",".join(columns)] + lines)
+
+    # detail for the newest months that fit, totals for the rest
+    detailed, used, n_months = [], 0, 0
+    for month_lines in by_month.values():
+        cost = estimate_tokens("\n".join(month_lines)) + 1
+        if used + cost > max_tokens // 2:
+            break
+        detailed.extend(month_lines)
+        used += cost
+        n_months += 1
+    older = list(totals.items())[n_months:]
+    return "\n".join(
+        [",".join(columns)] + detailed
+        + ["older months (totals only):", "month,income,expense"]
+        + [f"{month},{_fmt(t['income'])},{_fmt(t['expense'])}" for month, t in older])
+
+
+def build_context(tx: list, monthly: list, budgets: list, token_budget: int | None = None,
+                  facts: list | None = None, matches=None) -> ChatContext:
+    """
+    tx: transactions newest first (list or frame); monthly: rollup rows; budgets: budget
+    variance rows; facts: pre-computed metric lines (services.analytics); matches: a
+    services.search_index.Matches for the question. Summaries are always kept; matching
+    rows, best first, and then the latest rows are added until the token budget runs out.
+    """
+    token_budget = token_budget or settings.CHAT_CONTEXT_TOKEN_BUDGET
+    df = tx_frame(tx)
+
+    sections = {}
+    if facts:
+        sections["METRICS (exact, over the whole period)"] = "\n".join(facts)
+    sections |= {
+        "SUMMARY": "\n".join(summary_lines(df)),
+        "MONTHLY TOTALS": monthly_table(monthly, token_budget // 3),
+        "BUDGET VS ACTUAL": "\n".join(budget_lines(budgets)) or "no budgets",
+    }
+    if matches:
+        sections["MATCHES (every transaction in the period containing each word of the question)"] = \
+            "\n".join(match_lines(matches.terms))
+    fixed = "\n\n".join(f"{k}:\n{v}" for k, v in sections.items())
+    header = ",".join(TX_COLUMNS)
+    remaining = token_budget - estimate_tokens(fixed)
+
+    matched = []
+    if matches:
+        matched, used = rows_within(([r[c] for c in TX_COLUMNS] for r in matches.rows),
+                                    remaining - estimate_tokens(header) - 1)
+        remaining -= used + estimate_tokens(header) + 1
+        sections[f"BEST-MATCHING TRANSACTIONS ({len(matched)} of {matches.total})"] = "\n".join([header] + matched)
+
+    tx_total = len(df)
+    recent = df.head(settings.CHAT_RECENT_WITH_MATCHES) if matches else df
+    kept, _ = rows_within(recent.itertuples(index=False), remaining - estimate_tokens(header) - 1)
+    tx_title = "TRANSACTIONS"
+    if len(kept) < tx_total:
+        tx_title += f" (latest {len(kept)} of {tx_total}; older ones are in MONTHLY TOTALS)"
+    sections[tx_title] = "\n".join([header] + kept)
+
+    text = "\n\n".join(f"{k}:\n{v}" for k, v in sections.items())
+    ctx = ChatContext(
+        text=text,
+        tokens=estimate_tokens(text),
+        tx_included=len(kept),
+        tx_total=tx_total,
+        sections={k: estimate_tokens(v) for k, v in sections.items()},
+        matched=len(matched),
+    )
+    log.info("chat context: %d tokens (budget %d), %d/%d transactions, %d matched",
+             ctx.tokens, token_budget, ctx.tx_included, ctx.tx_total, ctx.matched)
+    return ctx
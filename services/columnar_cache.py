@@ -0,0 +1,393 @@
+"""
+Per-user columnar copy of the transactions table, on local disk.
+
+Each user gets a directory of Arrow IPC segment files (uncompressed, so
+they can be memory-mapped and read without copying). Imports append the
+rows they inserted as a new segment; readers top the cache up with rows
+newer than the highest id they hold at most every COLUMNAR_SYNC_INTERVAL
+seconds. Segments are merged when they pile up, and whole users are
+evicted least recently used first when the cache outgrows
+COLUMNAR_CACHE_MAX_MB.
+
+A user's full history is loaded on a background thread: until it is in,
+frame() returns None and callers use PostgREST, so no request pays for
+it. The id-based top-up can't see rows edited or deleted elsewhere, or
+ids committed out of order, so every COLUMNAR_RECONCILE_INTERVAL seconds
+the cache's count and total per month, category and type are checked
+against monthly_rollups, also in the background, and a cache that
+disagrees is reloaded.
+
+pyarrow is optional: without it enabled() is False and callers fall back
+to PostgREST.
+"""
+import fcntl
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from config import settings
+from services import rollups
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+except ImportError:  # optional dependency
+    pa = None
+
+log = logging.getLogger(__name__)
+
+COLUMNS = ["id", "date", "amount", "type", "category", "description"]
+SYNC_SELECT = "id,date,amount,type,description,categories(name)"
+PAGE = 1000  # PostgREST's default max rows per response
+
+_synced: dict[str, float] = {}  # user id -> last sync time in this process
+_synced_lock = threading.Lock()
+_reconciled: dict[str, float] = {}  # user id -> last reconcile (or full load) in this process
+
+
+
+def enabled() -> bool:
+    return pa is not None and settings.COLUMNAR_CACHE
+
+
+def schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("date", pa.date32()),
+        ("amount", pa.float64()),
+        ("type", pa.string()),
+        ("category", pa.string()),
+        ("description", pa.string()),
+    ])
+
+
+def user_dir(user_id: str) -> str:
+    return os.path.join(settings.COLUMNAR_CACHE_DIR, re.sub(r"[^\w-]", "_", user_id))
+
+
+def segments(user_id: str) -> list:
+    d = user_dir(user_id)
+    try:
+        return sorted(os.path.join(d, f) for f in os.listdir(d) if f.endswith(".arrow"))
+    except FileNotFoundError:
+        return []
+
+
+@contextmanager
+def file_lock(d: str, blocking: bool = True):
+    """Exclusive lock on directory d across processes; yields False if it was busy and blocking is off."""
+    os.makedirs(d, exist_ok=True)
+    with open(os.path.join(d, ".lock"), "w") as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def locked(user_id: str, blocking: bool = True):
+    """Exclusive per-user lock across processes, for anything that writes segments."""
+    return file_lock(user_dir(user_id), blocking)
+
+
+def to_table(rows: list):
+    """Rows as dicts with COLUMNS (date as ISO string) -> Arrow table."""
+    cols = {c: [r.get(c) for r in rows] for c in COLUMNS}
+    return pa.table({
+        "id": pa.array(cols["id"], pa.int64()),
+        "date": pa.array(cols["date"], pa.string()).cast(pa.date32()),
+        "amount": pa.array([None if a is None else float(a) for a in cols["amount"]], pa.float64()),
+        "type": pa.array(cols["type"], pa.string()),
+        "category": pa.array(cols["category"], pa.string()),
+        "description": pa.array(cols["description"], pa.string()),
+    }, schema=schema())
+
+
+def _write_segment(user_id: str, table):
+    d = user_dir(user_id)
+    path = os.path.join(d, f"{time.time_ns():020d}.arrow")
+    tmp = path + ".tmp"
+    with ipc.new_file(tmp, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)  # readers never see a half-written segment
+
+
+def _read(paths: list):
+    # memory-mapped: nothing is copied until a column is converted
+    tables = [ipc.open_file(pa.memory_map(p)).read_all() for p in paths]
+    if not tables:
+        return None
+    table = pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+    if len(tables) > 1:
+        # an import's append and a sync can both carry the same rows
+        ids = table.column("id").to_numpy()
+        _, first = np.unique(ids[::-1], return_index=True)
+        if len(first) < len(ids):
+            table = table.take(np.sort(len(ids) - 1 - first))
+    return table
+
+
+def load(user_id: str, columns: list | None = None):
+    """The user's cached table (or None), zero-copy where possible."""
+    for _ in range(2):
+        try:
+            table = _read(segments(user_id))
+            break
+        except FileNotFoundError:
+            continue  # a compaction replaced the segments under us
+    else:
+        return None
+    if table is None:
+        return None
+    try:
+        os.utime(user_dir(user_id))  # recency for eviction
+    except OSError:
+        pass
+    return table.select(columns) if columns else table
+
+
+def _compact(user_id: str):
+    paths = segments(user_id)
+    if len(paths) <= settings.COLUMNAR_MAX_SEGMENTS:
+        return
+    _write_segment(user_id, _read(paths).combine_chunks())
+    for p in paths:
+        os.remove(p)
+
+
+def append(user_id: str, rows: list):
+    """
+    Adds freshly imported rows. Skipped when the user has no cache yet:
+    its full load includes these rows.
+    """
+    if not enabled() or not rows or not segments(user_id):
+        return
+    with locked(user_id):
+        _write_segment(user_id, to_table(rows))
+        _compact(user_id)
+    evict()
+
+
+def fetch_new(pg, user_id: str, after_id: int | None) -> list:
+    """The user's rows with id > after_id, by keyset pages, flattened to COLUMNS."""
+    rows = []
+    while True:
+        q = pg.table("transactions").select(SYNC_SELECT).eq("user_id", user_id).order("id").limit(PAGE)
+        if after_id is not None:
+            q = q.gt("id", after_id)
+        page = q.execute().data or []
+        for r in page:
+            r["category"] = (r.pop("categories", None) or {}).get("name")
+        rows.extend(page)
+        if len(page) < PAGE:
+            return rows
+        after_id = page[-1]["id"]
+
+
+def rebuild(pg, user_id: str):
+    """Loads the user's full history and swaps it in for whatever the cache held."""
+    rows = fetch_new(pg, user_id, None)
+    with locked(user_id):
+        old = segments(user_id)
+        _write_segment(user_id, to_table(rows))  # an empty history still counts as loaded
+        for p in old:
+            os.remove(p)
+    now = time.time()
+    with _synced_lock:
+        _synced[user_id] = _reconciled[user_id] = now
+    log.info("columnar cache: loaded %d row(s) for %s", len(rows), user_id)
+    evict()
+
+
+def rollup_totals(pg, user_id: str) -> dict:
+    """{(month, category, type): (count, total)} of the user's transactions, from monthly_rollups."""
+    rows = rollups.flatten_rollups(rollups.rollups_query(pg).eq("user_id", user_id).execute().data or [])
+    return {(r["month"], r["category"], r["type"]): (int(r["count"]), float(r["total"] or 0))
+            for r in rows if r["count"]}
+
+
+def _cached_totals(user_id: str) -> dict:
+    """rollup_totals() as the cache sees them."""
+    table = load(user_id, ["date", "amount", "type", "category"])
+    if table is None or not table.num_rows:
+        return {}
+    df = table.to_pandas()
+    df["month"] = df["date"].astype(str).str[:7] + "-01"
+    g = df.groupby(["month", "category", "type"], dropna=False)["amount"].agg(["count", "sum"])
+    return {(m, None if pd.isna(c) else c, t): (int(n), float(total)) for (m, c, t), (n, total) in g.iterrows()}
+
+
+def agree(cached: dict, expected: dict) -> bool:
+    """Whether {(month, category, type): (count, total)} maps match, to the cent."""
+    return cached.keys() == expected.keys() and all(
+        cached[k][0] == n and abs(cached[k][1] - total) < 0.005 for k, (n, total) in expected.items())
+
+
+def reconcile(pg, user_id: str) -> bool:
+    """
+    Checks the cache against monthly_rollups after a top-up, and reloads
+    it when they disagree (rows edited or deleted elsewhere, or ids
+    committed out of order). True when they agreed.
+    """
+    sync(pg, user_id, force=True)
+    with _synced_lock:
+        _reconciled[user_id] = time.time()
+    if agree(_cached_totals(user_id), rollup_totals(pg, user_id)):
+        return True
+    log.info("columnar cache: %s disagrees with the rollups, reloading", user_id)
+    rebuild(pg, user_id)
+    return False
+
+
+class Background:
+    """A few worker threads for per-user loads, with at most one queued per user."""
+
+    def __init__(self, name: str, workers: int):
+        self.name, self.workers = name, workers
+        self._pool = None
+        self._pending: dict = {}  # user id -> future of what is queued for them
+        self._lock = threading.Lock()
+
+    def submit(self, fn, pg, user_id: str):
+        """Runs fn(pg, user_id) unless something is already queued for the user; the future of whichever runs."""
+        def run():
+            try:
+                fn(pg, user_id)
+            except Exception as e:
+                log.warning("%s: %s failed for %s: %s", self.name, fn.__name__, user_id, e)
+            finally:
+                with self._lock:
+                    self._pending.pop(user_id, None)
+
+        with self._lock:
+            if user_id not in self._pending:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix=self.name)
+                self._pending[user_id] = self._pool.submit(run)
+            return self._pending[user_id]
+
+
+_background = Background("columnar-cache", settings.COLUMNAR_BUILD_WORKERS)
+
+
+def warm(pg, user_id: str):
+    """
+    Starts loading the user's history in the background. Returns its
+    future, or None when it is loaded already or the cache is off.
+    """
+    if enabled() and not segments(user_id):
+        return _background.submit(rebuild, pg, user_id)
+    return None
+
+
+def sync(pg, user_id: str, force: bool = False):
+    """Brings the cache up to date with rows written elsewhere (throttled per user)."""
+    now = time.time()
+    with _synced_lock:
+        if not force and now - _synced.get(user_id, 0) < settings.COLUMNAR_SYNC_INTERVAL:
+            return
+        _synced[user_id] = now
+    with locked(user_id):
+        table = load(user_id, ["id"])
+        last = pc.max(table.column("id")).as_py() if table is not None and table.num_rows else None
+        rows = fetch_new(pg, user_id, last)
+        if rows:
+            _write_segment(user_id, to_table(rows))
+            _compact(user_id)
+            log.info("columnar cache: %d new row(s) for %s", len(rows), user_id)
+        elif table is None:
+            _write_segment(user_id, to_table([]))  # no history yet; still counts as loaded
+    if rows:
+        evict()
+
+
+def frame(pg, user_id: str, columns: list, start: str | None = None, end: str | None = None,
+          newest_first: bool = False, categorical: tuple = ()) -> pd.DataFrame | None:
+    """
+    Transactions in [start, end] with just the requested columns, or None
+    when the cache is off or not loaded yet (callers then use PostgREST;
+    the load starts in the background). Columns named in categorical come
+    back as pandas categoricals, which group far faster than Python strings.
+    """
+    if not enabled():
+        return None
+    if not segments(user_id):
+        # first read, or another process evicted this user
+        warm(pg, user_id)
+        return None
+    try:
+        sync(pg, user_id)
+    except Exception as e:
+        log.warning("columnar cache sync failed for %s: %s", user_id, e)
+    with _synced_lock:
+        due = time.time() - _reconciled.setdefault(user_id, time.time()) >= settings.COLUMNAR_RECONCILE_INTERVAL
+    if due:
+        _background.submit(reconcile, pg, user_id)
+    table = load(user_id, list(dict.fromkeys(columns + ["id", "date"])))
+    if table is None:
+        return None
+    mask = None
+    if start:
+        mask = pc.greater_equal(table.column("date"), pa.scalar(pd.Timestamp(start).date(), pa.date32()))
+    if end:
+        upper = pc.less_equal(table.column("date"), pa.scalar(pd.Timestamp(end).date(), pa.date32()))
+        mask = upper if mask is None else pc.and_(mask, upper)
+    if mask is not None:
+        table = table.filter(mask)
+    if newest_first:
+        table = table.sort_by([("date", "descending"), ("id", "descending")])
+    table = table.select(columns)
+    for name in categorical:
+        i = table.schema.get_field_index(name)
+        table = table.set_column(i, name, pc.dictionary_encode(table.column(name)))
+    return table.to_pandas()
+
+
+def evict():
+    """Drops least recently used users until the cache fits COLUMNAR_CACHE_MAX_MB."""
+    root = settings.COLUMNAR_CACHE_DIR
+    limit = settings.COLUMNAR_CACHE_MAX_MB * 1024 * 1024
+    try:
+        users = [os.path.join(root, u) for u in os.listdir(root)]
+    except FileNotFoundError:
+        return
+    sizes = {}
+    for d in users:
+        try:
+            sizes[d] = sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d))
+        except OSError:
+            continue
+    total = sum(sizes.values())
+    for d in sorted(sizes, key=lambda d: os.path.getmtime(d) if os.path.exists(d) else 0):
+        if total <= limit:
+            break
+        if drop(os.path.basename(d), blocking=False):
+            total -= sizes[d]
+            log.info("columnar cache: evicted %s", os.path.basename(d))
+
+
+def drop(user_id: str, blocking: bool = True) -> bool:
+    """Forgets a user's cache; their next read reloads it. False if it was busy."""
+    with locked(user_id, blocking=blocking) as ok:
+        if not ok:
+            return False
+        for p in segments(user_id):
+            os.remove(p)
+    shutil.rmtree(user_dir(user_id), ignore_errors=True)
+    with _synced_lock:
+        _synced.pop(user_id, None)
+        _reconciled.pop(user_id, None)
+    return True
@@ -0,0 +1,37 @@
+"""
+Runs independent I/O-bound calls (PostgREST queries) side by side, so a
+request waits for the slowest query instead of the sum of all of them.
+"""
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import settings
+
+log = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=settings.FETCH_WORKERS, thread_name_prefix="fetch")
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def fetch_all(**calls):
+    """
+    fetch_all(tx=lambda: ..., budgets=lambda: ...) -> (results, timings)
+    timings holds each call's duration in ms plus the wall time as "fetch".
+    The first exception raised by a call is re-raised.
+    """
+    start = time.perf_counter()
+    # each call runs in a copy of the caller's context, so its spans land on this request
+    futures = {name: _executor.submit(contextvars.copy_context().run, _timed, fn) for name, fn in calls.items()}
+    results, timings = {}, {}
+    for name, future in futures.items():
+        results[name], timings[name] = future.result()
+    timings["fetch"] = (time.perf_counter() - start) * 1000
+    log.info("fetch timings (ms): %s", {k: round(v, 1) for k, v in timings.items()})
+    return results, timings
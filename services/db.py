@@ -0,0 +1,59 @@
+"""
+SQLite stand-in for the Supabase schema, for tests and benchmarks that
+shouldn't need a live database.
+"""
+import sqlite3
+
+SCHEMA = """
+create table if not exists categories (
+    id integer primary key,
+    user_id text not null,
+    name text not null,
+    type text,
+    unique (user_id, name)
+);
+create table if not exists transactions (
+    id integer primary key,
+    user_id text not null,
+    date text not null,
+    amount real not null,
+    type text not null,
+    description text,
+    category_id integer references categories (id),
+    fingerprint text
+);
+create index if not exists transactions_user_id_date_idx on transactions (user_id, date);
+create unique index if not exists transactions_user_id_fingerprint_key on transactions (user_id, fingerprint);
+create table if not exists budgets (
+    id integer primary key,
+    user_id text not null,
+    category_id integer references categories (id),
+    month text not null,
+    amount real not null
+);
+-- the rowid (id) is the implicit last column of every SQLite index, so
+-- these serve the keyset orders of services.pagination as they are;
+-- budgets are also upserted on this key (services.budgets)
+create unique index if not exists budgets_user_id_month_category_id_key on budgets (user_id, month, category_id);
+-- unlike Postgres' "nulls not distinct", SQLite's unique treats null
+-- category_ids as distinct; writers match them with "is"
+create table if not exists monthly_rollups (
+    user_id text not null,
+    month text not null,
+    category_id integer references categories (id),
+    type text not null,
+    total real not null default 0,
+    count integer not null default 0,
+    min_amount real,
+    max_amount real,
+    budget real,
+    unique (user_id, month, category_id, type)
+);
+"""
+
+
+def connect_sqlite(path: str = ":memory:") -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
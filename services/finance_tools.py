@@ -1,70 +1,138 @@
 import pandas as pd
-from datetime import datetime
 from dateutil.parser import parse as parse_date
+from services.instrumentation import traced
 
 REQUIRED_COLUMNS = ["date", "amount", "type"]  # category, description optional
-
-def normalize_csv(df: pd.DataFrame) -> pd.DataFrame:
-    # unify column names
-    df.columns = [c.strip().lower() for c in df.columns]
-    # rename common variants
-    aliases = {
-        "txn_date": "date",
-        "posted_date": "date",
-        "credit": "amount",
-        "debit": "amount",
-    }
-    df = df.rename(columns={k: v for k, v in aliases.items() if k in df.columns})
-
-    # ensure required cols exist
-    for col in REQUIRED_COLUMNS:
-        if col not in df.columns:
-            df[col] = None
-
-    # parse date
-    def safe_date(x):
-        try:
-            return parse_date(str(x)).date().isoformat()
-        except Exception:
-            return None
-
-    df["date"] = df["date"].apply(safe_date)
-
-    # amount numeric
-    def to_amount(row):
-        amt = row.get("amount")
-        # If separate credit/debit existed earlier, you can custom-handle here
-        try:
-            return float(str(amt).replace(",", "").replace("₹", "").strip())
-        except Exception:
-            return None
-
-    df["amount"] = df.apply(to_amount, axis=1)
-
-    # type -> income/expense
-    def norm_type(x):
-        s = str(x).lower()
-        if s in ["income", "credit", "cr", "in"]:
-            return "income"
-        return "expense"
-
-    df["type"] = df["type"].apply(norm_type)
-    return df
-
+INCOME_TYPES = ("income", "credit", "cr", "in")
+TYPE_DTYPE = pd.CategoricalDtype(["income", "expense"])
+TRANSACTION_FIELDS = ["user_id", "date", "amount", "type", "description", "category_name", "fingerprint"]
+
+
+def _safe_date(x, dayfirst: bool = False):
+    try:
+        return parse_date(str(x), dayfirst=dayfirst).date().isoformat()
+    except Exception:
+        return None
+
+
+def parse_dates(s: pd.Series, dayfirst: bool = False, fmt: str | None = None) -> pd.Series:
+    """
+    Vectorized date parsing to ISO strings (None when unparseable).
+    With fmt, rows that don't fit it go through dateutil. Without, each row
+    is read on its own (format="mixed"), so a file mixing "13/01/2025" and
+    "02/03/2025" gets the same dates as a per-row dateutil parse.
+    """
+    if s.dtype != object:
+        # numbers like 20251101 would otherwise be read as epoch offsets
+        s = s.astype(str).where(s.notna(), None)
+    try:
+        parsed = pd.to_datetime(s, errors="coerce", dayfirst=dayfirst, format=fmt or "mixed")
+    except (ValueError, TypeError):
+        parsed = pd.Series(pd.NaT, index=s.index)
+    if getattr(parsed.dt, "tz", None) is not None:
+        parsed = parsed.dt.tz_localize(None)
+    out = parsed.dt.strftime("%Y-%m-%d").astype(object)
+
+    # fallback for rows pandas couldn't place
+    retry = out.isna() & s.notna()
+    if retry.any():
+        out[retry] = s[retry].map(lambda x: _safe_date(x, dayfirst))
+    return out.where(out.notna(), None)
+
+
+def parse_amounts(s: pd.Series, decimal: str = ".") -> pd.Series:
+    """
+    Strips ₹ and thousands separators, returns float (NaN when invalid).
+    decimal="," reads 1.234,56 as 1234.56.
+    """
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype(float)
+    cleaned = s.astype(str)
+    if decimal == ",":
+        cleaned = cleaned.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    else:
+        cleaned = cleaned.str.replace(",", "", regex=False)
+    cleaned = (cleaned.str.replace("₹", "", regex=False)
+                      .str.strip())
+    return pd.to_numeric(cleaned, errors="coerce").astype(float)
+
+
+def _norm_type(x):
+    return "income" if str(x).lower() in INCOME_TYPES else "expense"
+
+
+def parse_types(s: pd.Series) -> pd.Series:
+    # map each distinct label once instead of once per row
+    cats = s.astype(str).astype("category")
+    mapping = {c: _norm_type(c) for c in cats.cat.categories}
+    return cats.map(mapping).astype(TYPE_DTYPE)
+
+
+def _text_or_none(s: pd.Series) -> pd.Series:
+    s = s.astype(object)
+    return s.where(s.notna() & (s != ""), None)
+
+
+def normalize_description(s: pd.Series) -> pd.Series:
+    """Lowercase, punctuation and repeated spaces removed: "UPI/Swiggy  123" == "upi swiggy 123"."""
+    # statements repeat the same few merchants; clean each distinct text once
+    codes, uniques = pd.factorize(s)
+    if not len(uniques):
+        return pd.Series("", index=s.index, dtype=object)
+    cleaned = (pd.Series(uniques, dtype=object).astype(str).str.lower()
+                 .str.replace(r"[^\w]+", " ", regex=True)
+                 .str.strip())
+    out = pd.Series(cleaned.to_numpy()[codes], index=s.index, dtype=object)
+    return out.where(codes >= 0, "")
+
+
+def fingerprints(df: pd.DataFrame) -> pd.Series:
+    """
+    Stable 64-bit content hash of (date, amount, type, normalized description)
+    per row. Identical rows hash alike; importer.number_duplicates tells
+    genuine repeats within one file apart.
+    """
+    key = pd.DataFrame({
+        "date": df["date"].astype(str),
+        "cents": (df["amount"].astype(float) * 100).round().astype("int64"),
+        "type": df["type"].astype(str),
+        "description": normalize_description(df["description"]),
+    })
+    return pd.util.hash_pandas_object(key, index=False)
+
+
+@traced("normalize")
+def normalize_csv(df: pd.DataFrame, profile=None) -> pd.DataFrame:
+    """
+    Raw statement frame -> date, amount, type, description, category.
+    Column mapping comes from the matching bank profile (services/statements.py).
+    """
+    from services.statements import normalize  # statements builds on the parsers above
+    return normalize(df, profile)
+
+@traced("to_transactions")
 def to_transactions(df: pd.DataFrame, user_id: str):
-    rows = []
-    for _, r in df.iterrows():
-        if not r["date"] or r["amount"] is None or r["type"] not in ("income", "expense"):
-            continue
-        rows.append({
-            "user_id": user_id,
-            "date": r["date"],
-            "amount": r["amount"],
-            "type": r["type"],
-            "description": (r.get("description") or r.get("narration") or None),
-            "category_name": r.get("category") or None,
-        })
-    return rows
+    valid = df["date"].notna() & df["amount"].notna() & df["type"].isin(["income", "expense"])
+    df = df[valid]
+    if df.empty:
+        return []
+
+    description = _text_or_none(df["description"]) if "description" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    if "narration" in df.columns:
+        description = description.where(description.notna(), _text_or_none(df["narration"]))
+    category = _text_or_none(df["category"]) if "category" in df.columns else None
+
+    out = pd.DataFrame({
+        "user_id": user_id,
+        "date": df["date"],
+        "amount": df["amount"],
+        "type": df["type"].astype(str),
+        "description": description,
+        "category_name": category,
+    }, index=df.index, columns=TRANSACTION_FIELDS)
+    out["fingerprint"] = fingerprints(out)
+    out = out.astype(object).where(out.notna(), None)
+    return out.to_dict("records")
 
 def normalize_budget_csv(df: pd.DataFrame) -> pd.DataFrame:
     # unify column names
@@ -1,15 +1,15 @@
-import google.generativeai as genai
+import threading
 from config import settings
+from services.response_cache import get_cache
+from services.instrumentation import gemini_call, record
+import time
 
-def get_model():
-    genai.configure(api_key=settings.GOOGLE_API_KEY)
-    return genai.GenerativeModel(settings.GEMINI_MODEL_ID)
+_model = None
+_model_lock = threading.Lock()
+JSON_CONFIG = {"response_mime_type": "application/json"}
 
-def ask_gemini(prompt: str, json_mode: bool = False) -> str:
-    model = get_model()
-    
-    # Add system instructions to improve handling of finance data
-    system_instruction = """
+# Add system instructions to improve handling of finance data
+SYSTEM_INSTRUCTION = """
     Keep responses concise, no long paragraphs, no storytelling, no fluff.
 
 Prioritize insight density over word count.
@@ -46,13 +46,98 @@ Output plain text only.
 
 Use spacing, punctuation, and line breaks for clarity instead of formatting.
     """
+
+def get_model():
+    """
+    One model per process. google.generativeai (about a second to import)
+    is loaded and configured on the first call instead of at startup, and
+    its clients and connections are reused by every later request.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=settings.GOOGLE_API_KEY)
+                _model = genai.GenerativeModel(settings.GEMINI_MODEL_ID)
+    return _model
+
+def ask_gemini(prompt: str, json_mode: bool = False) -> str:
+    model = get_model()
+
+    with gemini_call(prompt, "ask"):
+        if json_mode:
+            resp = model.generate_content(
+                [SYSTEM_INSTRUCTION, prompt],
+                generation_config=JSON_CONFIG
+            )
+        else:
+            resp = model.generate_content([SYSTEM_INSTRUCTION, prompt])
     
-    if json_mode:
-        resp = model.generate_content(
-            [system_instruction, prompt],
-            generation_config={"response_mime_type": "application/json"}
-        )
-    else:
-        resp = model.generate_content([system_instruction, prompt])
-    
     return resp.text or ""
+
+def ask_gemini_stream(prompt: str):
+    """
+    Yields the reply text piece by piece as the model generates it, so
+    callers can forward the first words instead of waiting for the end.
+    """
+    model = get_model()
+    start = time.perf_counter()
+    with gemini_call(prompt, "stream"):
+        for i, chunk in enumerate(model.generate_content([SYSTEM_INSTRUCTION, prompt], stream=True)):
+            if i == 0:
+                record("gemini_first_chunk", time.perf_counter() - start, "stream")
+            text = chunk.text
+            if text:
+                yield text
+
+async def ask_gemini_async(prompt: str) -> str:
+    """ask_gemini without holding a thread while the model works."""
+    with gemini_call(prompt, "ask_async"):
+        resp = await get_model().generate_content_async([SYSTEM_INSTRUCTION, prompt])
+    return resp.text or ""
+
+async def ask_gemini_stream_async(prompt: str):
+    start = time.perf_counter()
+    with gemini_call(prompt, "stream_async"):
+        resp = await get_model().generate_content_async([SYSTEM_INSTRUCTION, prompt], stream=True)
+        first = True
+        async for chunk in resp:
+            if first:
+                record("gemini_first_chunk", time.perf_counter() - start, "stream_async")
+                first = False
+            text = chunk.text
+            if text:
+                yield text
+
+def ask_gemini_cached(prompt: str, *, user_id: str, question: str, fingerprint: str,
+                      json_mode: bool = False) -> tuple[str, bool]:
+    """
+    ask_gemini behind the response cache. The key is the normalized
+    question plus the data fingerprint, so a reply is reused only while
+    the user's data is unchanged. Returns (reply, cache_hit).
+    """
+    cache = get_cache()
+    if cache is None:
+        return ask_gemini(prompt, json_mode=json_mode), False
+    return cache.get_or_call(user_id, question, fingerprint,
+                             lambda: ask_gemini(prompt, json_mode=json_mode))
+
+def ask_gemini_stream_cached(prompt: str, *, user_id: str, question: str, fingerprint: str):
+    """
+    Streaming counterpart of ask_gemini_cached. A hit is yielded as one
+    piece; a miss is streamed and the full reply stored once it completes.
+    """
+    cache = get_cache()
+    if cache is None:
+        yield from ask_gemini_stream(prompt)
+        return
+    cached = cache.lookup(user_id, question, fingerprint)
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    for text in ask_gemini_stream(prompt):
+        parts.append(text)
+        yield text
+    cache.store(user_id, question, fingerprint, "".join(parts))
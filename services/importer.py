@@ -0,0 +1,305 @@
+import io
+import logging
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from config import settings
+from services.category_resolver import resolve_categories, invalidate as invalidate_categories
+from services.finance_tools import normalize_csv, to_transactions, normalize_budget_csv, to_budgets, fingerprints
+from services import rollups, columnar_cache, categorizer, budgets, search_index
+from services.statements import read_statement, statement_profile, StatementError
+
+log = logging.getLogger(__name__)
+
+# a statement that can't be read stops its import; anything else is per batch
+READ_ERRORS = (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError, StatementError)
+
+# flashed messages live in the session cookie (4 KB); errors are shown cut down to this
+MAX_ERROR_CHARS = 200
+
+
+def _brief(text: str) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= MAX_ERROR_CHARS else text[:MAX_ERROR_CHARS - 3] + "..."
+
+
+@dataclass
+class ChunkResult:
+    index: int
+    rows_read: int
+    rows_valid: int = 0
+    inserted: int = 0
+    duplicates: int = 0  # already imported (fingerprint index); for budgets, repeats within the file
+    categorized: int = 0  # rows given a category by the auto-categorizer
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+
+@dataclass
+class ImportReport:
+    chunks: list = field(default_factory=list)
+    error: str | None = None  # fatal error that stopped the import
+    notes: list = field(default_factory=list)  # how the statement was read, where it was a guess
+
+    @property
+    def rows_read(self):
+        return sum(c.rows_read for c in self.chunks)
+
+    @property
+    def inserted(self):
+        return sum(c.inserted for c in self.chunks)
+
+    @property
+    def duplicates(self):
+        return sum(c.duplicates for c in self.chunks)
+
+    @property
+    def categorized(self):
+        return sum(c.categorized for c in self.chunks)
+
+    @property
+    def failed(self):
+        return sum(c.failed for c in self.chunks)
+
+    @property
+    def skipped(self):
+        return sum(c.rows_read - c.rows_valid for c in self.chunks)
+
+    def messages(self):
+        """(category, text) pairs ready for flash()."""
+        msgs = []
+        if self.inserted:
+            msgs.append(("success", f"Imported {self.inserted} of {self.rows_read} rows in {len(self.chunks)} chunk(s)"))
+        elif self.duplicates:
+            msgs.append(("info", "Nothing new: every row in this file was already imported"))
+        elif not self.error:
+            msgs.append(("error", "No valid rows found"))
+        if self.duplicates and self.inserted:
+            msgs.append(("info", f"Skipped {self.duplicates} duplicate row(s) already imported"))
+        if self.categorized:
+            msgs.append(("info", f"Auto-categorized {self.categorized} row(s) without a category"))
+        if self.skipped:
+            msgs.append(("info", f"Skipped {self.skipped} invalid row(s)"))
+        msgs += [("info", note) for note in self.notes]
+        failed = [c for c in self.chunks if c.failed]
+        if failed:
+            first = next((e for c in failed for e in c.errors), "unknown error")
+            msgs.append(("error", f"{self.failed} row(s) failed in {len(failed)} chunk(s), "
+                                  f"starting with chunk {failed[0].index + 1}: {_brief(first)}"))
+        if self.error:
+            msgs.append(("error", f"Import stopped after {len(self.chunks)} chunk(s): {_brief(self.error)}"))
+        return msgs
+
+
+def iter_batches(rows: list, size: int):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def attach_category_ids(pg, rows: list, user_id: str) -> dict:
+    wanted = {}
+    for r in rows:
+        name = r["category_name"]
+        if name and name not in wanted:
+            wanted[name] = r["type"]
+    ids = resolve_categories(pg, user_id, wanted) if wanted else {}
+    for r in rows:
+        r["category_id"] = ids.get(r.pop("category_name"))
+    return ids
+
+
+def parse_chunk(chunk: pd.DataFrame, user_id: str, profile=None) -> list:
+    """
+    Raw statement chunk -> transaction rows, read with the statement's
+    profile (services.statements.statement_profile). Module-level so a
+    process pool can run it.
+    """
+    return to_transactions(normalize_csv(chunk, profile), user_id)
+
+
+def number_duplicates(rows: list, seen: dict):
+    """
+    Turns each row's content hash into its fingerprint: hash plus how many
+    identical rows came before it in this file. Two identical coffees on
+    one day stay two rows, while re-uploading (or overlapping) the statement
+    maps them onto the fingerprints already stored. seen carries the counts
+    across chunks.
+    """
+    for r in rows:
+        h = r["fingerprint"]
+        n = seen.get(h, 0)
+        seen[h] = n + 1
+        r["fingerprint"] = f"{h:016x}-{n}"
+
+
+def insert_chunk(pg, rows: list, user_id: str, result: ChunkResult, batch_size: int,
+                 skip_batches=(), on_batch=None):
+    """
+    Resolves categories and inserts rows in bounded batches, recording failures on result.
+    Rows whose fingerprint is already stored are skipped by the database in the same
+    round trip (on conflict do nothing) and counted as duplicates. Batches listed
+    in skip_batches went in on an earlier attempt and are counted, not re-sent;
+    on_batch(i) is called after batch i is inserted.
+    """
+    # only what the statement itself labeled is learned, never our own guesses
+    labeled = {r["fingerprint"] for r in rows if r["category_name"] is not None}
+    if settings.AUTO_CATEGORIZE:
+        try:
+            result.categorized += categorizer.fill_categories(pg, rows, user_id)
+        except Exception as e:
+            # rows still go in, just uncategorized
+            log.warning("auto-categorize failed for chunk %d: %s", result.index, e)
+    ids = attach_category_ids(pg, rows, user_id)
+    inserted = []
+    for j, batch in enumerate(iter_batches(rows, batch_size)):
+        if j in skip_batches:
+            result.inserted += len(batch)
+            continue
+        try:
+            res = (pg.table("transactions")
+                     .upsert(batch, on_conflict="user_id,fingerprint", ignore_duplicates=True)
+                     .execute())
+        except Exception as e:
+            result.failed += len(batch)
+            result.errors.append(str(e))
+            # a stale cached category id is one way a batch can fail
+            invalidate_categories(user_id)
+            continue
+        new = res.data or []  # only the rows that went in come back
+        result.inserted += len(new)
+        result.duplicates += len(batch) - len(new)
+        inserted.extend(new)
+        if on_batch:
+            on_batch(j)
+    try:
+        rollups.apply_transactions(pg, inserted, user_id)
+    except Exception as e:
+        # rows are in; `flask rollups rebuild` repairs the rollups
+        log.warning("rollup update failed for chunk %d: %s", result.index, e)
+    if not inserted:
+        return
+    names = {v: k for k, v in ids.items()}
+    local = [dict(r, category=names.get(r["category_id"])) for r in inserted]
+    if settings.AUTO_CATEGORIZE:
+        categorizer.learn(user_id, [r for r in local if r["fingerprint"] in labeled])
+    # a gap in either local copy would never be filled by the id-based
+    # sync; start that copy over instead
+    if columnar_cache.enabled():
+        try:
+            columnar_cache.append(user_id, local)
+        except Exception as e:
+            log.warning("columnar cache append failed for chunk %d: %s", result.index, e)
+            columnar_cache.drop(user_id)
+    if search_index.enabled():
+        try:
+            search_index.append(user_id, local)
+        except Exception as e:
+            log.warning("search index append failed for chunk %d: %s", result.index, e)
+            search_index.drop(user_id)
+
+
+def stream_transactions(stream, user_id: str, pg,
+                        chunk_rows: int | None = None,
+                        batch_size: int | None = None,
+                        profile=None):
+    """
+    Reads a statement (any format services.statements can sniff) chunk by chunk and inserts each chunk before
+    reading the next, so memory stays bounded by chunk_rows regardless
+    of file size. Yields a ChunkResult per chunk for progress reporting.
+    profile is the statement's statement_profile(), settled here when not given.
+    """
+    chunk_rows = chunk_rows or settings.IMPORT_CHUNK_ROWS
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    seen = {}
+    if profile is None:
+        if not stream.seekable():
+            stream = io.BytesIO(stream.read())  # the profile is settled before the import pass
+        profile = statement_profile(stream, chunk_rows)
+
+    for i, chunk in enumerate(read_statement(stream, chunk_rows)):
+        result = ChunkResult(index=i, rows_read=len(chunk))
+        rows = parse_chunk(chunk, user_id, profile)
+        number_duplicates(rows, seen)
+        result.rows_valid = len(rows)
+        if rows:
+            insert_chunk(pg, rows, user_id, result, batch_size)
+        log.info("import chunk %d: read=%d valid=%d inserted=%d duplicates=%d failed=%d",
+                 i, result.rows_read, result.rows_valid, result.inserted, result.duplicates, result.failed)
+        yield result
+
+
+def import_transactions(stream, user_id: str, pg, **kwargs) -> ImportReport:
+    report = ImportReport()
+    try:
+        if not stream.seekable():
+            stream = io.BytesIO(stream.read())
+        profile = statement_profile(stream, kwargs.get("chunk_rows"))
+        report.notes = list(profile.notes) if profile else []
+        for result in stream_transactions(stream, user_id, pg, profile=profile, **kwargs):
+            report.chunks.append(result)
+    except READ_ERRORS as e:
+        report.error = str(e)
+    return report
+
+
+def backfill_fingerprints(pg, user_id: str, page: int = 1000) -> int:
+    """
+    Fingerprints a user's transactions imported before dedup existed, so
+    re-uploading an old statement is recognised. Rows are numbered in id
+    order, the order they were imported in.
+    """
+    rows, start = [], 0
+    while True:
+        data = (pg.table("transactions")
+                  .select("id,date,amount,type,description,fingerprint")
+                  .eq("user_id", user_id)
+                  .order("id")
+                  .range(start, start + page - 1)
+                  .execute().data or [])
+        rows.extend(data)
+        if len(data) < page:
+            break
+        start += page
+    if not rows:
+        return 0
+
+    df = pd.DataFrame(rows)
+    existing = df["fingerprint"]
+    df["fingerprint"] = fingerprints(df)
+    records = df[["id", "fingerprint"]].to_dict("records")
+    number_duplicates(records, {})
+    missing = [r for r, old in zip(records, existing) if old is None]
+    updated = 0
+    for batch in iter_batches(missing, settings.IMPORT_BATCH_SIZE):
+        updated += pg.rpc("backfill_fingerprints", {"p_rows": batch}).execute().data or 0
+    return updated
+
+
+def import_budgets(df: pd.DataFrame, user_id: str, pg) -> ChunkResult:
+    """
+    Budget CSV frame -> one upsert on (user, month, category); budgets are
+    expense categories. Re-uploading a month replaces its amounts, and
+    repeats within the file count as duplicates (the last one is kept).
+    """
+    rows = to_budgets(normalize_budget_csv(df), user_id)
+    result = ChunkResult(index=0, rows_read=len(df), rows_valid=len(rows))
+    rows, result.duplicates = budgets.latest_per_key(rows)
+    if not rows:
+        return result
+    ids = resolve_categories(pg, user_id, {r["category_name"]: "expense" for r in rows})
+    for r in rows:
+        r["category_id"] = ids[r.pop("category_name")]
+    try:
+        budgets.upsert(pg, rows)
+    except Exception as e:
+        result.failed = len(rows)
+        result.errors.append(str(e))
+        return result
+    result.inserted = len(rows)
+    try:
+        rollups.apply_budgets(pg, rows, user_id)
+    except Exception as e:
+        # budgets are in; `flask rollups rebuild` repairs the rollups
+        log.warning("rollup update failed for budget import: %s", e)
+    return result
@@ -0,0 +1,382 @@
+"""
+Where a request's time goes: timing spans, Prometheus metrics, the
+Server-Timing header and an opt-in sampling profiler.
+
+span("name") (or @traced("name")) times a block. The time always feeds
+the finance_ai_span_seconds histogram served at /metrics (only with
+METRICS_TOKEN set); inside a request it is also added to that request's
+Server-Timing header, so the browser's network panel shows e.g.
+postgrest;dur=42.0, normalize;dur=8.1. The header goes to signed-in users
+and debug runs only, never on /auth/ pages.
+PostgREST calls are timed by httpx event hooks on the pooled clients,
+templates by Flask's render signals.
+
+With PROFILE_SLOW_MS set, a background thread samples the stack of every
+thread serving a request every PROFILE_INTERVAL_MS; requests slower than
+the threshold have their samples written to PROFILE_DIR as folded stacks
+("frame;frame;frame count" lines) for flamegraph.pl or speedscope.
+"""
+import contextvars
+import functools
+import hmac
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from config import settings
+
+log = logging.getLogger(__name__)
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+# ---- metrics ----
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = TIME_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._series: dict[tuple, list] = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for values, s in sorted(series.items()):
+            for bound, n in zip(self.buckets, s):
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + (bound,))} {n}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + ('+Inf',))} {s[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {s[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {s[-1]}")
+        return lines
+
+
+class Total:
+    """A Prometheus counter."""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        lines += [f"{self.name}{_labels(self.labels, k)} {v}" for k, v in sorted(values.items())]
+        return lines
+
+
+REQUEST_SECONDS = Histogram("finance_ai_request_seconds", "Request handling time",
+                            ("endpoint", "method", "status"))
+SPAN_SECONDS = Histogram("finance_ai_span_seconds", "Time spent in instrumented sections", ("span", "target"))
+PROMPT_BYTES = Histogram("finance_ai_gemini_prompt_bytes", "Size of prompts sent to Gemini", ("call",),
+                         buckets=BYTE_BUCKETS)
+PROMPT_TOKENS = Total("finance_ai_gemini_prompt_tokens_total", "Estimated prompt tokens sent to Gemini", ("call",))
+PROFILES_WRITTEN = Total("finance_ai_profiles_written_total", "Slow-request profiles dumped to PROFILE_DIR")
+METRICS = [REQUEST_SECONDS, SPAN_SECONDS, PROMPT_BYTES, PROMPT_TOKENS, PROFILES_WRITTEN]
+
+
+def pool_gauges() -> list:
+    """PostgREST connection pool state, once the pool exists."""
+    from services import supabase_client
+    if supabase_client._transport is None:
+        return []
+    lines = []
+    for key, value in supabase_client.pool_metrics().items():
+        name = f"finance_ai_postgrest_pool_{key}"
+        lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    return lines
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    lines += pool_gauges()
+    return "\n".join(lines) + "\n"
+
+
+# ---- spans ----
+
+class RequestTrace:
+    """Span totals for one request (shared by the threads working on it)."""
+
+    def __init__(self, endpoint: str, method: str = ""):
+        self.endpoint, self.method = endpoint, method
+        self.start = time.perf_counter()
+        self.thread = threading.get_ident()
+        self.spans: dict[str, list] = {}  # name -> [seconds, calls]
+        self.samples: Counter = Counter()  # folded stack -> count, when profiling; guarded by _lock
+        self.done = False
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            s = self.spans.setdefault(name, [0.0, 0])
+            s[0] += seconds
+            s[1] += 1
+
+    def server_timing(self) -> str:
+        with self._lock:
+            spans = dict(self.spans)
+        parts = [f'{name};dur={s * 1000:.1f};desc="{n} call{"s" if n != 1 else ""}"' for name, (s, n) in spans.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar[RequestTrace | None] = contextvars.ContextVar("request_trace", default=None)
+
+
+def record(name: str, seconds: float, target: str = ""):
+    SPAN_SECONDS.observe(seconds, name, target)
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+@contextmanager
+def span(name: str, target: str = ""):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start, target)
+
+
+def traced(name: str):
+    """Decorator form of span()."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+@contextmanager
+def gemini_call(prompt, call: str):
+    """Span around a Gemini request, plus the prompt's size."""
+    from services.chat_context import estimate_tokens
+    text = prompt if isinstance(prompt, str) else "".join(map(str, prompt))
+    PROMPT_BYTES.observe(len(text.encode()), call)
+    PROMPT_TOKENS.inc(estimate_tokens(text), call)
+    with span("gemini", call):
+        yield
+
+
+# ---- PostgREST (httpx event hooks) ----
+
+_REST_PATH = re.compile(r"/rest/v1/(rpc/)?([\w-]+)")
+
+
+def _target(url) -> str:
+    m = _REST_PATH.search(url.path)
+    return (m.group(1) or "") + m.group(2) if m else url.host
+
+
+def _on_request(request):
+    request.extensions["finance_ai_start"] = time.perf_counter()
+
+
+def _on_response(response):
+    start = response.request.extensions.get("finance_ai_start")
+    if start is not None:
+        record("postgrest", time.perf_counter() - start, _target(response.request.url))
+
+
+async def _on_request_async(request):
+    _on_request(request)
+
+
+async def _on_response_async(response):
+    _on_response(response)
+
+
+def httpx_hooks(is_async: bool = False) -> dict:
+    if not settings.INSTRUMENTATION:
+        return {}
+    if is_async:
+        return {"request": [_on_request_async], "response": [_on_response_async]}
+    return {"request": [_on_request], "response": [_on_response]}
+
+
+# ---- request lifecycle ----
+
+_active: dict[int, RequestTrace] = {}  # thread id -> trace, for the sampler
+_active_lock = threading.Lock()
+_sampler: threading.Thread | None = None
+
+
+def begin(endpoint: str, method: str = "", profile: bool = True) -> tuple:
+    """
+    Starts a request's trace in the current context; returns (trace, token for end()).
+    profile=False where one thread serves many requests (the ASGI event loop),
+    since its samples couldn't be told apart.
+    """
+    trace = RequestTrace(endpoint, method)
+    if settings.PROFILE_SLOW_MS and profile:
+        _start_sampler()
+        with _active_lock:
+            _active[trace.thread] = trace
+    return trace, _current.set(trace)
+
+
+def finish(trace: RequestTrace, status) -> float:
+    """Records the request once; returns its duration in seconds."""
+    elapsed = time.perf_counter() - trace.start
+    if trace.done:
+        return elapsed
+    trace.done = True
+    REQUEST_SECONDS.observe(elapsed, trace.endpoint, trace.method, str(status))
+    if settings.PROFILE_SLOW_MS:
+        with _active_lock:
+            if _active.get(trace.thread) is trace:
+                del _active[trace.thread]
+        if elapsed * 1000 >= settings.PROFILE_SLOW_MS and trace.samples:
+            dump_profile(trace, elapsed)
+    return elapsed
+
+
+def end(token):
+    _current.reset(token)
+
+
+def current() -> RequestTrace | None:
+    return _current.get()
+
+
+# ---- sampling profiler ----
+
+def _fold(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def _sample_forever():
+    interval = settings.PROFILE_INTERVAL_MS / 1000
+    while True:
+        time.sleep(interval)
+        with _active_lock:
+            active = list(_active.items())
+        if not active:
+            continue
+        frames = sys._current_frames()
+        for thread_id, trace in active:
+            frame = frames.get(thread_id)
+            if frame is not None:
+                stack = _fold(frame)
+                with trace._lock:
+                    trace.samples[stack] += 1
+
+
+def _start_sampler():
+    global _sampler
+    if _sampler is None:
+        with _active_lock:
+            if _sampler is None:
+                _sampler = threading.Thread(target=_sample_forever, name="profiler", daemon=True)
+                _sampler.start()
+
+
+def dump_profile(trace: RequestTrace, elapsed: float):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    name = re.sub(r"[^\w.-]", "_", trace.endpoint)
+    path = os.path.join(settings.PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{elapsed * 1000:.0f}ms.folded")
+    with trace._lock:
+        samples = trace.samples.most_common()
+    with open(path, "w") as fh:
+        for stack, n in samples:
+            fh.write(f"{stack} {n}\n")
+    PROFILES_WRITTEN.inc()
+    log.info("slow request %s (%.0f ms): profile written to %s", trace.endpoint, elapsed * 1000, path)
+
+
+# ---- Flask ----
+
+def exposes_timing(path: str, signed_in: bool, debug: bool) -> bool:
+    """Server-Timing shows how the backend works; keep it from anonymous clients."""
+    if path.startswith("/auth/"):
+        return False
+    return signed_in or debug
+
+
+def init_app(app):
+    """Spans per request, Server-Timing, template timing and /metrics."""
+    if not settings.INSTRUMENTATION:
+        return
+    from flask import Response, g, request, session
+    from flask.signals import before_render_template, template_rendered
+
+    @app.before_request
+    def _begin_request():
+        g._trace, g._trace_token = begin(request.endpoint or "unmatched", request.method)
+
+    @app.after_request
+    def _finish_request(response):
+        trace = g.get("_trace")
+        if trace is not None:
+            # streamed bodies are produced after this; their time isn't included
+            if exposes_timing(request.path, "user" in session, app.debug):
+                response.headers["Server-Timing"] = trace.server_timing()
+            finish(trace, response.status_code)
+        return response
+
+    @app.teardown_request
+    def _end_request(exc):
+        trace = g.pop("_trace", None)
+        if trace is not None:
+            finish(trace, 500)  # no-op unless after_request was skipped by an error
+            end(g.pop("_trace_token"))
+
+    def _render_started(sender, template, context, **extra):
+        g._render_start = time.perf_counter()
+
+    def _render_done(sender, template, context, **extra):
+        start = g.pop("_render_start", None)
+        if start is not None:
+            record("render", time.perf_counter() - start, template.name or "")
+
+    before_render_template.connect(_render_started, app, weak=False)
+    template_rendered.connect(_render_done, app, weak=False)
+
+    @app.get("/metrics")
+    def metrics():
+        if not settings.METRICS_TOKEN:
+            return Response("Not Found\n", status=404, mimetype="text/plain")
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"):
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,323 @@
+"""
+Background import jobs.
+
+A large upload is spooled to disk and queued instead of being imported
+inside the request. Worker threads pick jobs up, parse CSV chunks in a
+process pool and insert them batch by batch, checkpointing every batch
+that went in. Retrying a job (automatically, or from the dashboard)
+skips checkpointed batches, so a partial failure never duplicates rows.
+
+Jobs run with the service-role client rather than the uploader's
+session, so nothing secret is stored with them and a long import never
+spends the refresh token the browser depends on. Everything the import
+path sends is scoped by user_id.
+
+SQLiteJobStore needs no outside service ("memory" backend keeps it
+in-process, "sqlite" keeps jobs across restarts).
+"""
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
+
+import pandas as pd
+
+from config import settings
+from services.importer import (ChunkResult, ImportReport, READ_ERRORS, import_budgets, insert_chunk,
+                               number_duplicates, parse_chunk)
+from services.statements import read_statement, statement_profile
+from services.response_cache import invalidate_user as invalidate_responses
+from services.supabase_client import service_postgrest
+
+log = logging.getLogger(__name__)
+
+ACTIVE = ("queued", "running")
+RETRYABLE = ("failed", "partial")
+STALE_AFTER = 300  # seconds without a heartbeat (one per batch) before a running job is assumed orphaned
+
+
+@dataclass
+class Job:
+    id: str
+    user_id: str
+    kind: str  # transactions | budgets
+    path: str
+    status: str = "queued"  # queued | running | done | partial | failed
+    attempts: int = 0
+    progress: float = 0.0
+    rows_read: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    skipped: int = 0
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def public(self) -> dict:
+        """What the status endpoint shows (no paths or user ids)."""
+        d = asdict(self)
+        for key in ("path", "user_id"):
+            d.pop(key)
+        return d
+
+
+JOB_COLUMNS = [f.name for f in fields(Job)]
+
+
+class SQLiteJobStore:
+    def __init__(self, path: str = ":memory:"):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("""create table if not exists jobs (
+            id text primary key, user_id text, kind text, path text, status text,
+            attempts integer, progress real, rows_read integer, inserted integer,
+            duplicates integer, failed integer, skipped integer, error text, created_at real, updated_at real)""")
+        columns = {r[1] for r in self._conn.execute("pragma table_info(jobs)")}
+        if "duplicates" not in columns:  # job db created before dedup
+            self._conn.execute("alter table jobs add column duplicates integer default 0")
+        if "access_token" in columns:  # job db from when jobs ran on the uploader's session tokens
+            self._conn.execute("update jobs set access_token = null, refresh_token = null")
+        self._conn.execute("create index if not exists jobs_user_id on jobs (user_id, created_at)")
+        self._conn.execute("""create table if not exists job_batches (
+            job_id text, chunk integer, batch integer, primary key (job_id, chunk, batch))""")
+        self._lock = threading.Lock()
+
+    def create(self, job: Job):
+        with self._lock:
+            self._conn.execute(f"insert into jobs ({','.join(JOB_COLUMNS)}) values ({','.join('?' * len(JOB_COLUMNS))})",
+                               [getattr(job, c) for c in JOB_COLUMNS])
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            row = self._conn.execute(f"select {','.join(JOB_COLUMNS)} from jobs where id = ?", (job_id,)).fetchone()
+        return Job(*row) if row else None
+
+    def update(self, job_id: str, **changes):
+        changes["updated_at"] = time.time()
+        with self._lock:
+            self._conn.execute(f"update jobs set {', '.join(f'{k} = ?' for k in changes)} where id = ?",
+                               [*changes.values(), job_id])
+
+    def claim(self, job_id: str) -> bool:
+        """queued -> running; False when another worker got there first."""
+        with self._lock:
+            cur = self._conn.execute("""update jobs set status = 'running', attempts = attempts + 1, updated_at = ?
+                                        where id = ? and status = 'queued'""", (time.time(), job_id))
+        return cur.rowcount == 1
+
+    def requeue(self, job_id: str, **changes) -> bool:
+        changes.update(status="queued", error=None, updated_at=time.time())
+        with self._lock:
+            cur = self._conn.execute(
+                f"update jobs set {', '.join(f'{k} = ?' for k in changes)} where id = ? and status in {RETRYABLE}",
+                [*changes.values(), job_id])
+        return cur.rowcount == 1
+
+    def pending(self, stale_after: float) -> list:
+        """Queued job ids, after putting back running jobs whose worker went away."""
+        with self._lock:
+            self._conn.execute("update jobs set status = 'queued' where status = 'running' and updated_at < ?",
+                               (time.time() - stale_after,))
+            rows = self._conn.execute("select id from jobs where status = 'queued' order by created_at").fetchall()
+        return [r[0] for r in rows]
+
+    def for_user(self, user_id: str, limit: int = 5) -> list:
+        with self._lock:
+            rows = self._conn.execute(f"select {','.join(JOB_COLUMNS)} from jobs where user_id = ? "
+                                      "order by created_at desc limit ?", (user_id, limit)).fetchall()
+        return [Job(*r) for r in rows]
+
+    def add_batch(self, job_id: str, chunk: int, batch: int):
+        """Checkpoints a batch; doubles as the job's heartbeat, so a slow but live job isn't reclaimed."""
+        with self._lock:
+            self._conn.execute("insert or ignore into job_batches values (?, ?, ?)", (job_id, chunk, batch))
+            self._conn.execute("update jobs set updated_at = ? where id = ?", (time.time(), job_id))
+
+    def done_batches(self, job_id: str) -> set:
+        with self._lock:
+            rows = self._conn.execute("select chunk, batch from job_batches where job_id = ?", (job_id,)).fetchall()
+        return {(c, b) for c, b in rows}
+
+
+def parsed_chunks(chunks, user_id: str, profile, pool, lookahead: int):
+    """
+    Yields (index, rows_read, rows) in order. With a pool, the next
+    `lookahead` chunks are parsed in other processes while the current
+    one is being inserted. Every chunk is read with the statement's profile.
+    """
+    if pool is None:
+        for i, chunk in enumerate(chunks):
+            yield i, len(chunk), parse_chunk(chunk, user_id, profile)
+        return
+    pending = deque()
+    for i, chunk in enumerate(chunks):
+        pending.append((i, len(chunk), pool.submit(parse_chunk, chunk, user_id, profile)))
+        if len(pending) > lookahead:
+            j, n, fut = pending.popleft()
+            yield j, n, fut.result()
+    while pending:
+        j, n, fut = pending.popleft()
+        yield j, n, fut.result()
+
+
+class JobRunner:
+    def __init__(self, store: SQLiteJobStore, workers: int | None = None, parse_processes: int | None = None,
+                 client=service_postgrest):
+        self.store = store
+        self._client = client
+        self.parse_processes = settings.IMPORT_PARSE_PROCESSES if parse_processes is None else parse_processes
+        self._threads = ThreadPoolExecutor(max_workers=workers or settings.IMPORT_WORKERS,
+                                           thread_name_prefix="import-job")
+        self._parsers = None
+        self._lock = threading.Lock()
+
+    def parsers(self):
+        if self.parse_processes <= 0:
+            return None
+        with self._lock:
+            if self._parsers is None:
+                # spawn, not fork: this process has live threads and sockets
+                self._parsers = ProcessPoolExecutor(self.parse_processes,
+                                                    mp_context=multiprocessing.get_context("spawn"))
+        return self._parsers
+
+    def enqueue(self, user_id: str, kind: str, upload) -> Job:
+        """Spools the upload (anything with .save(path)) and queues it."""
+        job_id = uuid.uuid4().hex
+        os.makedirs(settings.IMPORT_SPOOL_FOLDER, exist_ok=True)
+        path = os.path.join(settings.IMPORT_SPOOL_FOLDER, f"{job_id}.upload")  # format is sniffed, not trusted
+        upload.save(path)
+        job = Job(id=job_id, user_id=user_id, kind=kind, path=path)
+        self.store.create(job)
+        self._threads.submit(self.run, job_id)
+        return job
+
+    def retry(self, job_id: str) -> bool:
+        if not self.store.requeue(job_id):
+            return False
+        self._threads.submit(self.run, job_id)
+        return True
+
+    def recover(self):
+        """Resubmits jobs left queued (or orphaned mid-run) by an earlier process."""
+        for job_id in self.store.pending(STALE_AFTER):
+            self._threads.submit(self.run, job_id)
+
+    def shutdown(self, wait: bool = True):
+        """Stops the worker threads and the parse processes."""
+        self._threads.shutdown(wait=wait)
+        with self._lock:
+            parsers, self._parsers = self._parsers, None
+        if parsers is not None:
+            parsers.shutdown(wait=wait)
+
+    def run(self, job_id: str):
+        if not self.store.claim(job_id):
+            return
+        job = self.store.get(job_id)
+        report = ImportReport()
+        try:
+            pg = self._client()
+            for attempt in range(settings.IMPORT_JOB_RETRIES + 1):
+                if attempt:
+                    time.sleep(min(2 ** attempt, 30))
+                report = self.run_once(pg, job)
+                if report.error or not report.failed:
+                    break
+                log.info("import job %s: %d row(s) failed, retry %d", job_id, report.failed, attempt + 1)
+            status = "failed" if report.error else "partial" if report.failed else "done"
+            error = report.error or "; ".join(e for c in report.chunks for e in c.errors)[:500] or None
+        except Exception as e:
+            log.exception("import job %s failed", job_id)
+            status, error = "failed", str(e)
+
+        self.store.update(job_id, status=status, error=error)
+        if status == "done":
+            try:
+                os.remove(job.path)
+            except OSError:
+                pass
+        if report.inserted:
+            invalidate_responses(job.user_id)
+        log.info("import job %s: %s, inserted=%d failed=%d", job_id, status, report.inserted, report.failed)
+
+    def run_once(self, pg, job: Job) -> ImportReport:
+        if job.kind == "budgets":
+            return self.run_budgets(pg, job)
+        return self.run_transactions(pg, job)
+
+    def run_transactions(self, pg, job: Job) -> ImportReport:
+        report = ImportReport()
+        done = self.store.done_batches(job.id)
+        seen = {}
+        size = os.path.getsize(job.path) or 1
+        try:
+            with open(job.path, "rb") as fh:
+                profile = statement_profile(fh, settings.IMPORT_CHUNK_ROWS)
+                report.notes = list(profile.notes) if profile else []
+                for note in report.notes:
+                    log.info("import job %s: %s", job.id, note)
+                chunks = read_statement(fh, settings.IMPORT_CHUNK_ROWS)
+                for i, rows_read, rows in parsed_chunks(chunks, job.user_id, profile, self.parsers(),
+                                                        self.parse_processes):
+                    result = ChunkResult(index=i, rows_read=rows_read, rows_valid=len(rows))
+                    number_duplicates(rows, seen)
+                    if rows:
+                        insert_chunk(pg, rows, job.user_id, result, settings.IMPORT_BATCH_SIZE,
+                                     skip_batches={b for c, b in done if c == i},
+                                     on_batch=lambda b, i=i: self.store.add_batch(job.id, i, b))
+                    report.chunks.append(result)
+                    self.store.update(job.id, progress=min(fh.tell() / size, 1.0), rows_read=report.rows_read,
+                                      inserted=report.inserted, duplicates=report.duplicates,
+                                      failed=report.failed, skipped=report.skipped)
+        except READ_ERRORS as e:
+            report.error = str(e)
+        self.store.update(job.id, progress=1.0)
+        return report
+
+    def run_budgets(self, pg, job: Job) -> ImportReport:
+        report = ImportReport()
+        if (0, 0) in self.store.done_batches(job.id):
+            return report  # went in on an earlier attempt
+        try:
+            df = pd.read_csv(job.path)
+        except READ_ERRORS as e:
+            report.error = str(e)
+            return report
+        result = import_budgets(df, job.user_id, pg)
+        if result.inserted:
+            self.store.add_batch(job.id, 0, 0)
+        report.chunks.append(result)
+        self.store.update(job.id, progress=1.0, rows_read=result.rows_read, inserted=result.inserted,
+                          duplicates=result.duplicates, failed=result.failed,
+                          skipped=result.rows_read - result.rows_valid)
+        return report
+
+
+def make_store() -> SQLiteJobStore:
+    if settings.IMPORT_JOB_BACKEND == "memory":
+        return SQLiteJobStore(":memory:")
+    return SQLiteJobStore(settings.IMPORT_JOB_DB)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> JobRunner:
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = JobRunner(make_store())
+                _runner.recover()
+    return _runner
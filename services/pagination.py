@@ -0,0 +1,202 @@
+"""
+Keyset (cursor) pagination for the dashboard tables.
+
+Transactions are ordered newest first on (date, id) and budgets on
+(month desc, category_id, id), Uncategorized (a null category_id) last
+in its month as in Postgres' default ascending order. A page asks for the rows after the last
+key of the previous page instead of skipping OFFSET rows. PostgREST has
+no row-value comparison, so the key condition is an or=(...) filter that
+Postgres can't start an index scan from; each page also bounds the
+leading column (date <= cursor date), which the indexes from
+sql/005_keyset_pagination.sql and sql/006_budget_upsert.sql can, so page
+1000 costs the same as page 1. Cursors are opaque to clients: the last
+row's key, base64 JSON.
+"""
+import base64
+import binascii
+import json
+import re
+
+MAX_PAGE_SIZE = 200
+TYPES = ("income", "expense")
+UNCATEGORIZED = "Uncategorized"
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+class CursorError(ValueError):
+    """A cursor or filter the API can't use."""
+
+
+def encode_cursor(key: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None, size: int, nullable: tuple = ()) -> list | None:
+    """
+    [date, *ids] from a cursor; the date is spliced into a filter, so it is
+    checked strictly. Ids are ints, or null at the positions in nullable.
+    """
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise CursorError("Invalid cursor")
+    if (not isinstance(key, list) or len(key) != size or not isinstance(key[0], str)
+            or not ISO_DATE.fullmatch(key[0])
+            or not all(type(k) is int or (k is None and i in nullable) for i, k in enumerate(key) if i)):
+        raise CursorError("Invalid cursor")
+    return key
+
+
+def page_size(limit, default: int) -> int:
+    try:
+        return max(1, min(int(limit or default), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise CursorError("limit must be a number")
+
+
+def check_filters(start: str | None, end: str | None, type_: str | None = None):
+    for name, value in (("from", start), ("to", end)):
+        if value and not ISO_DATE.fullmatch(value):
+            raise CursorError(f"{name} must be a YYYY-MM-DD date")
+    if type_ and type_ not in TYPES:
+        raise CursorError(f"type must be one of {', '.join(TYPES)}")
+
+
+def _page(rows: list, limit: int, key) -> dict:
+    """rows were fetched with limit + 1, so an extra row means there is a next page."""
+    items = rows[:limit]
+    more = len(rows) > limit
+    return {"items": items, "next": encode_cursor(key(items[-1])) if more else None}
+
+
+def _flatten(rows: list) -> list:
+    for r in rows:
+        r["category"] = (r.pop("categories", None) or {}).get("name")
+    return rows
+
+
+def _category_filter(q, category: str | None, select: str):
+    """Embeds categories as an inner join when filtering on its name."""
+    if category and category != UNCATEGORIZED:
+        return q.select(select.replace("categories(name)", "categories!inner(name)")).eq("categories.name", category)
+    q = q.select(select)
+    return q.is_("category_id", "null") if category == UNCATEGORIZED else q
+
+
+# ---- PostgREST ----
+
+def transactions_page(pg, cursor: str | None = None, limit: int = 50, start: str | None = None,
+                      end: str | None = None, type_: str | None = None, category: str | None = None) -> dict:
+    """One page of the user's transactions, newest first: {"items": [...], "next": cursor or None}."""
+    after = decode_cursor(cursor, 2)
+    check_filters(start, end, type_)
+    q = _category_filter(pg.table("transactions"), category, "id,date,amount,type,description,categories(name)")
+    if start:
+        q = q.gte("date", start)
+    if end:
+        q = q.lte("date", end)
+    if type_:
+        q = q.eq("type", type_)
+    if after:
+        date, id_ = after
+        q = q.lte("date", date).or_(f"date.lt.{date},and(date.eq.{date},id.lt.{id_})")
+    rows = q.order("date.desc").order("id.desc").limit(limit + 1).execute().data or []
+    return _page(_flatten(rows), limit, lambda r: [r["date"], r["id"]])
+
+
+def budgets_page(pg, cursor: str | None = None, limit: int = 50, start: str | None = None,
+                 end: str | None = None, category: str | None = None) -> dict:
+    """One page of budgets, latest month first, then by category."""
+    after = decode_cursor(cursor, 3, nullable=(1,))
+    check_filters(start, end)
+    q = _category_filter(pg.table("budgets"), category, "id,month,amount,category_id,categories(name)")
+    if start:
+        q = q.gte("month", start)
+    if end:
+        q = q.lte("month", end)
+    if after:
+        month, cat, id_ = after
+        if cat is None:
+            # Uncategorized comes last in its month
+            keyset = f"month.lt.{month},and(month.eq.{month},category_id.is.null,id.gt.{id_})"
+        else:
+            keyset = (f"month.lt.{month},and(month.eq.{month},category_id.gt.{cat}),"
+                      f"and(month.eq.{month},category_id.is.null),"
+                      f"and(month.eq.{month},category_id.eq.{cat},id.gt.{id_})")
+        q = q.lte("month", month).or_(keyset)
+    rows = (q.order("month.desc").order("category_id.asc.nullslast").order("id.asc")
+             .limit(limit + 1).execute().data or [])
+    return _page(_flatten(rows), limit, lambda r: [r["month"], r["category_id"], r["id"]])
+
+
+# ---- SQLite stand-in (services.db) ----
+
+class _Where:
+    def __init__(self, clause: str, *args):
+        self.clauses, self.args = [clause], list(args)
+
+    def add(self, clause: str, *args):
+        self.clauses.append(clause)
+        self.args.extend(args)
+
+    @property
+    def sql(self) -> str:
+        return " and ".join(self.clauses)
+
+
+def transactions_page_sqlite(conn, user_id: str, cursor: str | None = None, limit: int = 50,
+                             start: str | None = None, end: str | None = None,
+                             type_: str | None = None, category: str | None = None) -> dict:
+    """Same result as transactions_page(), against the SQLite stand-in."""
+    after = decode_cursor(cursor, 2)
+    check_filters(start, end, type_)
+    where = _Where("t.user_id = ?", user_id)
+    if start:
+        where.add("t.date >= ?", start)
+    if end:
+        where.add("t.date <= ?", end)
+    if type_:
+        where.add("t.type = ?", type_)
+    if category == UNCATEGORIZED:
+        where.add("t.category_id is null")
+    elif category:
+        where.add("c.name = ?", category)
+    if after:
+        where.add("(t.date, t.id) < (?, ?)", *after)
+    rows = conn.execute(
+        f"""select t.id, t.date, t.amount, t.type, t.description, c.name as category
+            from transactions t left join categories c on c.id = t.category_id
+            where {where.sql}
+            order by t.date desc, t.id desc limit ?""", where.args + [limit + 1]).fetchall()
+    return _page([dict(r) for r in rows], limit, lambda r: [r["date"], r["id"]])
+
+
+def budgets_page_sqlite(conn, user_id: str, cursor: str | None = None, limit: int = 50,
+                        start: str | None = None, end: str | None = None, category: str | None = None) -> dict:
+    """Same result as budgets_page(), against the SQLite stand-in."""
+    after = decode_cursor(cursor, 3, nullable=(1,))
+    check_filters(start, end)
+    where = _Where("b.user_id = ?", user_id)
+    if start:
+        where.add("b.month >= ?", start)
+    if end:
+        where.add("b.month <= ?", end)
+    if category == UNCATEGORIZED:
+        where.add("b.category_id is null")
+    elif category:
+        where.add("c.name = ?", category)
+    if after:
+        month, cat, id_ = after
+        if cat is None:
+            where.add("(b.month < ? or (b.month = ? and b.category_id is null and b.id > ?))", month, month, id_)
+        else:
+            where.add("(b.month < ? or (b.month = ? and (b.category_id is null or (b.category_id, b.id) > (?, ?))))",
+                      month, month, cat, id_)
+    rows = conn.execute(
+        f"""select b.id, b.month, b.amount, b.category_id, c.name as category
+            from budgets b left join categories c on c.id = b.category_id
+            where {where.sql}
+            order by b.month desc, b.category_id nulls last, b.id limit ?""", where.args + [limit + 1]).fetchall()
+    return _page([dict(r) for r in rows], limit, lambda r: [r["month"], r["category_id"], r["id"]])
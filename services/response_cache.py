@@ -0,0 +1,186 @@
+"""
+LRU + TTL cache for LLM replies, keyed on the normalized question and a
+fingerprint of the user's data. Entries are tagged with the user id so an
+upload can drop everything cached for that user.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import settings
+
+
+def normalize_question(q: str) -> str:
+    q = re.sub(r"[^\w\s]", " ", q.lower())
+    return " ".join(q.split())
+
+
+def data_fingerprint(*parts) -> str:
+    """Stable digest of whatever describes the user's data snapshot."""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def cache_key(user_id: str, question: str, fingerprint: str) -> str:
+    raw = json.dumps([user_id, normalize_question(question), fingerprint])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: OrderedDict = OrderedDict()  # key -> (expires_at, user_id, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, user_id: str, value: str, ttl: float):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, user_id, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate_user(self, user_id: str):
+        with self._lock:
+            for key in [k for k, e in self._data.items() if e[1] == user_id]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskBackend:
+    """SQLite file, so entries survive restarts and are shared by workers on one host."""
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("""create table if not exists responses (
+            key text primary key, user_id text, value text, expires_at real, used_at real)""")
+        self._conn.execute("create index if not exists responses_user_id on responses (user_id)")
+        self._conn.execute("create index if not exists responses_used_at on responses (used_at)")
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("select value, expires_at from responses where key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("delete from responses where key = ?", (key,))
+                return None
+            self._conn.execute("update responses set used_at = ? where key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, user_id: str, value: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("insert or replace into responses values (?, ?, ?, ?, ?)",
+                               (key, user_id, value, now + ttl, now))
+            self._conn.execute("""delete from responses where key in (
+                select key from responses order by used_at desc limit -1 offset ?)""", (self.max_entries,))
+
+    def invalidate_user(self, user_id: str):
+        with self._lock:
+            self._conn.execute("delete from responses where user_id = ?", (user_id,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("delete from responses")
+
+    def __len__(self):
+        return self._conn.execute("select count(*) from responses").fetchone()[0]
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, user_id: str, question: str, fingerprint: str):
+        value = self.backend.get(cache_key(user_id, question, fingerprint))
+        with self._lock:
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return value
+
+    def store(self, user_id: str, question: str, fingerprint: str, value: str):
+        if value:
+            self.backend.set(cache_key(user_id, question, fingerprint), user_id, value, self.ttl)
+
+    def get_or_call(self, user_id: str, question: str, fingerprint: str, fn):
+        """Returns (value, hit). fn() produces the value on a miss."""
+        value = self.lookup(user_id, question, fingerprint)
+        if value is not None:
+            return value, True
+        value = fn()
+        self.store(user_id, question, fingerprint, value)
+        return value, False
+
+    def invalidate_user(self, user_id: str):
+        self.backend.invalidate_user(user_id)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": len(self.backend),
+        }
+
+
+def make_cache() -> ResponseCache | None:
+    kind = settings.CHAT_CACHE_BACKEND
+    if kind == "off":
+        return None
+    if kind == "disk":
+        backend = DiskBackend(settings.CHAT_CACHE_PATH, settings.CHAT_CACHE_SIZE)
+    else:
+        backend = MemoryBackend(settings.CHAT_CACHE_SIZE)
+    return ResponseCache(backend, settings.CHAT_CACHE_TTL)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache | None:
+    global _cache
+    if _cache is None and settings.CHAT_CACHE_BACKEND != "off":
+        with _cache_lock:
+            if _cache is None:
+                _cache = make_cache()
+    return _cache
+
+
+def invalidate_user(user_id: str):
+    cache = get_cache()
+    if cache is not None:
+        cache.invalidate_user(user_id)
@@ -0,0 +1,103 @@
+"""
+Per-user monthly rollups (category x month x type) kept up to date on
+every import, so readers pay for the number of months rather than the
+number of transactions. Schema and RPCs live in sql/003_monthly_rollups.sql.
+"""
+import pandas as pd
+
+
+def rollup_deltas(rows: list, user_id: str) -> list:
+    """Groups freshly inserted transaction rows into rollup increments."""
+    df = pd.DataFrame(rows, columns=["date", "amount", "type", "category_id"])
+    if df.empty:
+        return []
+    df["month"] = df["date"].str[:7] + "-01"
+    df["category_id"] = df["category_id"].astype("Int64")
+    g = (df.groupby(["month", "category_id", "type"], dropna=False)["amount"]
+           .agg(total="sum", count="count", min_amount="min", max_amount="max")
+           .reset_index())
+    g["user_id"] = user_id
+    g = g.astype(object)
+    return g.where(g.notna(), None).to_dict("records")
+
+
+def apply_transactions(pg, rows: list, user_id: str):
+    deltas = rollup_deltas(rows, user_id)
+    if deltas:
+        pg.rpc("apply_rollup_deltas", {"p_rows": deltas}).execute()
+
+
+def apply_budgets(pg, rows: list, user_id: str):
+    """rows are budget rows with month, category_id and amount."""
+    latest = {(r["month"], r["category_id"]): r["amount"] for r in rows}
+    payload = [{"user_id": user_id, "month": m, "category_id": c, "budget": amount}
+               for (m, c), amount in latest.items()]
+    if payload:
+        pg.rpc("apply_rollup_budgets", {"p_rows": payload}).execute()
+
+
+def rollups_query(pg, start_month: str | None = None, end_month: str | None = None):
+    """Unexecuted query; works on sync and async PostgREST clients alike."""
+    q = (pg.table("monthly_rollups")
+           .select("month,type,total,count,min_amount,max_amount,budget,categories(name)")
+           .order("month.desc"))
+    if start_month:
+        q = q.gte("month", start_month)
+    if end_month:
+        q = q.lte("month", end_month)
+    return q
+
+
+def flatten_rollups(rows: list) -> list:
+    for r in rows:
+        r["category"] = (r.pop("categories", None) or {}).get("name")
+    return rows
+
+
+def fetch_rollups(pg, start_month: str | None = None, end_month: str | None = None) -> list:
+    return flatten_rollups(rollups_query(pg, start_month, end_month).execute().data or [])
+
+
+def summary_from_rollups(rollups: list) -> dict:
+    """Same shape as aggregates.summarize, built from rollup rows."""
+    income = expense = 0.0
+    by_category, by_month = {}, {}
+    for r in rollups:
+        total = float(r["total"] or 0)
+        if not r["count"]:
+            continue  # budget-only cell
+        if r["type"] == "income":
+            income += total
+        else:
+            expense += total
+        cat = by_category.setdefault((r["category"], r["type"]), {"category": r["category"], "type": r["type"], "total": 0.0, "count": 0})
+        cat["total"] += total
+        cat["count"] += int(r["count"])
+        month = by_month.setdefault(r["month"], {"month": r["month"], "income": 0.0, "expense": 0.0})
+        month[r["type"]] += total
+    return {
+        "income": income,
+        "expense": expense,
+        "net": income - expense,
+        "by_category": sorted(by_category.values(), key=lambda c: c["total"], reverse=True),
+        "by_month": sorted(by_month.values(), key=lambda m: m["month"]),
+    }
+
+
+def budget_variance(rollups: list) -> list:
+    """Expense rollups with a budget, as (budget - spent) per month and category."""
+    return [
+        {"month": r["month"], "category": r["category"], "budget": float(r["budget"]),
+         "spent": float(r["total"] or 0), "variance": float(r["budget"]) - float(r["total"] or 0)}
+        for r in rollups if r["type"] == "expense" and r["budget"] is not None
+    ]
+
+
+def rebuild(pg, user_id: str) -> int:
+    """Recomputes a user's rollups from raw transactions and budgets."""
+    return pg.rpc("rebuild_monthly_rollups", {"p_user_id": user_id}).execute().data
+
+
+def check(pg, user_id: str) -> list:
+    """Rollup cells that disagree with the raw transactions (empty when consistent)."""
+    return pg.rpc("check_monthly_rollups", {"p_user_id": user_id}).execute().data or []
@@ -0,0 +1,478 @@
+"""
+Statement ingestion: format sniffing, streaming parsers and bank profiles.
+
+read_statement() looks at the first bytes of an upload to pick a parser
+(CSV, XLSX, OFX/QFX, JSON / JSON lines) and yields raw DataFrame chunks.
+A BankProfile says which headers of a bank's export hold the date,
+amount (or split debit/credit), type, description and category; it is
+compiled once per header set into vectorized column transforms, and every
+format ends up in the same normalized frame (date, amount, type,
+description, category) that finance_tools.to_transactions consumes.
+statement_profile() settles the profile once per statement, so all of
+its chunks are read the same way, and notes what it had to guess (the
+sign convention of a lone amount column, a decimal comma) for the import
+report.
+"""
+import csv
+import io
+import json
+import re
+from dataclasses import dataclass, replace
+from functools import lru_cache
+
+import pandas as pd
+
+from config import settings
+from services.finance_tools import parse_amounts, parse_dates, parse_types, TYPE_DTYPE
+
+SNIFF_BYTES = 64 * 1024
+SIGN_SAMPLE_ROWS = 5000  # rows looked at to tell a signed amount column from refunds
+SIGNED_MIN_SHARE = 0.25  # share of negative amounts that makes a column signed
+
+
+class StatementError(ValueError):
+    """The upload isn't a statement we can read."""
+
+
+@dataclass(frozen=True)
+class BankProfile:
+    """
+    Header names (lowercase, first one present wins) for each field of a
+    bank's export. Exports with separate withdrawal/deposit columns use
+    debit/credit; a single amount column is either paired with a type
+    column or, when signed, negative for money out. decimal is "," for
+    exports written as 1.234,56.
+    """
+    name: str
+    date: tuple
+    description: tuple = ()  # all present ones are coalesced, in order
+    amount: tuple = ()
+    debit: tuple = ()  # money out
+    credit: tuple = ()  # money in
+    type: tuple = ()
+    category: tuple = ()
+    requires: tuple = ()  # headers that identify this export
+    dayfirst: bool = False
+    date_format: str | None = None
+    signed: bool = False
+    decimal: str = "."
+    notes: tuple = ()  # how statement_profile() settled its guesses, for the import report
+
+
+GENERIC = BankProfile(
+    "generic",
+    date=("date", "txn_date", "posted_date", "transaction date"),
+    description=("description", "narration"),
+    amount=("amount",),
+    debit=("debit", "withdrawal"),
+    credit=("credit", "deposit"),
+    type=("type",),
+    category=("category",),
+)
+
+PROFILES = [
+    BankProfile("hdfc", requires=("narration", "withdrawal amt.", "deposit amt."),
+                date=("date",), description=("narration",),
+                debit=("withdrawal amt.",), credit=("deposit amt.",), dayfirst=True, date_format="%d/%m/%y"),
+    BankProfile("icici", requires=("transaction remarks",),
+                date=("transaction date", "value date"), description=("transaction remarks",),
+                debit=("withdrawal amount (inr )", "withdrawal amount"),
+                credit=("deposit amount (inr )", "deposit amount"), dayfirst=True, date_format="%d/%m/%Y"),
+    BankProfile("sbi", requires=("txn date", "debit", "credit"),
+                date=("txn date",), description=("description",),
+                debit=("debit",), credit=("credit",), dayfirst=True),
+    BankProfile("ofx", requires=("trntype", "dtposted", "trnamt"),
+                date=("dtposted",), description=("name", "memo"), amount=("trnamt",),
+                date_format="%Y%m%d", signed=True),
+    GENERIC,
+]
+
+
+def detect_profile(columns) -> BankProfile:
+    cols = {str(c).strip().lower() for c in columns}
+    for profile in PROFILES:
+        if profile.requires and set(profile.requires) <= cols:
+            return profile
+    return GENERIC
+
+
+def _first(candidates: tuple, cols: tuple):
+    return next((c for c in candidates if c in cols), None)
+
+
+@lru_cache(maxsize=64)
+def compile_profile(profile: BankProfile, cols: tuple):
+    """
+    Resolves the profile against one header set and returns the transform
+    df -> normalized frame. Cached, so chunks of one file compile once.
+    """
+    date = _first(profile.date, cols)
+    amount = _first(profile.amount, cols)
+    debit = _first(profile.debit, cols)
+    credit = _first(profile.credit, cols)
+    type_ = _first(profile.type, cols)
+    category = _first(profile.category, cols)
+    descriptions = [c for c in profile.description if c in cols]
+    split = amount is None and (debit or credit)
+
+    def transform(df: pd.DataFrame) -> pd.DataFrame:
+        out = pd.DataFrame(index=df.index)
+        out["date"] = parse_dates(df[date], profile.dayfirst, profile.date_format) if date else None
+
+        if split:
+            # one side of a split row is empty; the filled side gives amount and type
+            money_in = parse_amounts(df[credit], profile.decimal).abs() if credit else pd.Series(float("nan"), index=df.index)
+            money_out = parse_amounts(df[debit], profile.decimal).abs() if debit else pd.Series(float("nan"), index=df.index)
+            is_in = money_in.fillna(0) > 0
+            out["amount"] = money_in.where(is_in, money_out.where(money_out > 0))
+            out["type"] = pd.Series(is_in.map({True: "income", False: "expense"}), dtype=TYPE_DTYPE)
+        elif amount:
+            values = parse_amounts(df[amount], profile.decimal)
+            if type_ and not profile.signed:
+                out["amount"] = values
+                out["type"] = parse_types(df[type_])
+            elif profile.signed:
+                out["amount"] = values.abs()
+                out["type"] = pd.Series((values >= 0).map({True: "income", False: "expense"}), dtype=TYPE_DTYPE)
+            else:
+                # unsigned amounts and no type column: spending, as before profiles
+                # existed; the odd negative one is a refund or reversal
+                out["amount"] = values.abs()
+                out["type"] = pd.Series((values < 0).map({True: "income", False: "expense"}), dtype=TYPE_DTYPE)
+        else:
+            out["amount"] = float("nan")
+            out["type"] = parse_types(df[type_]) if type_ else pd.Series(None, index=df.index, dtype=TYPE_DTYPE)
+
+        desc = None
+        for c in descriptions:
+            text = df[c].astype(object)
+            text = text.where(text.notna() & (text != ""), None)
+            desc = text if desc is None else desc.where(desc.notna(), text)
+        out["description"] = desc
+        out["category"] = df[category] if category else None
+        return out
+
+    return transform
+
+
+def _headers(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    # keep the first of any repeated header
+    return df.loc[:, ~df.columns.duplicated()]
+
+
+def _sign_column(profile: BankProfile, cols) -> str | None:
+    """The amount column whose sign has to be sniffed: a lone one, with no type column to go by."""
+    amount = _first(profile.amount, cols)
+    if amount and not profile.signed and not _first(profile.type, cols):
+        return amount
+    return None
+
+
+def _signs(amounts: pd.Series) -> tuple:
+    """(negative, nonzero) counts."""
+    return int((amounts < 0).sum()), int((amounts.fillna(0) != 0).sum())
+
+
+def _settle_sign(profile: BankProfile, column: str, negative: int, nonzero: int) -> BankProfile:
+    """
+    A lone amount column is signed (negative = money out) when at least
+    SIGNED_MIN_SHARE of its amounts are negative. Fewer negatives are read
+    as refunds on an export of spending, such as a credit card's.
+    """
+    if not negative:
+        return profile
+    if negative >= SIGNED_MIN_SHARE * nonzero:
+        note = f'Read "{column}" as signed: {negative} of {nonzero} amounts checked were negative, taken as money out'
+        return replace(profile, signed=True, notes=profile.notes + (note,))
+    note = f'Read "{column}" as spending: the {negative} negative amount(s) among {nonzero} checked were taken as refunds'
+    return replace(profile, notes=profile.notes + (note,))
+
+
+def _with_decimal(profile: BankProfile, decimal: str) -> BankProfile:
+    if decimal == profile.decimal:
+        return profile
+    return replace(profile, decimal=decimal, notes=profile.notes + (f'Read amounts with "{decimal}" as the decimal mark',))
+
+
+def statement_profile(stream, chunk_rows: int | None = None) -> BankProfile | None:
+    """
+    The profile to read a whole statement with (None when it has no rows),
+    leaving the stream rewound. The sign convention of a lone amount
+    column with no type column is settled from its first SIGN_SAMPLE_ROWS
+    rows, so the rows are typed the same way whatever the chunk size.
+    """
+    profile = column = None
+    negative = nonzero = sampled = 0
+    try:
+        for chunk in read_statement(stream, chunk_rows):
+            df = _headers(chunk)
+            if profile is None:
+                profile = _with_decimal(detect_profile(df.columns), chunk.attrs.get("decimal", "."))
+                column = _sign_column(profile, tuple(df.columns))
+                if column is None:
+                    break
+            n, z = _signs(parse_amounts(df[column].iloc[:SIGN_SAMPLE_ROWS - sampled], profile.decimal))
+            negative, nonzero, sampled = negative + n, nonzero + z, sampled + len(df)
+            if sampled >= SIGN_SAMPLE_ROWS:
+                break
+    finally:
+        stream.seek(0)
+    if column is not None:
+        profile = _settle_sign(profile, column, negative, nonzero)
+    return profile
+
+
+def normalize(df: pd.DataFrame, profile: BankProfile | None = None) -> pd.DataFrame:
+    """
+    Raw statement frame -> normalized frame (date, amount, type, description, category).
+    Chunks of a statement pass its statement_profile(); without one the
+    profile (and sign) comes from this frame alone.
+    """
+    df = _headers(df)
+    if profile is None:
+        profile = _with_decimal(detect_profile(df.columns), df.attrs.get("decimal", "."))
+        column = _sign_column(profile, tuple(df.columns))
+        if column:
+            profile = _settle_sign(profile, column,
+                                   *_signs(parse_amounts(df[column].iloc[:SIGN_SAMPLE_ROWS], profile.decimal)))
+    return compile_profile(profile, tuple(df.columns))(df)
+
+
+# ---- format sniffing and streaming parsers ----
+
+def sniff_format(head: bytes) -> str:
+    if head.startswith(b"PK\x03\x04"):
+        return "xlsx"  # zip container
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+    upper = text[:4096].upper()
+    if upper.startswith(b"OFXHEADER") or b"<OFX>" in upper:
+        return "ofx"
+    if text[:1] in (b"[", b"{"):
+        return "json"
+    return "csv"
+
+
+# amounts as 1.234,56 / 12,5 and as 1,234.56 / 12.50 (a date like 18.10.2026 is neither)
+_DECIMAL_COMMA = re.compile(r"(?<![\d.,])-?\d+(?:\.\d{3})*,\d{1,2}(?![\d.,])")
+_DECIMAL_POINT = re.compile(r"(?<![\d.,])-?\d+(?:,\d{3})*\.\d{1,2}(?![\d.,])")
+
+
+def decimal_mark(sample: str, sep: str) -> str:
+    """
+    "," when a file not separated by commas writes its amounts with a
+    decimal comma (European exports, usually ";"-separated), else ".".
+    """
+    if sep == ",":
+        return "."
+    commas, points = len(_DECIMAL_COMMA.findall(sample)), len(_DECIMAL_POINT.findall(sample))
+    return "," if commas > points else "."
+
+
+def parse_csv(stream, chunk_rows: int, head: bytes):
+    sample = head.decode("utf-8", errors="ignore")
+    try:
+        sep = csv.Sniffer().sniff(sample.split("\n", 1)[0], delimiters=",;\t|").delimiter
+    except csv.Error:
+        sep = ","
+    decimal = decimal_mark(sample, sep)
+    options = {"decimal": ",", "thousands": "."} if decimal == "," else {}
+    # closing the reader, not dropping it, leaves the upload open for the next pass
+    with pd.read_csv(stream, chunksize=chunk_rows, sep=sep, **options) as reader:
+        for chunk in reader:
+            chunk.attrs["decimal"] = decimal  # for amounts left as text, see BankProfile.decimal
+            yield chunk
+
+
+def parse_xlsx(stream, chunk_rows: int, head: bytes):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise StatementError("Excel uploads need the openpyxl package")
+    try:
+        sheet = load_workbook(stream, read_only=True, data_only=True).worksheets[0]
+    except Exception as e:
+        raise StatementError(f"Unreadable Excel file: {e}")
+
+    known = {name for p in PROFILES for name in p.date}
+    rows = sheet.iter_rows(values_only=True)
+    header = None
+    for i, row in enumerate(rows):
+        # banks put account details above the table; the header row names a date column
+        cells = [str(c).strip().lower() if c is not None else "" for c in row]
+        if known & set(cells) or (i >= 30 and any(cells)):
+            header = cells
+            break
+    if header is None:
+        return
+    batch = []
+    for row in rows:
+        if not any(c is not None for c in row):
+            continue
+        batch.append(row[:len(header)])
+        if len(batch) >= chunk_rows:
+            yield pd.DataFrame(batch, columns=header)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=header)
+
+
+OFX_FIELD = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+
+def parse_ofx(stream, chunk_rows: int, head: bytes):
+    """OFX 1.x (SGML) and 2.x (XML) alike: one row per <STMTTRN> block, read incrementally."""
+    buffer, batch = "", []
+    reader = io.TextIOWrapper(stream, encoding="latin-1")
+    try:
+        while True:
+            block = reader.read(SNIFF_BYTES)
+            buffer += block
+            parts = re.split(r"</STMTTRN>", buffer, flags=re.IGNORECASE)
+            buffer = parts.pop()  # incomplete tail
+            for part in parts:
+                start = part.upper().rfind("<STMTTRN>")
+                fields = {k.lower(): v.strip() for k, v in OFX_FIELD.findall(part[start:])}
+                fields["dtposted"] = fields.get("dtposted", "")[:8]
+                batch.append(fields)
+            if len(batch) >= chunk_rows or (not block and batch):
+                yield pd.DataFrame(batch)
+                batch = []
+            if not block:
+                break
+    finally:
+        reader.detach()  # closing the wrapper would close the upload too
+
+
+class _JsonValues:
+    """
+    Decodes JSON one value at a time from a text stream, holding only the
+    value being decoded plus one read block in memory.
+    """
+    WHITESPACE = re.compile(r"[ \t\r\n]*")
+    MAX_VALUE = 16 * SNIFF_BYTES  # one transaction never comes near this
+
+    def __init__(self, reader):
+        self.reader, self.buf, self.pos, self.eof = reader, "", 0, False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        block = self.reader.read(SNIFF_BYTES)
+        self.buf, self.pos = self.buf[self.pos:] + block, 0
+        self.eof = not block
+        return bool(block)
+
+    def peek(self) -> str:
+        """Next non-whitespace character, '' at the end."""
+        while True:
+            self.pos = self.WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def take(self, expected: str):
+        if self.peek() != expected:
+            raise StatementError(f"Invalid JSON: expected {expected!r} at {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        if not self.peek():
+            raise StatementError("Invalid JSON: unexpected end of file")
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number or literal at the end of the buffer may continue in the next block
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof or len(self.buf) - self.pos > self.MAX_VALUE:
+                    raise StatementError(f"Invalid JSON: {e}")
+            self._fill()
+
+    def array(self):
+        """Elements of the array starting here, one at a time."""
+        self.take("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            sep = self.peek()
+            if sep not in (",", "]"):
+                raise StatementError(f"Invalid JSON: expected ',' or ']' at {sep!r}")
+            self.pos += 1
+            if sep == "]":
+                return
+
+    def rows(self):
+        """The first list member of the object starting here, else the object itself."""
+        self.take("{")
+        fields = {}
+        while self.peek() != "}":
+            if fields:
+                self.take(",")
+            key = self.value()
+            self.take(":")
+            if self.peek() == "[":
+                yield from self.array()
+                return
+            fields[key] = self.value()
+        yield fields
+
+
+def _json_lines(head: bytes) -> bool:
+    """True when the first value ends inside the sniffed head and another follows it."""
+    text = head.decode("utf-8-sig", errors="ignore").lstrip()
+    try:
+        _, end = json.JSONDecoder().raw_decode(text)
+    except json.JSONDecodeError:
+        return False  # runs past the head: one document
+    return bool(text[end:].strip())
+
+
+def parse_json(stream, chunk_rows: int, head: bytes):
+    """
+    A list of transaction objects, an object holding one, or JSON lines,
+    decoded a row at a time so memory stays bounded by chunk_rows.
+    """
+    reader = io.TextIOWrapper(stream, encoding="utf-8-sig")
+    doc = _JsonValues(reader)
+    try:
+        if _json_lines(head):
+            rows = iter(lambda: doc.value() if doc.peek() else None, None)
+        elif doc.peek() == "[":
+            rows = doc.array()
+        else:
+            rows = doc.rows()
+        batch = []
+        for row in rows:
+            if not isinstance(row, dict):
+                raise StatementError("Invalid JSON: expected transaction objects")
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                yield pd.json_normalize(batch)
+                batch = []
+        if batch:
+            yield pd.json_normalize(batch)
+    finally:
+        reader.detach()  # closing the wrapper would close the upload too
+
+
+PARSERS = {
+    "csv": parse_csv,
+    "xlsx": parse_xlsx,
+    "ofx": parse_ofx,
+    "json": parse_json,
+}
+
+
+def read_statement(stream, chunk_rows: int | None = None):
+    """Yields raw DataFrame chunks of an uploaded statement, whatever its format."""
+    chunk_rows = chunk_rows or settings.IMPORT_CHUNK_ROWS
+    if not stream.seekable():
+        stream = io.BytesIO(stream.read())
+    head = stream.read(SNIFF_BYTES)
+    stream.seek(0)
+    yield from PARSERS[sniff_format(head)](stream, chunk_rows, head)
@@ -1,27 +1,182 @@
 from supabase import create_client, Client
+from postgrest import AsyncPostgrestClient, SyncPostgrestClient
+from postgrest.utils import SyncClient
+from config import settings
+from services.instrumentation import httpx_hooks
+import httpx
 import os
+import threading
 import time
+import weakref
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")  
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
 _supabase: Client | None = None
 _last_refresh = 0
-_REFRESH_INTERVAL = 60 * 55 
+_REFRESH_INTERVAL = 60 * 55
+_lock = threading.Lock()
+_transport = None
+_async_transport = None
 
 def get_supabase():
     global _supabase, _last_refresh
     now = time.time()
     if _supabase is None or (now - _last_refresh) > _REFRESH_INTERVAL:
-        _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        _last_refresh = now
+        with _lock:
+            # another thread may have recreated it while we waited
+            if _supabase is None or (now - _last_refresh) > _REFRESH_INTERVAL:
+                _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+                _last_refresh = now
     return _supabase
 
+
+class PooledTransport(httpx.HTTPTransport):
+    """
+    One keep-alive connection pool shared by every PostgREST view.
+    Counts requests and newly opened connections so reuse can be measured.
+    """
+
+    def __init__(self):
+        super().__init__(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=settings.SUPABASE_POOL_SIZE,
+                max_keepalive_connections=settings.SUPABASE_POOL_KEEPALIVE,
+            ),
+        )
+        self.requests = 0
+        self.opened = 0
+        self._seen = weakref.WeakSet()
+        self._stats_lock = threading.Lock()
+
+    def handle_request(self, request):
+        response = super().handle_request(request)
+        with self._stats_lock:
+            self.requests += 1
+            for conn in self._pool.connections:
+                if conn not in self._seen:
+                    self._seen.add(conn)
+                    self.opened += 1
+        return response
+
+    def stats(self) -> dict:
+        connections = self._pool.connections
+        active = sum(1 for c in connections if not c.is_idle())
+        with self._stats_lock:
+            requests, opened = self.requests, self.opened
+        return {
+            "pool_size": settings.SUPABASE_POOL_SIZE,
+            "connections": len(connections),
+            "active": active,
+            "idle": len(connections) - active,
+            "utilization": active / settings.SUPABASE_POOL_SIZE,
+            "requests": requests,
+            "connections_opened": opened,
+            "connections_reused": max(requests - opened, 0),
+            "reuse_ratio": (requests - opened) / requests if requests else 0.0,
+        }
+
+
+def get_transport() -> PooledTransport:
+    global _transport
+    if _transport is None:
+        with _lock:
+            if _transport is None:
+                _transport = PooledTransport()
+    return _transport
+
+
+class PooledPostgrestClient(SyncPostgrestClient):
+    """PostgREST client whose HTTP session sits on the shared pool."""
+
+    def create_session(self, base_url, headers, timeout, verify=True):
+        return SyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            transport=get_transport(),
+            event_hooks=httpx_hooks(),
+        )
+
+    def aclose(self):
+        # closing the view must not close the shared pool
+        pass
+
+
+def get_async_transport() -> httpx.AsyncHTTPTransport:
+    """Pool for the async (ASGI) handlers; used from the server's event loop only."""
+    global _async_transport
+    if _async_transport is None:
+        _async_transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=settings.SUPABASE_POOL_SIZE,
+                max_keepalive_connections=settings.SUPABASE_POOL_KEEPALIVE,
+            ),
+        )
+    return _async_transport
+
+
+class PooledAsyncPostgrestClient(AsyncPostgrestClient):
+    def create_session(self, base_url, headers, timeout, verify=True):
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            transport=get_async_transport(),
+            event_hooks=httpx_hooks(is_async=True),
+        )
+
+    async def aclose(self):
+        pass
+
+
+def pool_metrics() -> dict:
+    return get_transport().stats()
+
 def authed_postgrest(access_token: str | None):
     """
-    Returns a PostgREST client with user's JWT attached (RLS enforced)
+    Returns a PostgREST client with user's JWT attached (RLS enforced).
+    Each call gets its own lightweight view over the shared connection
+    pool; no shared client is ever re-authed.
+    """
+    sb = get_supabase()
+    headers = {**sb.options.headers, "Authorization": f"Bearer {access_token or SUPABASE_KEY}"}
+    return PooledPostgrestClient(
+        sb.rest_url,
+        headers=headers,
+        schema=sb.options.schema,
+        timeout=httpx.Timeout(settings.SUPABASE_TIMEOUT, connect=settings.SUPABASE_CONNECT_TIMEOUT),
+    )
+
+def service_postgrest():
+    """
+    PostgREST client with the service-role key, for work done outside a
+    request (background imports). It bypasses RLS, so every query made
+    with it has to be scoped by user_id explicitly.
     """
-    pg = get_supabase().postgrest
-    if access_token:
-        pg = pg.auth(access_token)
-    return pg
+    if not settings.SUPABASE_SERVICE_KEY:
+        raise RuntimeError("SUPABASE_SERVICE_KEY is not set")
+    sb = get_supabase()
+    headers = {**sb.options.headers, "apikey": settings.SUPABASE_SERVICE_KEY,
+               "Authorization": f"Bearer {settings.SUPABASE_SERVICE_KEY}"}
+    return PooledPostgrestClient(
+        sb.rest_url,
+        headers=headers,
+        schema=sb.options.schema,
+        timeout=httpx.Timeout(settings.SUPABASE_TIMEOUT, connect=settings.SUPABASE_CONNECT_TIMEOUT),
+    )
+
+def async_authed_postgrest(access_token: str | None):
+    """Async counterpart of authed_postgrest for the ASGI handlers."""
+    sb = get_supabase()
+    headers = {**sb.options.headers, "Authorization": f"Bearer {access_token or SUPABASE_KEY}"}
+    return PooledAsyncPostgrestClient(
+        sb.rest_url,
+        headers=headers,
+        schema=sb.options.schema,
+        timeout=httpx.Timeout(settings.SUPABASE_TIMEOUT, connect=settings.SUPABASE_CONNECT_TIMEOUT),
+    )
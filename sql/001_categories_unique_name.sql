@@ -0,0 +1,26 @@
+-- Needed by services/category_resolver.py, which creates missing
+-- categories with a single upsert on (user_id, name).
+
+-- uploads before this could create the same name twice; keep the oldest
+-- of each and move the others' transactions and budgets onto it first
+-- (budgets that now repeat a month are merged by sql/006)
+update transactions t
+set category_id = d.survivor
+from (select id, min(id) over (partition by user_id, name) as survivor from categories) d
+where t.category_id = d.id
+  and d.survivor <> d.id;
+
+update budgets b
+set category_id = d.survivor
+from (select id, min(id) over (partition by user_id, name) as survivor from categories) d
+where b.category_id = d.id
+  and d.survivor <> d.id;
+
+delete from categories c
+using categories older
+where older.user_id = c.user_id
+  and older.name = c.name
+  and older.id < c.id;
+
+create unique index if not exists categories_user_id_name_key
+    on categories (user_id, name);
@@ -0,0 +1,31 @@
+-- Totals for services/aggregates.summarize in one round trip.
+-- security invoker (the default), so RLS limits it to the caller's rows.
+create index if not exists transactions_user_id_date_idx
+    on transactions (user_id, date);
+
+create or replace function transaction_summary(p_from date default null, p_to date default null)
+returns json
+language sql stable
+as $$
+  with tx as (
+    select t.date, t.amount, t.type, c.name as category
+    from transactions t
+    left join categories c on c.id = t.category_id
+    where (p_from is null or t.date >= p_from)
+      and (p_to is null or t.date <= p_to)
+  )
+  select json_build_object(
+    'income', coalesce((select sum(amount) from tx where type = 'income'), 0),
+    'expense', coalesce((select sum(amount) from tx where type = 'expense'), 0),
+    'by_category', coalesce((
+      select json_agg(r order by r.total desc)
+      from (select category, type, sum(amount) as total, count(*) as count
+            from tx group by category, type) r), '[]'::json),
+    'by_month', coalesce((
+      select json_agg(r order by r.month)
+      from (select to_char(date_trunc('month', date), 'YYYY-MM-DD') as month,
+                   coalesce(sum(amount) filter (where type = 'income'), 0) as income,
+                   coalesce(sum(amount) filter (where type = 'expense'), 0) as expense
+            from tx group by 1) r), '[]'::json)
+  );
+$$;
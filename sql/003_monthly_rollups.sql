@@ -0,0 +1,100 @@
+-- Per-user category x month x type rollups, maintained incrementally by
+-- services/rollups.py on every import.
+create table if not exists monthly_rollups (
+    user_id uuid not null references auth.users (id) on delete cascade,
+    month date not null,
+    category_id bigint references categories (id) on delete set null,
+    type text not null,
+    total numeric not null default 0,
+    count integer not null default 0,
+    min_amount numeric,
+    max_amount numeric,
+    budget numeric,
+    unique nulls not distinct (user_id, month, category_id, type)
+);
+
+alter table monthly_rollups enable row level security;
+create policy "own rollups" on monthly_rollups
+    for all using (user_id = auth.uid()) with check (user_id = auth.uid());
+
+-- p_rows: [{user_id, month, category_id, type, total, count, min_amount, max_amount}]
+create or replace function apply_rollup_deltas(p_rows json)
+returns void
+language sql
+as $$
+  insert into monthly_rollups as r (user_id, month, category_id, type, total, count, min_amount, max_amount)
+  select user_id, month, category_id, type, total, count, min_amount, max_amount
+  from json_populate_recordset(null::monthly_rollups, p_rows)
+  on conflict (user_id, month, category_id, type) do update set
+    total = r.total + excluded.total,
+    count = r.count + excluded.count,
+    min_amount = least(r.min_amount, excluded.min_amount),
+    max_amount = greatest(r.max_amount, excluded.max_amount);
+$$;
+
+-- p_rows: [{user_id, month, category_id, budget}]
+create or replace function apply_rollup_budgets(p_rows json)
+returns void
+language sql
+as $$
+  insert into monthly_rollups as r (user_id, month, category_id, type, budget)
+  select user_id, month, category_id, 'expense', budget
+  from json_populate_recordset(null::monthly_rollups, p_rows)
+  on conflict (user_id, month, category_id, type) do update set
+    budget = excluded.budget;
+$$;
+
+create or replace function rebuild_monthly_rollups(p_user_id uuid default auth.uid())
+returns integer
+language plpgsql
+as $$
+declare
+  n integer;
+begin
+  delete from monthly_rollups where user_id = p_user_id;
+
+  insert into monthly_rollups (user_id, month, category_id, type, total, count, min_amount, max_amount)
+  select user_id, date_trunc('month', date)::date, category_id, type,
+         sum(amount), count(*), min(amount), max(amount)
+  from transactions
+  where user_id = p_user_id
+  group by 1, 2, 3, 4;
+
+  insert into monthly_rollups as r (user_id, month, category_id, type, budget)
+  select distinct on (category_id, month) user_id, month, category_id, 'expense', amount
+  from budgets
+  where user_id = p_user_id
+  order by category_id, month, id desc
+  on conflict (user_id, month, category_id, type) do update set budget = excluded.budget;
+
+  select count(*) into n from monthly_rollups where user_id = p_user_id;
+  return n;
+end;
+$$;
+
+-- Rollup cells that disagree with the raw transactions; empty when consistent.
+create or replace function check_monthly_rollups(p_user_id uuid default auth.uid())
+returns table (month date, category_id bigint, type text,
+               rollup_total numeric, actual_total numeric,
+               rollup_count integer, actual_count bigint)
+language sql stable
+as $$
+  with actual as (
+    select date_trunc('month', date)::date as month, category_id, type,
+           sum(amount) as total, count(*) as count
+    from transactions
+    where user_id = p_user_id
+    group by 1, 2, 3
+  ), rollup as (
+    select month, category_id, type, total, count
+    from monthly_rollups
+    where user_id = p_user_id and count > 0
+  )
+  select coalesce(r.month, a.month), coalesce(r.category_id, a.category_id), coalesce(r.type, a.type),
+         r.total, a.total, r.count, a.count
+  from rollup r
+  full join actual a
+    on a.month = r.month and a.type = r.type
+   and a.category_id is not distinct from r.category_id
+  where r.total is distinct from a.total or r.count is distinct from a.count;
+$$;
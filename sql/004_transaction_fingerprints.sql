@@ -0,0 +1,24 @@
+-- Content fingerprints for import dedup (services/importer.py).
+-- The importer upserts on (user_id, fingerprint) with "on conflict do
+-- nothing", so rows that were already imported are skipped in the same
+-- round trip. Rows imported before this migration have a null
+-- fingerprint until `flask imports backfill-fingerprints <user_id>`.
+alter table transactions add column if not exists fingerprint text;
+
+create unique index if not exists transactions_user_id_fingerprint_key
+    on transactions (user_id, fingerprint);
+
+-- Sets fingerprints computed client-side: p_rows = [{"id": ..., "fingerprint": ...}]
+create or replace function backfill_fingerprints(p_rows json)
+returns integer
+language sql
+as $$
+  with updated as (
+    update transactions t
+    set fingerprint = r.fingerprint
+    from json_to_recordset(p_rows) as r(id bigint, fingerprint text)
+    where t.id = r.id and t.fingerprint is null
+    returning 1
+  )
+  select count(*)::integer from updated;
+$$;
@@ -0,0 +1,11 @@
+-- Index matching the transactions keyset order in services/pagination.py.
+-- A page filters date <= cursor date (an index range start) plus an
+-- or=(...) for the rows tied on that date, so a page after any cursor
+-- reads `limit` rows plus that date's ties however deep it is. Budgets
+-- page on the unique (user_id, month, category_id) index from
+-- sql/006_budget_upsert.sql.
+create index if not exists transactions_user_id_date_id_idx
+    on transactions (user_id, date desc, id desc);
+
+-- (user_id, date) is a prefix of the index above
+drop index if exists transactions_user_id_date_idx;
@@ -0,0 +1,45 @@
+-- One budget per (user, month, category) for services/budgets.py.
+-- Imports upsert on this key, so re-uploading a month replaces its
+-- amounts instead of adding rows, and "budgets for month M" is a range
+-- on the (user_id, month) prefix of the index. Its month desc,
+-- category_id order is also the budgets keyset order of
+-- services/pagination.py (ids only break ties the key can't have).
+
+-- keep the newest of any duplicates left by earlier imports
+delete from budgets b
+using budgets newer
+where newer.user_id = b.user_id
+  and newer.month = b.month
+  and newer.category_id is not distinct from b.category_id
+  and newer.id > b.id;
+
+create unique index if not exists budgets_user_id_month_category_id_key
+    on budgets (user_id, month desc, category_id) nulls not distinct;
+
+-- sql/005's budgets_user_id_month_category_idx covered the same order
+drop index if exists budgets_user_id_month_category_idx;
+
+-- the rollups' copy of each budget came from the newest row already
+-- (apply_rollup_budgets / rebuild_monthly_rollups), so it needs no fix-up
+
+-- Budget vs actual per month and category: each budget row joined to its
+-- month's expense total in monthly_rollups (one unique-index probe).
+-- p_from / p_to are months (any day of the month works), either may be null.
+-- security invoker (the default), so RLS limits it to the caller's rows.
+create or replace function budget_variance(p_from date default null, p_to date default null)
+returns table (month date, category_id bigint, category text,
+               budget numeric, spent numeric, variance numeric)
+language sql stable
+as $$
+  select b.month, b.category_id, c.name, b.amount, coalesce(r.total, 0), b.amount - coalesce(r.total, 0)
+  from budgets b
+  left join categories c on c.id = b.category_id
+  left join monthly_rollups r
+    on r.user_id = b.user_id
+   and r.month = b.month
+   and r.type = 'expense'
+   and r.category_id is not distinct from b.category_id
+  where (p_from is null or b.month >= date_trunc('month', p_from)::date)
+    and (p_to is null or b.month <= p_to)
+  order by b.month desc, c.name;
+$$;
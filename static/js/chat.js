@@ -6,6 +6,72 @@ document.addEventListener("DOMContentLoaded", () => {
   
   if (!btn || !input || !out) return;
 
+  // Render the reply as it arrives from /chat/ask/stream (server-sent events).
+  // Browsers that can't read streams get the same events once the reply is complete.
+  async function streamReply(message, days, aiMessageDiv) {
+    const res = await fetch("/chat/ask/stream", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ message, days })
+    });
+
+    if (!res.ok) {
+      throw new Error(`Server responded with status: ${res.status}`);
+    }
+
+    let buffer = "";
+    let replySpan = null;
+
+    // handles every complete event in buffer; events are separated by a blank line
+    function drain() {
+      let sep;
+      while ((sep = buffer.indexOf("\n\n")) !== -1) {
+        const frame = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+
+        let event = "message";
+        let data = "";
+        for (const line of frame.split("\n")) {
+          if (line.startsWith("event: ")) event = line.slice(7);
+          else if (line.startsWith("data: ")) data += line.slice(6);
+        }
+        const payload = data ? JSON.parse(data) : {};
+
+        if (event === "error") {
+          throw new Error(payload.error || "stream failed");
+        }
+        if (event === "message" && payload.text) {
+          if (!replySpan) {
+            // first chunk replaces the typing indicator
+            aiMessageDiv.innerHTML = "<strong>Finance AI:</strong> ";
+            replySpan = document.createElement("span");
+            aiMessageDiv.appendChild(replySpan);
+          }
+          replySpan.textContent += payload.text;
+          out.scrollTop = out.scrollHeight;
+        }
+      }
+    }
+
+    if (res.body && res.body.getReader) {
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        drain();
+      }
+    } else {
+      buffer = await res.text();
+      drain();
+    }
+
+    if (!replySpan) {
+      aiMessageDiv.innerHTML = "<strong>Finance AI:</strong> I couldn't process your request at this time.";
+    }
+  }
+
   async function send() {
     const message = input.value.trim();
     if (!message) return;
@@ -28,22 +94,9 @@ document.addEventListener("DOMContentLoaded", () => {
     // Clear input
     input.value = "";
     
+    const days = parseInt(timeframeSelect.value) || 30;
     try {
-      const days = parseInt(timeframeSelect.value) || 30;
-      const res = await fetch("/chat/ask", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message, days })
-      });
-      
-      if (!res.ok) {
-        throw new Error(`Server responded with status: ${res.status}`);
-      }
-      
-      const data = await res.json();
-      
-      // Replace typing indicator with actual response
-      aiMessageDiv.innerHTML = `<strong>Finance AI:</strong> ${data.reply || "I couldn't process your request at this time."}`;
+      await streamReply(message, days, aiMessageDiv);
     } catch (error) {
       console.error("Error:", error);
       aiMessageDiv.innerHTML = `<strong>Finance AI:</strong> Sorry, I encountered an error: ${error.message}`;
@@ -0,0 +1,78 @@
+document.addEventListener("DOMContentLoaded", () => {
+  const box = document.getElementById("import-jobs");
+  const list = document.getElementById("import-jobs-list");
+  if (!box || !list) return;
+
+  // Polls /imports while a background import is queued or running, and
+  // reloads the page once they have all finished so the tables catch up.
+  let sawActive = false;
+
+  function row(job) {
+    const div = document.createElement("div");
+    div.className = "mb-2";
+
+    const label = document.createElement("div");
+    label.className = "d-flex justify-content-between";
+    const left = document.createElement("span");
+    left.textContent = `${job.kind} · ${job.status}`;
+    const right = document.createElement("span");
+    right.className = "text-muted";
+    right.textContent = `${job.inserted} inserted, ${job.duplicates} duplicates, ${job.failed} failed, ${job.skipped} invalid`;
+    label.append(left, right);
+    div.append(label);
+
+    const bar = document.createElement("div");
+    bar.className = "progress mt-1";
+    bar.style.height = "6px";
+    const fill = document.createElement("div");
+    fill.className = "progress-bar" + (job.status === "failed" || job.status === "partial" ? " bg-danger" : "");
+    fill.style.width = `${Math.round(job.progress * 100)}%`;
+    bar.append(fill);
+    div.append(bar);
+
+    if (job.error) {
+      const err = document.createElement("div");
+      err.className = "text-danger mt-1";
+      err.textContent = job.error;
+      div.append(err);
+    }
+
+    if (job.status === "failed" || job.status === "partial") {
+      const btn = document.createElement("button");
+      btn.className = "btn btn-outline-light btn-sm mt-1";
+      btn.textContent = "Retry";
+      btn.addEventListener("click", async () => {
+        btn.disabled = true;
+        await fetch(`/imports/${job.id}/retry`, { method: "POST" });
+        poll();
+      });
+      div.append(btn);
+    }
+    return div;
+  }
+
+  async function poll() {
+    let jobs;
+    try {
+      const res = await fetch("/imports");
+      if (!res.ok) return;
+      jobs = await res.json();
+    } catch (e) {
+      setTimeout(poll, 5000);
+      return;
+    }
+
+    box.classList.toggle("d-none", jobs.length === 0);
+    list.replaceChildren(...jobs.map(row));
+
+    const active = jobs.some(j => j.status === "queued" || j.status === "running");
+    if (active) {
+      sawActive = true;
+      setTimeout(poll, 2000);
+    } else if (sawActive) {
+      location.reload();
+    }
+  }
+
+  poll();
+});
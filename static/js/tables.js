@@ -0,0 +1,115 @@
+document.addEventListener("DOMContentLoaded", () => {
+  // Dashboard tables load their next page (by cursor) when the user
+  // scrolls near the bottom of the table's scroll box.
+  const money = (x) => "₹" + Math.round(x).toString();
+
+  // [cell text, extra classes] per column, in table order
+  const columns = {
+    "tx-table": [
+      [(t) => t.date, ""],
+      [(t) => t.category || "", ""],
+      [(t) => t.type, "text-capitalize"],
+      [(t) => money(t.amount), "text-end"],
+      [(t) => t.description || "", ""],
+    ],
+    "budget-table": [
+      [(b) => b.category || "", ""],
+      [(b) => money(b.amount), "text-end"],
+      [(b) => b.month, ""],
+    ],
+  };
+
+  function lazyTable(table) {
+    const body = table.querySelector("tbody");
+    const box = table.closest(".table-responsive");
+    const counter = document.querySelector(`[data-count-for="${table.id}"]`);
+    const cells = columns[table.id];
+    let next = table.dataset.next || null;
+    let filters = new URLSearchParams();
+    let loading = false;
+    let shown = body.rows.length;
+
+    const sentinel = document.createElement("tr");
+    sentinel.innerHTML = `<td colspan="${cells.length}" class="text-center text-muted small">Loading…</td>`;
+
+    function render(item) {
+      const tr = document.createElement("tr");
+      for (const [text, css] of cells) {
+        const td = document.createElement("td");
+        td.className = `small ${css}`.trim();
+        td.textContent = text(item);
+        tr.append(td);
+      }
+      return tr;
+    }
+
+    function showSentinel() {
+      if (next) body.append(sentinel);
+      else sentinel.remove();
+    }
+
+    async function load(reset) {
+      if (loading || (!reset && !next)) return;
+      loading = true;
+      const params = new URLSearchParams(filters);
+      if (!reset) params.set("cursor", next);
+      try {
+        const res = await fetch(`${table.dataset.url}?${params}`);
+        const page = await res.json();
+        if (!res.ok) throw new Error(page.error || res.statusText);
+        if (reset) {
+          body.replaceChildren();
+          shown = 0;
+        }
+        sentinel.remove();
+        body.append(...page.items.map(render));
+        if (reset && page.items.length === 0) {
+          body.innerHTML = `<tr><td colspan="${cells.length}" class="text-center text-muted small">No matching entries.</td></tr>`;
+        }
+        next = page.next;
+        shown += page.items.length;
+        if (counter) counter.textContent = `Showing ${shown} entries`;
+      } catch (e) {
+        const tr = document.createElement("tr");
+        tr.innerHTML = `<td colspan="${cells.length}" class="text-center text-danger small"></td>`;
+        tr.firstChild.textContent = `Could not load more: ${e.message}`;
+        sentinel.remove();
+        body.append(tr);
+        next = null;
+      } finally {
+        loading = false;
+        showSentinel();
+      }
+    }
+
+    new IntersectionObserver((entries) => {
+      if (entries.some((e) => e.isIntersecting)) load(false);
+    }, { root: box, rootMargin: "200px" }).observe(sentinel);
+    showSentinel();
+
+    return {
+      filter(params) {
+        filters = params;
+        next = null;
+        box.scrollTop = 0;
+        load(true);
+      },
+    };
+  }
+
+  const tables = {};
+  for (const id of Object.keys(columns)) {
+    const table = document.getElementById(id);
+    if (table) tables[id] = lazyTable(table);
+  }
+
+  const form = document.getElementById("tx-filters");
+  if (form && tables["tx-table"]) {
+    form.addEventListener("submit", (e) => {
+      e.preventDefault();
+      const params = new URLSearchParams();
+      for (const [k, v] of new FormData(form)) if (v) params.set(k, v);
+      tables["tx-table"].filter(params);
+    });
+  }
+});
@@ -0,0 +1,96 @@
+"""
+services/aggregates.py: the transaction_summary RPC (sql/002, served by
+summarize_sqlite in benchmarks.fake_supabase) and summarize_frame over the
+columnar cache must give the same totals for the same window.
+"""
+import time
+from collections import defaultdict
+
+import pandas as pd
+import pytest
+from postgrest import SyncPostgrestClient
+
+from benchmarks.fake_supabase import FakeSupabase, sign_jwt
+from services import aggregates
+
+USER = "summary-user"
+WINDOWS = [(None, None), ("2021-03-01", None), (None, "2022-06-30"), ("2023-02-01", "2023-04-15"),
+           ("2030-01-01", None)]
+
+
+@pytest.fixture(scope="module")
+def db():
+    sb = FakeSupabase().start()
+    sb.seed(USER, 300)
+    sb.seed("someone-else", 50, seed=1)
+    sb.conn.executemany(
+        "insert into transactions (user_id, date, amount, type, description, category_id) values (?, ?, ?, ?, ?, null)",
+        [(USER, "2021-03-01", 75.0, "expense", "cash"), (USER, "2022-06-30", 500.0, "income", "gift")])
+    sb.conn.commit()
+    token = sign_jwt({"sub": USER, "role": "authenticated", "exp": int(time.time()) + 3600}, sb.secret)
+    pg = SyncPostgrestClient(f"{sb.url}/rest/v1", headers={"apikey": sb.anon_key, "Authorization": f"Bearer {token}"})
+    rows = [dict(r) for r in sb.conn.execute(
+        """select t.date, t.amount, t.type, c.name as category
+           from transactions t left join categories c on c.id = t.category_id
+           where t.user_id = ? order by t.id""", (USER,))]
+    yield pg, sb.conn, rows
+    pg.session.close()
+    sb.stop()
+
+
+def contract(rows: list, start, end) -> dict:
+    """What sql/002 transaction_summary returns, computed row by row."""
+    rows = [r for r in rows if (start is None or r["date"] >= start) and (end is None or r["date"] <= end)]
+    income = sum(r["amount"] for r in rows if r["type"] == "income")
+    expense = sum(r["amount"] for r in rows if r["type"] == "expense")
+    by_category, by_month = defaultdict(lambda: [0.0, 0]), defaultdict(lambda: [0.0, 0.0])
+    for r in rows:
+        cell = by_category[(r["category"], r["type"])]
+        cell[0] += r["amount"]
+        cell[1] += 1
+        by_month[r["date"][:7] + "-01"][r["type"] == "expense"] += r["amount"]
+    return {
+        "income": income,
+        "expense": expense,
+        "net": income - expense,
+        "by_category": sorted(({"category": c, "type": t, "total": total, "count": n}
+                               for (c, t), (total, n) in by_category.items()), key=lambda c: -c["total"]),
+        "by_month": [{"month": m, "income": i, "expense": e} for m, (i, e) in sorted(by_month.items())],
+    }
+
+
+def frame(rows: list, start, end) -> pd.DataFrame:
+    """The window as columnar_cache.frame returns it: date objects, categorical type and category."""
+    df = pd.DataFrame(rows, columns=["date", "amount", "type", "category"])
+    df = df[(df["date"] >= (start or "")) & (df["date"] <= (end or "9999"))]
+    return df.assign(date=pd.to_datetime(df["date"]).dt.date,
+                     type=df["type"].astype("category"), category=df["category"].astype("category"))
+
+
+def comparable(summary: dict) -> dict:
+    """by_category is ordered by total only, so ties may come in any order."""
+    totals = [c["total"] for c in summary["by_category"]]
+    assert totals == sorted(totals, reverse=True)
+    key = lambda c: (c["category"] or "", c["type"])
+    return dict(summary, by_category=sorted(summary["by_category"], key=key))
+
+
+@pytest.mark.parametrize("start, end", WINDOWS)
+def test_rpc_matches_contract(db, start, end):
+    pg, _, rows = db
+    assert comparable(aggregates.summarize(pg, start, end)) == comparable(contract(rows, start, end))
+
+
+@pytest.mark.parametrize("start, end", WINDOWS)
+def test_frame_matches_sqlite(db, start, end):
+    _, conn, rows = db
+    local = aggregates.summarize_frame(frame(rows, start, end))
+    assert comparable(local) == comparable(aggregates.summarize_sqlite(conn, USER, start, end))
+
+
+def test_uncategorized_rows_are_one_group(db):
+    pg, _, rows = db
+    summary = aggregates.summarize(pg)
+    assert {"category": None, "type": "expense", "total": 75.0, "count": 1} in summary["by_category"]
+    assert {"category": None, "type": "income", "total": 500.0, "count": 1} in summary["by_category"]
+    assert comparable(aggregates.summarize_frame(frame(rows, None, None))) == comparable(summary)
@@ -0,0 +1,117 @@
+"""Routing and answers of services/analytics.py on hand-made rollup rows."""
+from datetime import date
+
+import pytest
+
+from services import analytics
+
+TODAY = date(2026, 10, 18)
+
+
+def rollup(month: str, category: str, type_: str, total: float, budget: float | None = None) -> dict:
+    return {"month": f"{month}-01", "category": category, "type": type_, "total": total, "count": 1,
+            "budget": budget}
+
+
+MONTHLY = [
+    rollup("2026-09", "Salary", "income", 100_000),
+    rollup("2026-09", "Food", "expense", 12_000, budget=10_000),
+    rollup("2026-09", "Rent", "expense", 30_000),
+    rollup("2026-10", "Salary", "income", 100_000),
+    rollup("2026-10", "Food", "expense", 6_000, budget=10_000),
+    rollup("2026-10", "Rent", "expense", 30_000),
+]
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("What is my savings rate?", "savings_rate"),
+    ("What are my top spending categories?", "top_categories"),
+    ("Where does my money go?", "top_categories"),
+    ("Did I go over budget anywhere?", "budget_overruns"),
+    ("How did my spending change compared to last month?", "month_over_month"),
+    ("What's my runway?", "runway"),
+    ("How much did I spend this month?", "totals"),
+    ("How much did I spend last month?", "totals"),
+    ("What's my total income this year?", "totals"),
+])
+def test_route_unqualified(question, intent):
+    assert analytics.route(question) == intent
+
+
+@pytest.mark.parametrize("question", [
+    "How much did I spend on food last month?",
+    "How much did I spend at Swiggy this month?",
+    "What is my savings rate on groceries?",
+    "How much did I spend in September?",
+    "Did I go over budget on rent last month?",
+    "How did my Uber spending change compared to last month?",
+])
+def test_route_leaves_qualified_questions_to_the_model(question):
+    assert analytics.route(question) is None
+
+
+@pytest.mark.parametrize("question", [
+    "Should I reduce my savings rate?",
+    "How can I cut my spending?",
+    "What is my savings rate and my runway?",  # two intents
+    "Tell me a joke",
+])
+def test_route_open_ended_or_ambiguous(question):
+    assert analytics.route(question) is None
+
+
+def test_scope_named_periods():
+    assert analytics.scope("How much did I spend this month?", "totals", "2026-01-01", TODAY) == ("2026-10", "2026-10")
+    assert analytics.scope("How much did I spend last month?", "totals", "2026-01-01", TODAY) == ("2026-09", "2026-09")
+    assert analytics.scope("What's my total income this year?", "totals", "2026-01-01", TODAY) == ("2026-01", "2026-10")
+
+
+def test_scope_needs_the_whole_period_fetched():
+    # last year was not fetched by a window starting in September
+    assert analytics.scope("What's my total income last year?", "totals", "2026-09-01", TODAY) is None
+    assert analytics.scope("How much have I spent?", "totals", "2026-09-01", TODAY) is None
+
+
+def test_scope_unnamed_window_drops_partial_first_month():
+    assert analytics.scope("What is my savings rate?", "savings_rate", "2026-09-01", TODAY) == ("2026-09", "2026-10")
+    assert analytics.scope("What is my savings rate?", "savings_rate", "2026-09-18", TODAY) == ("2026-10", "2026-10")
+
+
+def test_scope_month_over_month():
+    assert analytics.scope("compared to last month", "month_over_month", "2026-09-01", TODAY) == ("2026-09", "2026-10")
+    assert analytics.scope("compared to last month", "month_over_month", "2026-10-01", TODAY) is None
+
+
+def answer(question: str, since: str = "2026-09-01") -> str:
+    intent = analytics.route(question)
+    months = analytics.scope(question, intent, since, TODAY)
+    rows = analytics.within(MONTHLY, months)
+    return analytics.answer(intent, analytics.metrics(rows))
+
+
+def test_answer_totals_for_named_month():
+    assert answer("How much did I spend last month?") == (
+        "For 2026-09: income ₹100,000, expenses ₹42,000, net ₹58,000.")
+
+
+def test_answer_savings_rate():
+    assert answer("What is my savings rate?").startswith("Savings rate for 2026-09 to 2026-10: 61.0%.")
+
+
+def test_answer_top_categories():
+    assert answer("What are my top spending categories?").splitlines()[1:] == [
+        "1. Rent: ₹60,000 (77%)", "2. Food: ₹18,000 (23%)"]
+
+
+def test_answer_budget_overruns():
+    assert answer("Did I go over budget anywhere?").splitlines()[1] == (
+        "2026-09 Food: spent ₹12,000 of ₹10,000, over by ₹2,000")
+
+
+def test_answer_month_over_month():
+    assert answer("How did my spending change compared to last month?") == (
+        "Spending in 2026-10 was ₹36,000, down 14.3% from ₹42,000 in 2026-09.")
+
+
+def test_answer_without_rows():
+    assert analytics.answer("totals", analytics.metrics([])).startswith("There are no transactions")
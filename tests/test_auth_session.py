@@ -0,0 +1,151 @@
+"""
+services/auth_session.py against a fake token issuer; nothing here
+touches the network.
+
+    python -m pytest tests
+"""
+import base64
+import json
+import threading
+import time
+
+import pytest
+from flask import Flask, session
+
+from config import settings
+from services import auth_session
+
+
+def jwt(exp: float) -> str:
+    def part(obj):
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).rstrip(b"=").decode()
+    return f"{part({'alg': 'HS256'})}.{part({'exp': exp, 'sub': 'user'})}.sig"
+
+
+class FakeIssuer:
+    """Rotates refresh tokens the way GoTrue does: each one is good once."""
+
+    def __init__(self, ttl: float = 3600, delay: float = 0):
+        self.ttl = ttl
+        self.delay = delay
+        self.used = set()
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, refresh_token: str):
+        with self.lock:
+            self.calls += 1
+            if refresh_token in self.used:
+                raise RuntimeError("Invalid Refresh Token: Already Used")
+            self.used.add(refresh_token)
+            n = self.calls
+        time.sleep(self.delay)
+        return jwt(time.time() + self.ttl), f"refresh-{n}"
+
+
+def failing_issuer(refresh_token: str):
+    raise RuntimeError("Invalid Refresh Token: Refresh Token Not Found")
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_REFRESH_SKEW", 60)
+    monkeypatch.setattr(auth_session, "authed_postgrest", lambda token: ("client", token))
+    for state in (auth_session._refresh_locks, auth_session._refreshed, auth_session._clients):
+        state.clear()
+
+
+@pytest.fixture
+def request_session():
+    app = Flask(__name__)
+    app.secret_key = "test"
+    with app.test_request_context():
+        yield session
+
+
+def test_token_expiry_reads_exp_claim():
+    assert auth_session.token_expiry(jwt(1234.0)) == 1234.0
+    assert auth_session.token_expiry("not-a-jwt") is None
+
+
+def test_needs_refresh_inside_skew():
+    now = 1_000_000.0
+    assert not auth_session.needs_refresh(jwt(now + 61), now)
+    assert auth_session.needs_refresh(jwt(now + 60), now)
+    assert auth_session.needs_refresh(jwt(now + 10), now)
+    assert auth_session.needs_refresh(jwt(now - 10), now)
+
+
+def test_needs_refresh_tolerates_clock_skew(monkeypatch):
+    # our clock runs 45s behind the issuer's, so a token with 50s left looks
+    # like it has 95s; a skew wider than the drift still refreshes it in time
+    monkeypatch.setattr(settings, "AUTH_REFRESH_SKEW", 120)
+    issued_at = 1_000_000.0
+    token = jwt(issued_at + 50)
+    assert auth_session.needs_refresh(token, issued_at - 45)
+
+
+def test_unreadable_token_needs_refresh():
+    assert auth_session.needs_refresh("garbage", time.time())
+
+
+def test_refresh_rotates_tokens():
+    issuer = FakeIssuer()
+    access, refresh = auth_session.refresh_tokens("refresh-0", issuer)
+    assert refresh == "refresh-1"
+    assert not auth_session.needs_refresh(access)
+    access2, refresh2 = auth_session.refresh_tokens(refresh, issuer)
+    assert (refresh2, issuer.calls) == ("refresh-2", 2)
+    assert access2 != access
+
+
+def test_concurrent_refreshes_share_one_exchange():
+    issuer = FakeIssuer(delay=0.05)
+    results = []
+
+    def worker():
+        results.append(auth_session.refresh_tokens("refresh-0", issuer))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert issuer.calls == 1
+    assert len(set(results)) == 1
+
+
+def test_authed_client_refreshes_expiring_session(request_session):
+    issuer = FakeIssuer()
+    request_session["access_token"] = jwt(time.time() + 5)
+    request_session["refresh_token"] = "refresh-0"
+    client, token = auth_session.get_authed_client(issuer)
+    assert client == "client"
+    assert token == request_session["access_token"]
+    assert request_session["refresh_token"] == "refresh-1"
+
+
+def test_authed_client_keeps_fresh_token(request_session):
+    issuer = FakeIssuer()
+    fresh = jwt(time.time() + 3600)
+    request_session["access_token"] = fresh
+    request_session["refresh_token"] = "refresh-0"
+    assert auth_session.get_authed_client(issuer) == ("client", fresh)
+    assert issuer.calls == 0
+
+
+def test_failed_refresh_returns_none(request_session):
+    expired = jwt(time.time() - 5)
+    request_session["access_token"] = expired
+    request_session["refresh_token"] = "refresh-0"
+    assert auth_session.get_authed_client(failing_issuer) is None
+    assert request_session["access_token"] == expired  # left for the login redirect to clear
+
+
+def test_no_refresh_token_returns_none(request_session):
+    request_session["access_token"] = jwt(time.time() - 5)
+    assert auth_session.get_authed_client(FakeIssuer()) is None
+
+
+def test_no_session_returns_none(request_session):
+    assert auth_session.get_authed_client(FakeIssuer()) is None
@@ -0,0 +1,169 @@
+"""
+/chat/ask/stream on the Flask app and on the ASGI app (routes/chat_async.py),
+with benchmarks.fakes standing in for PostgREST and the model.
+"""
+import asyncio
+import base64
+import json
+import time
+
+import pytest
+
+from benchmarks import synthetic
+from benchmarks.fakes import AsyncFakePostgrest, FakeModel, FakePostgrest
+from config import settings
+from services import gemini_client, response_cache
+from services.response_cache import MemoryBackend, ResponseCache
+
+QUESTION = "How can I cut my food spending?"  # open-ended: goes to the model
+TABLES = {"transactions": synthetic.stored_rows(50)}
+
+
+def jwt(exp: float) -> str:
+    def part(obj):
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).rstrip(b"=").decode()
+    return f"{part({'alg': 'HS256'})}.{part({'exp': exp, 'sub': 'u'})}.sig"
+
+
+def events(body: str) -> list:
+    """SSE body -> [(event, payload)]."""
+    out = []
+    for frame in body.split("\n\n"):
+        if not frame.strip():
+            continue
+        event, data = "message", ""
+        for line in frame.split("\n"):
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data += line[6:]
+        out.append((event, json.loads(data) if data else {}))
+    return out
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    monkeypatch.setattr(settings, "COLUMNAR_CACHE", False)
+    monkeypatch.setattr(settings, "SEARCH_INDEX", False)
+    monkeypatch.setattr(response_cache, "_cache", ResponseCache(MemoryBackend(100), ttl=60))
+
+
+def use_model(monkeypatch, **kwargs) -> FakeModel:
+    model = FakeModel(first_token_delay=0, chunk_delay=0, chunks=3, text="Cut takeout. ", **kwargs)
+    monkeypatch.setattr(gemini_client, "get_model", lambda: model)
+    return model
+
+
+# ---- Flask ----
+
+@pytest.fixture
+def flask_client(monkeypatch):
+    from app import create_app
+    from routes import chat
+    monkeypatch.setattr(chat, "get_authed_client", lambda: FakePostgrest(0, TABLES))
+    client = create_app().test_client()
+    with client.session_transaction() as s:
+        s["user"] = {"id": "u"}
+    return client
+
+
+def ask_flask(client) -> list:
+    res = client.post("/chat/ask/stream", json={"message": QUESTION, "days": 30})
+    assert res.status_code == 200
+    assert res.mimetype == "text/event-stream"
+    return events(res.get_data(as_text=True))
+
+
+def test_flask_stream_sends_text_then_done(flask_client, monkeypatch):
+    use_model(monkeypatch)
+    got = ask_flask(flask_client)
+    assert [e for e, _ in got] == ["message"] * 3 + ["done"]
+    assert "".join(p["text"] for e, p in got if e == "message") == "Cut takeout. " * 3
+    assert got[-1][1]["prompt_tokens"] > 0
+
+
+def test_flask_stream_reports_model_errors(flask_client, monkeypatch):
+    use_model(monkeypatch, fail_after=1)
+    got = ask_flask(flask_client)
+    assert [e for e, _ in got] == ["message", "error"]
+    assert "interrupted" in got[-1][1]["error"]
+
+
+def test_flask_stream_replays_a_cache_hit_as_one_chunk(flask_client, monkeypatch):
+    model = use_model(monkeypatch)
+    ask_flask(flask_client)
+    got = ask_flask(flask_client)
+    assert [e for e, _ in got] == ["message", "done"]
+    assert got[0][1] == {"text": "Cut takeout. " * 3}
+    assert model.calls == 1
+
+
+def test_flask_stream_needs_login():
+    from app import create_app
+    res = create_app().test_client().post("/chat/ask/stream", json={"message": QUESTION})
+    assert res.status_code == 401
+
+
+# ---- ASGI ----
+
+@pytest.fixture
+def asgi_app(monkeypatch):
+    from app import create_app
+    from routes import chat_async
+    monkeypatch.setattr(chat_async, "async_authed_postgrest", lambda token: AsyncFakePostgrest(0, TABLES))
+    monkeypatch.setattr(chat_async, "authed_postgrest", lambda token: FakePostgrest(0, TABLES))
+    monkeypatch.setattr(chat_async, "warm_up", lambda: None)
+    return create_app(asgi=True)
+
+
+def ask_asgi(app, sess: dict | None = None) -> tuple:
+    """(status, body) of one POST /chat/ask/stream through the ASGI app."""
+    sess = {"user": {"id": "u"}, "access_token": jwt(time.time() + 3600)} if sess is None else sess
+    cookie = app.flask_app.session_interface.get_signing_serializer(app.flask_app).dumps(sess)
+    scope = {"type": "http", "method": "POST", "path": "/chat/ask/stream",
+             "headers": [(b"cookie", f"session={cookie}".encode()), (b"content-type", b"application/json")]}
+    body = json.dumps({"message": QUESTION, "days": 30}).encode()
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    status = next(m["status"] for m in sent if m["type"] == "http.response.start")
+    return status, b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body").decode()
+
+
+def test_asgi_stream_sends_text_then_done(asgi_app, monkeypatch):
+    use_model(monkeypatch)
+    status, body = ask_asgi(asgi_app)
+    got = events(body)
+    assert status == 200
+    assert [e for e, _ in got] == ["message"] * 3 + ["done"]
+    assert "".join(p["text"] for e, p in got if e == "message") == "Cut takeout. " * 3
+
+
+def test_asgi_stream_reports_model_errors(asgi_app, monkeypatch):
+    use_model(monkeypatch, fail_after=1)
+    status, body = ask_asgi(asgi_app)
+    got = events(body)
+    assert status == 200
+    assert [e for e, _ in got] == ["message", "error"]
+    assert "interrupted" in got[-1][1]["error"]
+
+
+def test_asgi_stream_replays_a_cache_hit_as_one_chunk(asgi_app, monkeypatch):
+    model = use_model(monkeypatch)
+    ask_asgi(asgi_app)
+    got = events(ask_asgi(asgi_app)[1])
+    assert [e for e, _ in got] == ["message", "done"]
+    assert got[0][1] == {"text": "Cut takeout. " * 3}
+    assert model.calls == 1
+
+
+def test_asgi_stream_without_tokens_is_401(asgi_app, monkeypatch):
+    use_model(monkeypatch)
+    assert ask_asgi(asgi_app, {"user": {"id": "u"}})[0] == 401
+    assert ask_asgi(asgi_app, {})[0] == 401
@@ -0,0 +1,33 @@
+"""Date parsing of services/finance_tools.py against the per-row dateutil parse it replaced."""
+import pandas as pd
+import pytest
+from dateutil.parser import parse as parse_date
+
+from services.finance_tools import parse_dates
+
+MIXED = ["13/01/2025", "02/03/2025", "2025-01-02", "Jan 5, 2025", "5 March 2025", "20251101"]
+
+
+def legacy(values: list, dayfirst: bool = False) -> list:
+    return [parse_date(v, dayfirst=dayfirst).date().isoformat() for v in values]
+
+
+@pytest.mark.filterwarnings("error")
+def test_mixed_day_and_month_order_matches_dateutil():
+    assert list(parse_dates(pd.Series(MIXED))) == legacy(MIXED)
+    assert list(parse_dates(pd.Series(MIXED)))[:2] == ["2025-01-13", "2025-02-03"]
+
+
+@pytest.mark.filterwarnings("error")
+def test_dayfirst():
+    values = ["01/02/2025", "13/01/2025", "02/03/2025"]
+    assert list(parse_dates(pd.Series(values), dayfirst=True)) == legacy(values, dayfirst=True)
+
+
+def test_rows_outside_the_format_fall_back_to_dateutil():
+    s = pd.Series(["05/01/25", "Jan 6, 2025", "not a date", None])
+    assert list(parse_dates(s, dayfirst=True, fmt="%d/%m/%y")) == ["2025-01-05", "2025-01-06", None, None]
+
+
+def test_numeric_dates_are_not_epoch_offsets():
+    assert list(parse_dates(pd.Series([20251101, 20251102]))) == ["2025-11-01", "2025-11-02"]
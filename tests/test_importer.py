@@ -0,0 +1,116 @@
+"""
+Import dedup of services/importer.py: fingerprints are a content hash
+numbered within the file, so they must not depend on chunking and must
+come out the same from an import and from backfill_fingerprints().
+"""
+import io
+import time
+import uuid
+
+import pytest
+from postgrest import SyncPostgrestClient
+
+from benchmarks import synthetic
+from benchmarks.fake_supabase import FakeSupabase, sign_jwt
+from config import settings
+from services import importer
+from services.statements import read_statement, statement_profile
+
+COFFEE = "2025-01-02,Food,Coffee,120,expense\n"
+HEADER = "Date,Category,Description,Amount,Type\n"
+
+
+@pytest.fixture(scope="module")
+def sb():
+    sb = FakeSupabase().start()
+    yield sb
+    sb.stop()
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    monkeypatch.setattr(settings, "AUTO_CATEGORIZE", False)
+    monkeypatch.setattr(settings, "COLUMNAR_CACHE", False)
+    monkeypatch.setattr(settings, "SEARCH_INDEX", False)
+
+
+@pytest.fixture
+def user(sb):
+    """A fresh user and a PostgREST client signed in as them."""
+    user_id = str(uuid.uuid4())
+    token = sign_jwt({"sub": user_id, "role": "authenticated", "exp": int(time.time()) + 3600}, sb.secret)
+    pg = SyncPostgrestClient(f"{sb.url}/rest/v1", headers={"apikey": sb.anon_key, "Authorization": f"Bearer {token}"})
+    yield user_id, pg
+    pg.session.close()
+
+
+def upload(pg, user_id: str, data: bytes, chunk_rows: int = 7) -> importer.ImportReport:
+    report = importer.import_transactions(io.BytesIO(data), user_id, pg, chunk_rows=chunk_rows, batch_size=5)
+    assert report.error is None and report.failed == 0
+    return report
+
+
+def stored(sb, user_id: str) -> list:
+    return [r[0] for r in sb.conn.execute("select fingerprint from transactions where user_id = ? order by id",
+                                          (user_id,))]
+
+
+def file_fingerprints(data: bytes, chunk_rows: int) -> list:
+    """Fingerprints the import path gives a file's rows, without inserting them."""
+    stream = io.BytesIO(data)
+    profile = statement_profile(stream, chunk_rows)
+    seen, out = {}, []
+    for chunk in read_statement(stream, chunk_rows):
+        rows = importer.parse_chunk(chunk, "u", profile)
+        importer.number_duplicates(rows, seen)
+        out += [r["fingerprint"] for r in rows]
+    return out
+
+
+def test_reimport_inserts_nothing(sb, user):
+    user_id, pg = user
+    data = synthetic.statement_csv(40)
+    assert upload(pg, user_id, data).inserted == 40
+    again = upload(pg, user_id, data)
+    assert (again.inserted, again.duplicates) == (0, 40)
+    assert len(stored(sb, user_id)) == 40
+
+
+def test_identical_rows_in_one_file_stay_separate(sb, user):
+    user_id, pg = user
+    assert upload(pg, user_id, (HEADER + COFFEE * 2).encode()).inserted == 2
+    assert upload(pg, user_id, (HEADER + COFFEE * 2).encode()).inserted == 0
+    # a later statement overlapping this one brings one more coffee
+    report = upload(pg, user_id, (HEADER + COFFEE * 3).encode())
+    assert (report.inserted, report.duplicates) == (1, 2)
+    assert [f.rsplit("-", 1)[1] for f in stored(sb, user_id)] == ["0", "1", "2"]
+
+
+def test_chunk_size_does_not_change_fingerprints():
+    # identical rows straddling chunk boundaries keep their numbering
+    data = (HEADER + COFFEE * 5).encode() + synthetic.statement_csv(30).split(b"\n", 1)[1] + COFFEE.encode() * 3
+    expected = file_fingerprints(data, 1000)
+    assert len(set(expected)) == len(expected) == 38
+    for chunk_rows in (1, 2, 3, 7):
+        assert file_fingerprints(data, chunk_rows) == expected
+
+
+def test_reimport_with_other_chunk_size_inserts_nothing(sb, user):
+    user_id, pg = user
+    data = (HEADER + COFFEE * 4).encode() + synthetic.statement_csv(20).split(b"\n", 1)[1]
+    assert upload(pg, user_id, data, chunk_rows=3).inserted == 24
+    assert upload(pg, user_id, data, chunk_rows=50).inserted == 0
+
+
+def test_backfill_matches_import(sb, user):
+    user_id, pg = user
+    data = (HEADER + COFFEE * 3).encode() + synthetic.statement_csv(25).split(b"\n", 1)[1]
+    upload(pg, user_id, data)
+    imported = stored(sb, user_id)
+    # as if the rows predated fingerprints
+    sb.conn.execute("update transactions set fingerprint = null where user_id = ?", (user_id,))
+    sb.conn.commit()
+    assert importer.backfill_fingerprints(pg, user_id, page=4) == 28
+    assert stored(sb, user_id) == imported
+    assert importer.backfill_fingerprints(pg, user_id) == 0
+    assert upload(pg, user_id, data).inserted == 0
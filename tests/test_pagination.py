@@ -0,0 +1,110 @@
+"""
+Keyset pages of services/pagination.py: the PostgREST queries (through
+postgrest-py against benchmarks.fake_supabase) and the SQLite stand-in
+must walk the same rows in the same order.
+"""
+import time
+
+import pytest
+from postgrest import SyncPostgrestClient
+
+from benchmarks.fake_supabase import FakeSupabase, sign_jwt
+from services import pagination
+from services.pagination import CursorError, UNCATEGORIZED
+
+USER = "page-user"
+CATEGORIES = ["Food", "Rent", "Travel"]
+MONTHS = ["2025-01-01", "2025-02-01", "2025-03-01"]
+
+
+@pytest.fixture(scope="module")
+def db():
+    sb = FakeSupabase().start()
+    conn = sb.conn
+    conn.executemany("insert into categories (id, user_id, name, type) values (?, ?, ?, 'expense')",
+                     [(i + 1, USER, c) for i, c in enumerate(CATEGORIES)])
+    # every month has each category and an Uncategorized budget, inserted out of key order
+    conn.executemany("insert into budgets (user_id, category_id, month, amount) values (?, ?, ?, ?)",
+                     [(USER, c, m, 100.0 * (i + 1)) for i, m in enumerate(MONTHS) for c in (None, 3, 1, 2)])
+    conn.executemany(
+        "insert into transactions (user_id, date, amount, type, description, category_id) values (?, ?, ?, ?, ?, ?)",
+        [(USER, f"2025-01-{d:02d}", 10.0 * d, "expense", f"row {d}", None if d % 4 == 0 else d % 3 + 1)
+         for d in (1, 2, 2, 3, 5, 5, 5, 8, 9, 12)])
+    conn.commit()
+    token = sign_jwt({"sub": USER, "role": "authenticated", "exp": int(time.time()) + 3600}, sb.secret)
+    pg = SyncPostgrestClient(f"{sb.url}/rest/v1", headers={"apikey": sb.anon_key, "Authorization": f"Bearer {token}"})
+    yield pg, conn
+    pg.session.close()
+    sb.stop()
+
+
+def walk(fetch, limit: int) -> list:
+    items, cursor = [], None
+    while True:
+        page = fetch(cursor, limit)
+        assert len(page["items"]) <= limit
+        items += page["items"]
+        cursor = page["next"]
+        if not cursor:
+            return items
+
+
+def budget_key(b: dict) -> tuple:
+    return (b["month"], b["category_id"], b["id"])
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 5, 50])
+def test_budget_pages_match(db, limit):
+    pg, conn = db
+    rest = walk(lambda c, n: pagination.budgets_page(pg, c, n), limit)
+    local = walk(lambda c, n: pagination.budgets_page_sqlite(conn, USER, c, n), limit)
+    assert [budget_key(b) for b in rest] == [budget_key(b) for b in local]
+    assert len(rest) == len(MONTHS) * 4
+    # latest month first, then by category with Uncategorized last
+    assert [b["category_id"] for b in rest[:4]] == [1, 2, 3, None]
+    assert [b["month"] for b in rest[::4]] == sorted(MONTHS, reverse=True)
+
+
+@pytest.mark.parametrize("category", [UNCATEGORIZED, "Rent"])
+def test_budget_category_filter_matches(db, category):
+    pg, conn = db
+    rest = walk(lambda c, n: pagination.budgets_page(pg, c, n, category=category), 2)
+    local = walk(lambda c, n: pagination.budgets_page_sqlite(conn, USER, c, n, category=category), 2)
+    assert [budget_key(b) for b in rest] == [budget_key(b) for b in local]
+    assert len(rest) == len(MONTHS)
+    assert {b["category"] for b in rest} == {None if category == UNCATEGORIZED else category}
+
+
+@pytest.mark.parametrize("limit", [1, 3, 50])
+def test_transaction_pages_match(db, limit):
+    pg, conn = db
+    rest = walk(lambda c, n: pagination.transactions_page(pg, c, n), limit)
+    local = walk(lambda c, n: pagination.transactions_page_sqlite(conn, USER, c, n), limit)
+    assert [r["id"] for r in rest] == [r["id"] for r in local]
+    assert [(r["date"], r["id"]) for r in rest] == sorted(((r["date"], r["id"]) for r in rest), reverse=True)
+
+
+def test_transaction_uncategorized_filter_matches(db):
+    pg, conn = db
+    rest = walk(lambda c, n: pagination.transactions_page(pg, c, n, category=UNCATEGORIZED), 1)
+    local = walk(lambda c, n: pagination.transactions_page_sqlite(conn, USER, c, n, category=UNCATEGORIZED), 1)
+    assert [r["id"] for r in rest] == [r["id"] for r in local]
+    assert rest and all(r["category"] is None for r in rest)
+
+
+def test_cursor_allows_null_only_where_nullable():
+    cursor = pagination.encode_cursor(["2025-01-01", None, 7])
+    assert pagination.decode_cursor(cursor, 3, nullable=(1,)) == ["2025-01-01", None, 7]
+    with pytest.raises(CursorError):
+        pagination.decode_cursor(cursor, 3)
+    with pytest.raises(CursorError):
+        pagination.decode_cursor(pagination.encode_cursor(["2025-01-01", 1, None]), 3, nullable=(1,))
+
+
+@pytest.mark.parametrize("key", [["2025-01-01"], ["2025-1-1", 1], ["2025-01-01);drop", 1], ["2025-01-01", "1"],
+                                 ["2025-01-01", True]])
+def test_bad_cursors(key):
+    with pytest.raises(CursorError):
+        pagination.decode_cursor(pagination.encode_cursor(key), 2)
+    with pytest.raises(CursorError):
+        pagination.decode_cursor("not base64 json!", 2)
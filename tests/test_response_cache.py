@@ -0,0 +1,142 @@
+"""services/response_cache.py, and the reply cache around a stubbed model."""
+import io
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.fakes import FakeModel
+from services import gemini_client, response_cache
+from services.importer import ImportReport, ChunkResult
+from services.response_cache import DiskBackend, MemoryBackend, ResponseCache
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=c))
+    return c
+
+
+@pytest.fixture(params=["memory", "disk"])
+def make_backend(request, tmp_path):
+    def make(max_entries: int):
+        if request.param == "memory":
+            return MemoryBackend(max_entries)
+        return DiskBackend(str(tmp_path / "responses.sqlite3"), max_entries)
+    return make
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """A fresh process-wide cache, as get_cache() returns it."""
+    c = ResponseCache(MemoryBackend(100), ttl=60)
+    monkeypatch.setattr(response_cache, "_cache", c)
+    return c
+
+
+def test_lru_evicts_least_recently_used(make_backend, clock):
+    backend = make_backend(2)
+    backend.set("a", "u", "A", 60)
+    clock.now += 1
+    backend.set("b", "u", "B", 60)
+    clock.now += 1
+    assert backend.get("a") == "A"  # a is now the most recent
+    clock.now += 1
+    backend.set("c", "u", "C", 60)
+    assert backend.get("b") is None
+    assert (backend.get("a"), backend.get("c")) == ("A", "C")
+    assert len(backend) == 2
+
+
+def test_ttl_expiry(make_backend, clock):
+    backend = make_backend(10)
+    backend.set("a", "u", "A", 60)
+    clock.now += 59
+    assert backend.get("a") == "A"
+    clock.now += 2
+    assert backend.get("a") is None
+    assert len(backend) == 0
+
+
+def test_invalidate_user_keeps_other_users(make_backend, clock):
+    backend = make_backend(10)
+    backend.set("a", "alice", "A", 60)
+    backend.set("b", "bob", "B", 60)
+    backend.invalidate_user("alice")
+    assert backend.get("a") is None
+    assert backend.get("b") == "B"
+
+
+def test_question_is_normalized_but_fingerprint_is_not():
+    c = ResponseCache(MemoryBackend(10), ttl=60)
+    c.store("u", "What's my savings rate?", "fp1", "reply")
+    assert c.lookup("u", "  what s MY savings rate ", "fp1") == "reply"
+    assert c.lookup("u", "What's my savings rate?", "fp2") is None
+    assert c.lookup("other", "What's my savings rate?", "fp1") is None
+
+
+def test_hit_counter(cache):
+    cache.lookup("u", "q", "fp")
+    cache.store("u", "q", "fp", "reply")
+    cache.lookup("u", "q", "fp")
+    cache.lookup("u", "q", "fp")
+    assert cache.stats() == {"hits": 2, "misses": 1, "hit_ratio": 2 / 3, "entries": 1}
+
+
+def test_empty_replies_are_not_stored(cache):
+    cache.store("u", "q", "fp", "")
+    assert cache.lookup("u", "q", "fp") is None
+
+
+@pytest.fixture
+def model(monkeypatch):
+    m = FakeModel(first_token_delay=0, chunk_delay=0, chunks=3, text="ok. ")
+    monkeypatch.setattr(gemini_client, "get_model", lambda: m)
+    return m
+
+
+def test_cached_reply_calls_the_model_once(cache, model):
+    ask = lambda fp: gemini_client.ask_gemini_cached("prompt", user_id="u", question="q", fingerprint=fp)
+    assert ask("fp1") == ("ok. ok. ok. ", False)
+    assert ask("fp1") == ("ok. ok. ok. ", True)
+    assert model.calls == 1
+    assert ask("fp2") == ("ok. ok. ok. ", False)  # the user's data changed
+    assert model.calls == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_cached_stream_replays_a_hit_as_one_piece(cache, model):
+    stream = lambda: list(gemini_client.ask_gemini_stream_cached("prompt", user_id="u", question="q",
+                                                                 fingerprint="fp"))
+    assert stream() == ["ok. "] * 3
+    assert stream() == ["ok. ok. ok. "]
+    assert model.calls == 1
+
+
+def test_upload_drops_the_users_replies(cache, monkeypatch):
+    from app import create_app
+    from routes import dashboard
+    from services import importer
+
+    cache.store("alice", "q", "fp", "stale")
+    cache.store("bob", "q", "fp", "kept")
+    report = ImportReport(chunks=[ChunkResult(index=0, rows_read=1, rows_valid=1, inserted=1)])
+    monkeypatch.setattr(importer, "import_transactions", lambda stream, user_id, pg: report)
+    monkeypatch.setattr(dashboard, "get_pg_client_or_redirect", lambda: object())
+    monkeypatch.setattr(dashboard, "wants_background", lambda: False)
+
+    client = create_app().test_client()
+    with client.session_transaction() as s:
+        s["user"] = {"id": "alice"}
+    res = client.post("/upload", data={"file": (io.BytesIO(b"date,amount\n"), "s.csv")})
+    assert res.status_code == 302
+    assert cache.lookup("alice", "q", "fp") is None
+    assert cache.lookup("bob", "q", "fp") == "kept"
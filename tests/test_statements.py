@@ -0,0 +1,179 @@
+"""Format sniffing, parsers and bank profiles of services/statements.py."""
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from benchmarks import synthetic
+from services import statements
+from services.finance_tools import to_transactions
+from services.statements import normalize, read_statement, statement_profile
+
+
+def read(data: bytes, chunk_rows: int = 2) -> tuple:
+    """(profile, normalized rows) the import path gets for a file."""
+    stream = io.BytesIO(data)
+    profile = statement_profile(stream, chunk_rows)
+    frames = [normalize(chunk, profile) for chunk in read_statement(stream, chunk_rows)]
+    rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return profile, rows
+
+
+def triples(rows: pd.DataFrame) -> list:
+    return [(d, float(a), str(t)) for d, a, t in zip(rows["date"], rows["amount"], rows["type"])]
+
+
+@pytest.mark.parametrize("head, fmt", [
+    (b"PK\x03\x04rest", "xlsx"),
+    (b"OFXHEADER:100\nDATA:OFXSGML", "ofx"),
+    (b"<?xml version='1.0'?>\n<OFX><BANKMSGSRSV1>", "ofx"),
+    (b"\xef\xbb\xbf[{\"date\": 1}]", "json"),
+    (b"  {\"transactions\": []}", "json"),
+    (b"date,amount\n", "csv"),
+])
+def test_sniff_format(head, fmt):
+    assert statements.sniff_format(head) == fmt
+
+
+# ---- delimiters and decimal marks ----
+
+@pytest.mark.parametrize("sep", [",", ";", "\t", "|"])
+def test_csv_delimiters(sep):
+    text = sep.join(["date", "description", "amount", "type"]) + "\n"
+    text += sep.join(["2025-01-02", "Uber", "250.50", "expense"]) + "\n"
+    text += sep.join(["2025-01-03", "Salary", "90000", "income"]) + "\n"
+    _, rows = read(text.encode())
+    assert triples(rows) == [("2025-01-02", 250.5, "expense"), ("2025-01-03", 90000.0, "income")]
+    assert list(rows["description"]) == ["Uber", "Salary"]
+
+
+def test_semicolon_file_with_decimal_comma():
+    text = ("date;description;amount;type\n"
+            "2025-01-02;Uber;1,5;expense\n"
+            "2025-01-03;Rent;1.234,56;expense\n"
+            "2025-01-04;Salary;\"90.000,00\";income\n")
+    profile, rows = read(text.encode())
+    assert profile.decimal == ","
+    assert list(rows["amount"]) == [1.5, 1234.56, 90000.0]
+    assert any("decimal mark" in note for note in profile.notes)
+
+
+def test_semicolon_file_with_decimal_point():
+    text = "date;description;amount;type\n2025-01-02;Uber;1.50;expense\n2025-01-03;Rent;1,234.56;expense\n"
+    profile, rows = read(text.encode())
+    assert profile.decimal == "."
+    assert list(rows["amount"]) == [1.5, 1234.56]
+
+
+def test_decimal_mark_ignores_dotted_dates():
+    assert statements.decimal_mark("18.10.2026;Uber;12,50\n19.10.2026;Ola;7,5\n", ";") == ","
+    assert statements.decimal_mark("18.10.2026;Uber;12.50\n", ";") == "."
+    assert statements.decimal_mark("date,amount\n2025-01-02,\"1,5\"\n", ",") == "."
+
+
+def test_comma_file_amounts_keep_thousands_separators():
+    text = 'date,description,amount,type\n2025-01-02,Rent,"₹1,234.56",expense\n'
+    _, rows = read(text.encode())
+    assert list(rows["amount"]) == [1234.56]
+
+
+# ---- sign of a lone amount column ----
+
+def signed_csv(amounts: list) -> bytes:
+    lines = ["date,description,amount"]
+    lines += [f"2025-01-{i + 1:02d},row {i},{a}" for i, a in enumerate(amounts)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def test_mostly_negative_amounts_are_signed():
+    profile, rows = read(signed_csv([-100, -250, 90000, -40]))
+    assert profile.signed
+    assert triples(rows)[:3] == [("2025-01-01", 100.0, "expense"), ("2025-01-02", 250.0, "expense"),
+                                 ("2025-01-03", 90000.0, "income")]
+
+
+def test_a_few_negative_amounts_are_refunds():
+    # a credit card export: charges positive, the odd refund negative
+    profile, rows = read(signed_csv([100, 250, 300, 400, 500, 600, -50, 700]))
+    assert not profile.signed
+    assert [t for _, _, t in triples(rows)] == ["expense"] * 6 + ["income", "expense"]
+    assert (rows["amount"] > 0).all()
+    assert any("refunds" in note for note in profile.notes)
+
+
+def test_unsigned_amounts_are_spending():
+    profile, rows = read(signed_csv([100, 250]))
+    assert not profile.signed and not profile.notes
+    assert [t for _, _, t in triples(rows)] == ["expense", "expense"]
+
+
+def test_sign_does_not_depend_on_chunk_size():
+    data = signed_csv([100, 200, 300, -10, -20, -30, 400, -50])
+    expected = triples(read(data, chunk_rows=100)[1])
+    for chunk_rows in (1, 3, 5):
+        assert triples(read(data, chunk_rows)[1]) == expected
+
+
+def test_type_column_wins_over_sign():
+    text = "date,amount,type\n2025-01-01,-100,income\n2025-01-02,-50,expense\n"
+    profile, rows = read(text.encode())
+    assert not profile.signed
+    assert [t for _, _, t in triples(rows)] == ["income", "expense"]
+
+
+def test_split_debit_credit_columns():
+    _, rows = read(synthetic.bank_csv(50))
+    assert len(to_transactions(rows, "u")) == 50
+    assert set(rows["type"].astype(str)) == {"income", "expense"}
+
+
+# ---- other formats ----
+
+def test_ofx():
+    data = synthetic.statement_ofx(5)
+    profile, rows = read(data)
+    assert profile.name == "ofx" and profile.signed
+    frame = synthetic.statement_frame(5)
+    income = frame["Type"].isin(["Income", "CR"])
+    assert list(rows["date"]) == list(frame["Date"])
+    assert list(rows["type"].astype(str)) == ["income" if i else "expense" for i in income]
+    assert list(rows["description"]) == list(frame["Description"])
+
+
+def test_ofx_xml_closed_elements():
+    data = (b"<?xml version='1.0'?><OFX><BANKTRANLIST>"
+            b"<STMTTRN><TRNTYPE>DEBIT</TRNTYPE><DTPOSTED>20250102</DTPOSTED><TRNAMT>-12.50</TRNAMT>"
+            b"<NAME>Cafe</NAME></STMTTRN>"
+            b"<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20250103</DTPOSTED><TRNAMT>100.00</TRNAMT>"
+            b"<NAME>Refund</NAME></STMTTRN></BANKTRANLIST></OFX>")
+    _, rows = read(data)
+    assert triples(rows) == [("2025-01-02", 12.5, "expense"), ("2025-01-03", 100.0, "income")]
+    assert list(rows["description"]) == ["Cafe", "Refund"]
+
+
+@pytest.mark.parametrize("lines", [False, True])
+def test_json_matches_csv(lines):
+    _, from_json = read(synthetic.statement_json(20, lines=lines), chunk_rows=7)
+    _, from_csv = read(synthetic.statement_csv(20), chunk_rows=7)
+    assert to_transactions(from_json, "u") == to_transactions(from_csv, "u")
+
+
+def test_json_nested_objects_are_flattened():
+    data = json.dumps([{"date": "2025-01-02", "amount": 10, "type": "expense",
+                        "merchant": {"name": "Uber"}, "description": "ride"}]).encode()
+    raw = next(read_statement(io.BytesIO(data)))
+    assert "merchant.name" in raw.columns
+
+
+@pytest.mark.parametrize("data", [b"[1, 2]", b"[{\"date\": \"2025-01-02\"", b"{\"a\": }"])
+def test_invalid_json(data):
+    with pytest.raises(statements.StatementError):
+        list(read_statement(io.BytesIO(data)))
+
+
+def test_xlsx_skips_account_lines_above_the_table():
+    pytest.importorskip("openpyxl")
+    _, from_xlsx = read(synthetic.statement_xlsx(20), chunk_rows=7)
+    _, from_csv = read(synthetic.statement_csv(20), chunk_rows=7)
+    assert to_transactions(from_xlsx, "u") == to_transactions(from_csv, "u")